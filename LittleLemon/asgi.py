@@ -12,5 +12,9 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "LittleLemon.settings")
+# serve the read-heavy endpoints from the async views
+os.environ.setdefault("LITTLELEMON_URLCONF", "LittleLemon.asgi_urls")
+# connections are tied to per-request threads under ASGI: don't keep them
+os.environ.setdefault("LITTLELEMON_DB_CONN_MAX_AGE", "0")
 
 application = get_asgi_application()
@@ -0,0 +1,14 @@
+"""
+URL configuration used under ASGI (see asgi.py).
+
+The same URLs as urls.py, except that the read-heavy API endpoints resolve to
+the async views in LittleLemonAPI.async_views first.
+"""
+
+from django.urls import path, include
+
+from .urls import urlpatterns as wsgi_urlpatterns
+
+urlpatterns = [
+    path("api/", include("LittleLemonAPI.async_urls")),
+] + wsgi_urlpatterns
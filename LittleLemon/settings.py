@@ -10,9 +10,13 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/4.2/ref/settings/
 """
 
+import os
+import tempfile
 from pathlib import Path
 from datetime import timedelta
 
+import django
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -45,6 +49,9 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "LittleLemonAPI.middleware.RequestMetricsMiddleware",
+    "LittleLemonAPI.middleware.CompressionMiddleware",
+    "LittleLemonAPI.middleware.ReplicaPinningMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -54,7 +61,8 @@ MIDDLEWARE = [
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
 ]
 
-ROOT_URLCONF = "LittleLemon.urls"
+# asgi.py switches to LittleLemon.asgi_urls, which adds the async views
+ROOT_URLCONF = os.environ.get("LITTLELEMON_URLCONF", "LittleLemon.urls")
 
 TEMPLATES = [
     {
@@ -77,14 +85,122 @@ WSGI_APPLICATION = "LittleLemon.wsgi.application"
 
 # Database
 # https://docs.djangoproject.com/en/4.2/ref/settings/#databases
+# Configured from the environment. LITTLELEMON_DB_ENGINE is "sqlite" (the
+# default) or "postgresql"; the LITTLELEMON_DB_* variables below fill in the
+# rest. Connections are kept open between requests and health checked before
+# reuse; asgi.py turns that off, as persistent connections do not work with
+# the per-request threads of ASGI.
+
+DB_ENGINE = os.environ.get("LITTLELEMON_DB_ENGINE", "sqlite")
+DB_CONN_MAX_AGE = int(os.environ.get("LITTLELEMON_DB_CONN_MAX_AGE", 60))
+
+if DB_ENGINE == "postgresql":
+    DATABASES = {
+        "default": {
+            "ENGINE": "django.db.backends.postgresql",
+            "NAME": os.environ.get("LITTLELEMON_DB_NAME", "littlelemon"),
+            "USER": os.environ.get("LITTLELEMON_DB_USER", ""),
+            "PASSWORD": os.environ.get("LITTLELEMON_DB_PASSWORD", ""),
+            "HOST": os.environ.get("LITTLELEMON_DB_HOST", ""),
+            "PORT": os.environ.get("LITTLELEMON_DB_PORT", ""),
+            "CONN_MAX_AGE": DB_CONN_MAX_AGE,
+            "CONN_HEALTH_CHECKS": True,
+            "OPTIONS": {},
+        }
+    }
+    if os.environ.get("LITTLELEMON_DB_POOL_SIZE"):
+        # a psycopg 3 connection pool per process (Django 5.1+, needs
+        # psycopg[pool]); it replaces persistent connections and also works
+        # under ASGI
+        DATABASES["default"]["CONN_MAX_AGE"] = 0
+        DATABASES["default"]["OPTIONS"]["pool"] = {
+            "min_size": int(os.environ.get("LITTLELEMON_DB_POOL_MIN_SIZE", 2)),
+            "max_size": int(os.environ["LITTLELEMON_DB_POOL_SIZE"]),
+            "timeout": int(os.environ.get("LITTLELEMON_DB_POOL_TIMEOUT", 10)),
+        }
+    if os.environ.get("LITTLELEMON_DB_PGBOUNCER"):
+        # transaction pooling cannot keep a cursor open across transactions
+        DATABASES["default"]["DISABLE_SERVER_SIDE_CURSORS"] = True
+else:
+    DATABASES = {
+        "default": {
+            "ENGINE": "django.db.backends.sqlite3",
+            "NAME": os.environ.get("LITTLELEMON_DB_NAME", BASE_DIR / "db.sqlite3"),
+            "CONN_MAX_AGE": DB_CONN_MAX_AGE,
+            "CONN_HEALTH_CHECKS": True,
+            "OPTIONS": {},
+            # a file rather than memory, so tests run with the pragmas below
+            # and can write from several threads; kept out of the checkout
+            "TEST": {"NAME": Path(tempfile.gettempdir()) / "littlelemon_test.sqlite3"},
+        }
+    }
+    if django.VERSION >= (5, 1):
+        # take the write lock at BEGIN: a transaction that reads and then
+        # writes otherwise fails at once with "database is locked" when
+        # another connection wrote in between, whatever the busy timeout
+        DATABASES["default"]["OPTIONS"]["transaction_mode"] = "IMMEDIATE"
+
+# Read replicas: LITTLELEMON_DB_REPLICAS lists their hosts (PostgreSQL) or
+# files (SQLite, kept up to date with manage.py sync_replicas), comma
+# separated. Catalogue and order history reads are routed to them, see
+# LittleLemonAPI/routers.py; a client reads its own writes from the primary
+# for REPLICA_PIN_SECONDS, which should exceed the replication lag.
+for index, replica in enumerate(
+    filter(None, os.environ.get("LITTLELEMON_DB_REPLICAS", "").split(","))
+):
+    DATABASES[f"replica{index}"] = {
+        **DATABASES["default"],
+        "HOST" if DB_ENGINE == "postgresql" else "NAME": replica,
+        # tests read the test database through the replica aliases
+        "TEST": {"MIRROR": "default"},
+    }
+DATABASE_REPLICAS = [alias for alias in DATABASES if alias != "default"]
+DATABASE_ROUTERS = ["LittleLemonAPI.routers.ReplicaRouter"]
+REPLICA_PIN_SECONDS = int(os.environ.get("LITTLELEMON_DB_REPLICA_PIN_SECONDS", 5))
+
+# Applied to every new SQLite connection (see LittleLemonAPI/signals.py).
+# WAL lets readers run alongside the one writer, NORMAL only syncs at
+# checkpoints (safe with WAL; a power cut can lose the last commits, not
+# corrupt the file), busy_timeout makes a writer wait for the lock instead
+# of failing, and mmap serves reads from the page cache.
+SQLITE_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "busy_timeout": int(os.environ.get("LITTLELEMON_DB_BUSY_TIMEOUT", 5000)),
+    "mmap_size": 256 * 1024 * 1024,
+}
 
-DATABASES = {
+
+# Cache
+# https://docs.djangoproject.com/en/4.2/topics/cache/
+# Point "catalogue" at a shared backend (Redis, Memcached) in production so
+# every worker sees the same catalogue version.
+
+CACHES = {
     "default": {
-        "ENGINE": "django.db.backends.sqlite3",
-        "NAME": BASE_DIR / "db.sqlite3",
-    }
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    },
+    "catalogue": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "catalogue",
+        "TIMEOUT": 300,
+    },
 }
 
+CATALOGUE_CACHE = "catalogue"
+
+# Cache alias for users' group names across requests, or None to only memoize
+# them per request. Only enable with a shared backend: membership changes are
+# invalidated through signals in the worker that made them.
+ROLE_CACHE = None
+ROLE_CACHE_TIMEOUT = 60
+
+# Tokens, with their users' group names, that each worker keeps in memory
+# (see LittleLemonAPI.authentication.TokenCache), and for how many seconds.
+# Changes made in another worker reach this one within that time.
+TOKEN_CACHE_SIZE = 10000
+TOKEN_CACHE_TTL = 60
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
@@ -131,17 +247,75 @@ DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 REST_FRAMEWORK = {
     "DEFAULT_RENDERER_CLASSES": [
         "rest_framework.renderers.JSONRenderer",
-        "rest_framework.renderers.BrowsableAPIRenderer",
+        # the HTML pages for exploring the API, in development only
+        *(["rest_framework.renderers.BrowsableAPIRenderer"] if DEBUG else []),
+        "LittleLemonAPI.renderers.MessagePackRenderer",
         "rest_framework_xml.renderers.XMLRenderer",
     ],
     "DEFAULT_AUTHENTICATION_CLASSES": (
-        "rest_framework.authentication.TokenAuthentication",
+        "LittleLemonAPI.authentication.CachedTokenAuthentication",
         "rest_framework.authentication.SessionAuthentication",
     ),
     "DEFAULT_THROTTLE_RATES": {
         "anon": "2/minute",
         "user": "5/minute",
         "ten": "10/minute",
+        "ten:Manager": "60/minute",
+    },
+}
+
+# How long a client may retry a request with the same Idempotency-Key header
+# and get the first response back, in seconds.
+IDEMPOTENCY_KEY_TTL = 24 * 60 * 60
+
+# Where LittleLemonAPI.throttles count requests (see LittleLemonAPI.ratelimit):
+# LocalBackend limits each worker process separately, CacheBackend shares the
+# counts through the RATE_LIMIT_CACHE alias (use Redis or Memcached), and
+# DatabaseBackend shares them through the primary database.
+RATE_LIMIT_BACKEND = "LittleLemonAPI.ratelimit.LocalBackend"
+RATE_LIMIT_CACHE = "default"
+
+# Serve large menu and order lists through the plain-dict serializers in
+# LittleLemonAPI.fastserializers. Output is identical; see bench_serializers.
+FAST_SERIALIZERS = False
+
+# Responses smaller than this many bytes are sent uncompressed (see
+# LittleLemonAPI.middleware.CompressionMiddleware).
+COMPRESSION_MIN_SIZE = 1024
+
+# Rows the order and menu exports read, serialize and send at a time.
+EXPORT_CHUNK_SIZE = 2000
+
+# Background jobs (see LittleLemonAPI.tasks), run by `manage.py run_tasks`:
+# seconds a worker may run a job before another may take it over, and the
+# delay before a failed job's first retry, doubled for each one after.
+TASK_LEASE = 5 * 60
+TASK_RETRY_DELAY = 10
+
+# Have a worker assign each new order to the least busy delivery crew member.
+# Every checkout then queues a job, so only turn this on where
+# `manage.py run_tasks` runs: without a worker, jobs pile up and orders are
+# never assigned.
+AUTO_ASSIGN_DELIVERY_CREW = os.environ.get("LITTLELEMON_AUTO_ASSIGN") == "1"
+
+# Live order events (/api/orders/events, under ASGI): seconds between
+# keep-alive comments, and after which a stream ends and the client reconnects.
+ORDER_EVENTS_HEARTBEAT = 15
+ORDER_EVENTS_TIMEOUT = 5 * 60
+
+# Log a request's query shape once it runs this many times (likely N+1).
+DUPLICATE_QUERY_THRESHOLD = 3
+
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "handlers": {
+        "console": {"class": "logging.StreamHandler"},
+    },
+    "loggers": {
+        # one JSON line per request, plus warnings for repeated queries
+        "LittleLemonAPI.metrics": {"handlers": ["console"], "level": "INFO"},
+        "LittleLemonAPI.tasks": {"handlers": ["console"], "level": "INFO"},
     },
 }
 
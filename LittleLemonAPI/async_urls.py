@@ -0,0 +1,12 @@
+from django.urls import path
+from . import async_views
+
+# read paths with async views; everything else resolves through urls.py
+urlpatterns = [
+    path("menu-items", async_views.menu_items),
+    path("menu-items/<int:id>", async_views.single_item),
+    path("category/<int:pk>", async_views.category_detail, name="category-detail"),
+    path("orders", async_views.order),
+    # streamed, so ASGI only
+    path("orders/events", async_views.order_events),
+]
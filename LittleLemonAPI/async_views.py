@@ -0,0 +1,302 @@
+"""Async versions of the read-heavy views, for deployments under ASGI.
+
+LittleLemon/asgi_urls.py routes the menu, category and order list URLs here.
+GET requests that negotiate JSON are answered on the event loop with the
+async ORM; anything else (writes, HEAD and OPTIONS, XML or the browsable API)
+is handed to the sync view in views.py, in a thread, which is where ASGI
+would have run it anyway. Responses match the sync views byte for byte.
+"""
+
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import Http404, HttpResponse, StreamingHttpResponse
+from django.utils.cache import patch_vary_headers
+from rest_framework.authentication import get_authorization_header
+from rest_framework.exceptions import (
+    APIException,
+    AuthenticationFailed,
+    MethodNotAllowed,
+    NotAcceptable,
+    NotAuthenticated,
+    PermissionDenied,
+    ValidationError,
+)
+from rest_framework.negotiation import DefaultContentNegotiation
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+from rest_framework.views import exception_handler
+
+from . import events, fastserializers, fieldsets, views
+from .authentication import AsyncTokenAuthentication, aauthenticate
+from .cache import catalogue_cache
+from .etags import acategory_etag, amenu_etag, amenu_item_etag, not_modified
+from .models import Category, MenuItem, Order
+from .pagination import OrderCursorPagination
+from .roles import DELIVERY_CREW, MANAGER, aget_roles
+from .search import asearch_menu_items
+from .serializers import (
+    CategorySerializer,
+    MenuItemFilterSerializer,
+    MenuItemSerializer,
+    OrderFilterSerializer,
+    OrderSerializer,
+)
+
+
+def negotiate(request):
+    """Wrap request for DRF, or return None unless the client wants JSON."""
+    request = Request(request, authenticators=())
+    renderers = [renderer() for renderer in api_settings.DEFAULT_RENDERER_CLASSES]
+    try:
+        renderer, media_type = DefaultContentNegotiation().select_renderer(
+            request, renderers
+        )
+    except NotAcceptable:
+        return None
+    if not isinstance(renderer, JSONRenderer):
+        return None
+    request.accepted_renderer, request.accepted_media_type = renderer, media_type
+    return request
+
+
+def render(request, data, status=200, headers=None):
+    renderer = request.accepted_renderer
+    content = renderer.render(data, request.accepted_media_type, {"request": request})
+    return HttpResponse(
+        content, status=status, headers=headers, content_type=renderer.media_type
+    )
+
+
+def handle_exception(request, exc):
+    response = exception_handler(exc, {"request": request})
+    if response is None:
+        raise exc
+    headers = {}
+    if isinstance(exc, (NotAuthenticated, AuthenticationFailed)):
+        headers["WWW-Authenticate"] = AsyncTokenAuthentication().authenticate_header(
+            request
+        )
+    return render(request, response.data, response.status_code, headers)
+
+
+def read_view(sync_view):
+    """Serve JSON GETs with the decorated coroutine and the rest with
+    sync_view, adding the headers DRF adds to every response of the latter."""
+    default_headers = sync_view.cls().default_response_headers
+
+    def decorator(handler):
+        @wraps(handler)
+        async def view(request, *args, **kwargs):
+            if request.method != "GET" or (drf_request := negotiate(request)) is None:
+                return await sync_to_async(sync_view)(request, *args, **kwargs)
+            try:
+                # DRF authenticates every request, so a bad token is a 401
+                # even where no user is needed
+                user_auth = await aauthenticate(drf_request)
+                if user_auth is not None:
+                    drf_request.user, drf_request.auth = user_auth
+                response = await handler(drf_request, *args, **kwargs)
+            except (APIException, Http404) as exc:
+                response = handle_exception(drf_request, exc)
+            for header, value in default_headers.items():
+                response.headers.setdefault(header, value)
+            if not has_token(drf_request):
+                # DRF fell back to the session, which the session middleware
+                # marks with Vary: Cookie
+                patch_vary_headers(response, ["Cookie"])
+            return response
+
+        # DRF views are csrf exempt and enforce CSRF in SessionAuthentication
+        view.csrf_exempt = True
+        return view
+
+    return decorator
+
+
+def has_token(request):
+    auth = get_authorization_header(request).split()
+    return (
+        bool(auth)
+        and auth[0].lower() == AsyncTokenAuthentication.keyword.lower().encode()
+    )
+
+
+async def aget_object_or_404(queryset, **kwargs):
+    try:
+        return await queryset.aget(**kwargs)
+    except queryset.model.DoesNotExist:
+        raise Http404(f"No {queryset.model._meta.object_name} matches the given query.")
+
+
+@read_view(views.menu_items)
+async def menu_items(request):
+    filters = MenuItemFilterSerializer(
+        data={k: v for k, v in request.query_params.items() if v != ""}
+    )
+    filters.is_valid(raise_exception=True)
+    params = filters.validated_data
+    fieldset = fieldsets.MENU_ITEM.parse(request.query_params)
+    etag = await amenu_etag(request)
+    unchanged = not_modified(request, etag)
+    if unchanged is not None:
+        return unchanged
+    cache_key = await catalogue_cache.akey(request, etag)
+    cached = await catalogue_cache.aget(cache_key)
+    if cached is not None:
+        cached["ETag"] = etag
+        return cached
+    items = fieldsets.menu_items(MenuItem.objects.all(), fieldset)
+    if "category" in params:
+        items = items.filter(category__title=params["category"])
+    if params["featured"] is not None:
+        items = items.filter(featured=params["featured"])
+    if "to_price" in params:
+        items = items.filter(price__lte=params["to_price"])
+    if "search" in params:
+        items = await asearch_menu_items(items, params["search"])
+    if "ordering" in params:
+        items = items.order_by(*filters.ORDERINGS[params["ordering"]])
+    elif "search" not in params:
+        items = items.order_by("id")
+    fast = fastserializers.enabled() and fieldset is fieldsets.MENU_ITEM.default
+    if fast:
+        items = fastserializers.menu_item_rows(items)
+    # a page past the end comes back empty, as from the sync view's
+    # Paginator, but without its count query; the filters bound page, so
+    # the offset fits the database's integers
+    offset = (params["page"] - 1) * params["perpage"]
+    items = [item async for item in items[offset : offset + params["perpage"]]]
+    if fast:
+        data = fastserializers.serialize_menu_items(items)
+    else:
+        data = MenuItemSerializer(items, many=True, fieldset=fieldset).data
+    response = render(request, data, headers={"ETag": etag})
+    return await catalogue_cache.astore(cache_key, response)
+
+
+@read_view(views.single_item)
+async def single_item(request, id):
+    fieldset = fieldsets.MENU_ITEM.parse(request.query_params)
+    etag = await amenu_item_etag(request, id)
+    # None for a missing item, which aget_object_or_404 answers below
+    if etag is not None:
+        unchanged = not_modified(request, etag)
+        if unchanged is not None:
+            return unchanged
+    cache_key = await catalogue_cache.akey(request, etag)
+    cached = await catalogue_cache.aget(cache_key)
+    if cached is not None:
+        cached["ETag"] = etag
+        return cached
+    item = await aget_object_or_404(
+        fieldsets.menu_items(MenuItem.objects.all(), fieldset), pk=id
+    )
+    serialized_item = MenuItemSerializer(item, fieldset=fieldset)
+    response = render(request, serialized_item.data, headers={"ETag": etag})
+    return await catalogue_cache.astore(cache_key, response)
+
+
+@read_view(views.category_detail)
+async def category_detail(request, pk):
+    etag = await acategory_etag(request, pk)
+    # None for a missing category, which aget_object_or_404 answers below
+    if etag is not None:
+        unchanged = not_modified(request, etag)
+        if unchanged is not None:
+            return unchanged
+    category = await aget_object_or_404(Category.objects.all(), pk=pk)
+    serialized_category = CategorySerializer(category)
+    return render(request, serialized_category.data, headers={"ETag": etag})
+
+
+@read_view(views.order)
+async def order(request):
+    if not request.user.is_authenticated:
+        raise NotAuthenticated()
+    roles = await aget_roles(request.user)
+    orders = Order.objects.all()
+    if MANAGER in roles:
+        items = orders.all()
+    elif DELIVERY_CREW in roles:
+        items = orders.filter(delivery_crew=request.user)
+    else:
+        items = orders.filter(user=request.user)
+    filters = OrderFilterSerializer(data=request.query_params)
+    filters.is_valid(raise_exception=True)
+    if filters.validated_data["status"] is not None:
+        items = items.filter(status=filters.validated_data["status"])
+    if "from_date" in filters.validated_data:
+        items = items.filter(date__gte=filters.validated_data["from_date"])
+    if "to_date" in filters.validated_data:
+        items = items.filter(date__lte=filters.validated_data["to_date"])
+    if "delivery_crew" in filters.validated_data:
+        items = items.filter(
+            delivery_crew__username=filters.validated_data["delivery_crew"]
+        )
+    if "user" in filters.validated_data:
+        items = items.filter(user__username=filters.validated_data["user"])
+    fieldset = fieldsets.ORDER.parse(request.query_params)
+    paginator = OrderCursorPagination()
+    if fastserializers.enabled() and fieldset is fieldsets.ORDER.default:
+        rows = fastserializers.order_rows(items)
+        page = await paginator.apaginate_queryset(rows, request)
+        data = await sync_to_async(fastserializers.serialize_orders)(page)
+    else:
+        page = await paginator.apaginate_queryset(
+            fieldsets.orders(items, fieldset), request
+        )
+        data = OrderSerializer(page, many=True, fieldset=fieldset).data
+    headers = {}
+    next_link = paginator.get_next_link()
+    if next_link is not None:
+        headers["Link"] = f'<{next_link}>; rel="next"'
+    return render(request, data, headers=headers)
+
+
+async def order_events(request):
+    """Server-sent events for changes to the orders the user may see, or to
+    the one order given as ?order=<id>, starting with its current state."""
+    drf_request = Request(request, authenticators=())
+    drf_request.accepted_renderer = JSONRenderer()
+    drf_request.accepted_media_type = JSONRenderer.media_type
+    # subscribed before reading the order, so no change falls in between
+    subscription = events.broker.subscribe()
+    try:
+        if request.method != "GET":
+            raise MethodNotAllowed(request.method)
+        user_auth = await aauthenticate(drf_request)
+        if user_auth is None:
+            raise NotAuthenticated()
+        user = user_auth[0]
+        roles = await aget_roles(user)
+        order = drf_request.query_params.get("order")
+        if order is not None:
+            if not order.isdigit():
+                raise ValidationError({"order": ["A valid integer is required."]})
+            order = events.order_event(
+                await aget_object_or_404(Order.objects.all(), pk=order)
+            )
+            if not events.visible(order, user, roles):
+                raise PermissionDenied("This is not your order.")
+    except (APIException, Http404) as exc:
+        subscription.close()
+        return handle_exception(drf_request, exc)
+    return StreamingHttpResponse(
+        events.stream(
+            subscription,
+            user,
+            roles,
+            settings.ORDER_EVENTS_HEARTBEAT,
+            settings.ORDER_EVENTS_TIMEOUT,
+            order,
+        ),
+        content_type="text/event-stream",
+        # no caching, and no buffering by nginx
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+order_events.csrf_exempt = True
@@ -0,0 +1,175 @@
+import threading
+from collections import Counter, OrderedDict
+from time import monotonic
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import DEFAULT_DB_ALIAS
+from django.utils.translation import gettext_lazy as _
+from rest_framework import exceptions
+from rest_framework.authentication import SessionAuthentication, TokenAuthentication
+
+from .roles import aget_roles, get_roles, remember_roles
+
+# the user fields kept per token, in model order for Model.from_db(); the
+# rest load from the database on access
+USER_FIELDS = ["id", "is_superuser", "username", "is_staff", "is_active"]
+
+
+class TokenCache:
+    """Bounded LRU of token key -> (user field values, group names).
+
+    Entries expire ttl seconds after they are stored, and the least recently
+    used go once there are more than maxsize. signals.py forgets the entries
+    of deleted tokens (djoser logout) and of changed users and memberships.
+    The cache is per process, so a change made in another worker is seen
+    there within ttl seconds.
+    """
+
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.stats = Counter(hits=0, misses=0)
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        # bumped by every forget, so a lookup that raced one is not stored
+        self._generation = 0
+
+    def generation(self):
+        return self._generation
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] <= monotonic():
+                del self._entries[key]
+                entry = None
+            if entry is None:
+                self.stats["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self.stats["hits"] += 1
+            return entry[1]
+
+    def set(self, key, value, generation):
+        """Store value unless anything was forgotten since generation()."""
+        with self._lock:
+            if generation != self._generation:
+                return
+            self._entries[key] = (monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def forget(self, *keys):
+        with self._lock:
+            self._generation += 1
+            for key in keys:
+                self._entries.pop(key, None)
+
+    def forget_users(self, *user_ids):
+        user_ids = set(user_ids)
+        with self._lock:
+            self._generation += 1
+            for key, (_, (values, _)) in list(self._entries.items()):
+                if values[0] in user_ids:
+                    del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+token_cache = TokenCache(
+    getattr(settings, "TOKEN_CACHE_SIZE", 10000),
+    getattr(settings, "TOKEN_CACHE_TTL", 60),
+)
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """TokenAuthentication that looks tokens up in token_cache first.
+
+    A hit costs no query, and comes with the user's group names, so role
+    checks in the view cost none either. A miss runs DRF's token query and
+    the role query and caches both.
+    """
+
+    def authenticate_credentials(self, key):
+        cached = token_cache.get(key)
+        if cached is None:
+            generation = token_cache.generation()
+            model = self.get_model()
+            try:
+                token = model.objects.select_related("user").get(key=key)
+            except model.DoesNotExist:
+                raise exceptions.AuthenticationFailed(_("Invalid token."))
+            roles = get_roles(token.user)
+            self.store(token, roles, generation)
+        else:
+            token = self.restore(key, *cached)
+        if not token.user.is_active:
+            raise exceptions.AuthenticationFailed(_("User inactive or deleted."))
+        return token.user, token
+
+    def store(self, token, roles, generation):
+        values = tuple(getattr(token.user, field) for field in USER_FIELDS)
+        token_cache.set(token.key, (values, roles), generation)
+
+    def restore(self, key, values, roles):
+        # deferred instances, as if loaded with only() from the primary,
+        # where users and tokens are always read
+        user = User.from_db(DEFAULT_DB_ALIAS, USER_FIELDS, values)
+        remember_roles(user, roles)
+        token = self.get_model().from_db(
+            DEFAULT_DB_ALIAS, ["key", "user_id"], [key, user.pk]
+        )
+        token.user = user
+        return token
+
+
+class _TokenKey(TokenAuthentication):
+    # DRF's header parsing and error messages, stopping short of the lookup
+    def authenticate_credentials(self, key):
+        return key
+
+
+class AsyncTokenAuthentication(CachedTokenAuthentication):
+    """CachedTokenAuthentication with a lookup async views can await."""
+
+    async def aauthenticate(self, request):
+        key = _TokenKey().authenticate(request)
+        if key is None:
+            return None
+        cached = token_cache.get(key)
+        if cached is None:
+            generation = token_cache.generation()
+            model = self.get_model()
+            try:
+                token = await model.objects.select_related("user").aget(key=key)
+            except model.DoesNotExist:
+                raise exceptions.AuthenticationFailed(_("Invalid token."))
+            roles = await aget_roles(token.user)
+            self.store(token, roles, generation)
+        else:
+            token = self.restore(key, *cached)
+        if not token.user.is_active:
+            raise exceptions.AuthenticationFailed(_("User inactive or deleted."))
+        return token.user, token
+
+
+async def aauthenticate(request):
+    """Authenticate a DRF request the way DEFAULT_AUTHENTICATION_CLASSES do:
+    by token, else by session. Returns the (user, auth) pair or None.
+
+    Sessions are rare on the API, so they are checked through the sync
+    authenticator, and only when the request carries a session cookie.
+    """
+    user_auth = await AsyncTokenAuthentication().aauthenticate(request)
+    if user_auth is None and settings.SESSION_COOKIE_NAME in request.COOKIES:
+        user_auth = await sync_to_async(SessionAuthentication().authenticate)(request)
+    return user_auth
@@ -0,0 +1,135 @@
+from collections import Counter
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import caches
+from django.http import HttpResponse
+
+
+class CatalogueCache:
+    """Read-through cache of rendered menu responses.
+
+    Entries are keyed on the catalogue version, so a single counter bump
+    (see signals.py) invalidates every cached page at once; stale entries
+    simply age out of the backend. The backend is whatever cache alias
+    settings.CATALOGUE_CACHE names. Methods prefixed with "a" are the
+    async counterparts used by async_views.py.
+    """
+
+    version_key = "catalogue:version"
+    # query parameters that change the menu_items response, with defaults
+    params = {
+        "category": "",
+        "featured": "",
+        "to_price": "",
+        "search": "",
+        "ordering": "",
+        "page": "1",
+        "perpage": "2",
+        "fields": "",
+        # None where an empty value means something else than no value:
+        # ?expand= expands nothing, no expand everything
+        "expand": None,
+    }
+
+    def __init__(self, alias):
+        self.alias = alias
+        self.stats = Counter(hits=0, misses=0)
+
+    @property
+    def backend(self):
+        return caches[self.alias]
+
+    def version(self):
+        version = self.backend.get(self.version_key)
+        if version is None:
+            self.backend.add(self.version_key, 1, timeout=None)
+            version = self.backend.get(self.version_key, 1)
+        return version
+
+    async def aversion(self):
+        version = await self.backend.aget(self.version_key)
+        if version is None:
+            await self.backend.aadd(self.version_key, 1, timeout=None)
+            version = await self.backend.aget(self.version_key, 1)
+        return version
+
+    def bump(self):
+        try:
+            return self.backend.incr(self.version_key)
+        except ValueError:
+            self.backend.add(self.version_key, 1, timeout=None)
+            return self.backend.incr(self.version_key)
+
+    def key(self, request, etag=""):
+        """Cache key for this request, or None if it must not be cached:
+        in the browsable API, or without an ETag (a missing item).
+
+        Take the key before querying the database so that a write landing
+        mid-request files the response under the old, already stale version.
+        Including the response's ETag keeps cached bodies consistent with the
+        ETag sent alongside them, even before the version bump lands.
+        """
+        # the browsable API embeds the user and CSRF token in the page
+        if request.accepted_renderer.format == "api" or etag is None:
+            return None
+        return self.make_key(request, etag, self.version())
+
+    async def akey(self, request, etag=""):
+        if request.accepted_renderer.format == "api" or etag is None:
+            return None
+        return self.make_key(request, etag, await self.aversion())
+
+    def make_key(self, request, etag, version):
+        query = {}
+        for name, default in self.params.items():
+            value = request.query_params.get(name)
+            if default is None:
+                query[name] = "*" if value is None else value
+            else:
+                query[name] = value or default
+        return "catalogue:{}:{}:{}:{}:{}".format(
+            version,
+            etag,
+            request.accepted_media_type,
+            request.path,
+            urlencode(sorted(query.items())),
+        )
+
+    def get(self, key):
+        if key is None:
+            return None
+        return self.response(self.backend.get(key))
+
+    async def aget(self, key):
+        if key is None:
+            return None
+        return self.response(await self.backend.aget(key))
+
+    def response(self, cached):
+        if cached is None:
+            self.stats["misses"] += 1
+            return None
+        self.stats["hits"] += 1
+        content, content_type = cached
+        return HttpResponse(content, content_type=content_type)
+
+    def store(self, key, response):
+        if key is None:
+            return response
+
+        def callback(rendered):
+            if rendered.status_code == 200:
+                self.backend.set(key, (rendered.content, rendered["Content-Type"]))
+
+        response.add_post_render_callback(callback)
+        return response
+
+    async def astore(self, key, response):
+        """Store an already rendered response, as async views return."""
+        if key is not None and response.status_code == 200:
+            await self.backend.aset(key, (response.content, response["Content-Type"]))
+        return response
+
+
+catalogue_cache = CatalogueCache(getattr(settings, "CATALOGUE_CACHE", "default"))
@@ -0,0 +1,134 @@
+"""Cart totals, maintained alongside the Cart rows.
+
+Each user's CartSummary holds the number of items in their cart and its
+subtotal, so the cart endpoint does not add them up on every read. Code
+that adds or removes Cart rows reports the change here: added() applies the
+difference, emptied() zeroes the summary. add_items() does both parts of
+adding to a cart. Menu price changes reprice every
+open cart holding the item through reprice(), which signals.py calls for
+saved and deleted menu items. rebuild() recomputes summaries from the rows,
+for carts written in bulk.
+"""
+
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import F, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+from .models import Cart, CartSummary, MenuItem
+from .serializers import MAX_QUANTITY, TAX_RATE
+
+CENT = Decimal("0.01")
+
+
+class QuantityTooLarge(ValueError):
+    pass
+
+
+def added(user, item_count, subtotal):
+    """Add item_count items costing subtotal (either may be negative) to
+    user's summary."""
+    changes = {
+        "item_count": F("item_count") + item_count,
+        "subtotal": F("subtotal") + subtotal,
+    }
+    if not CartSummary.objects.filter(user=user).update(**changes):
+        # first item: create the row, unless a concurrent request just did
+        CartSummary.objects.bulk_create([CartSummary(user=user)], ignore_conflicts=True)
+        CartSummary.objects.filter(user=user).update(**changes)
+
+
+def add_items(user, quantities):
+    """Add quantities ({MenuItem: quantity}) to user's cart and return the
+    Cart rows written. Items already in the cart have their quantity raised.
+
+    However many items there are, this is one read of the matching rows and
+    one INSERT ... ON CONFLICT DO UPDATE, plus the summary update, in one
+    transaction. Raises QuantityTooLarge, writing nothing, if an item's
+    quantity would exceed MAX_QUANTITY.
+    """
+    with transaction.atomic():
+        # concurrent additions to one cart take turns on its summary row,
+        # which may not exist yet, so none reads rows another is replacing
+        CartSummary.objects.bulk_create([CartSummary(user=user)], ignore_conflicts=True)
+        list(CartSummary.objects.select_for_update().filter(user=user).values("pk"))
+        existing = {
+            menuitem_id: (quantity, price)
+            for menuitem_id, quantity, price in Cart.objects.filter(
+                user=user, menuitem__in=quantities
+            ).values_list("menuitem", "quantity", "price")
+        }
+        rows = []
+        for menuitem, quantity in quantities.items():
+            quantity += existing.get(menuitem.pk, (0, 0))[0]
+            if quantity > MAX_QUANTITY:
+                raise QuantityTooLarge(menuitem)
+            rows.append(
+                Cart(
+                    user=user,
+                    menuitem=menuitem,
+                    quantity=quantity,
+                    unit_price=menuitem.price,
+                    price=menuitem.price * quantity,
+                )
+            )
+        Cart.objects.bulk_create(
+            rows,
+            update_conflicts=True,
+            unique_fields=["menuitem", "user"],
+            update_fields=["quantity", "unit_price", "price"],
+        )
+        added(
+            user,
+            sum(quantities.values()),
+            sum(row.price - existing.get(row.menuitem_id, (0, 0))[1] for row in rows),
+        )
+    return rows
+
+
+def emptied(user):
+    CartSummary.objects.filter(user=user).update(item_count=0, subtotal=0)
+
+
+def rebuild(user_ids):
+    """Recompute the summaries of the users with user_ids from their Cart rows."""
+    CartSummary.objects.bulk_create(
+        [CartSummary(user_id=user_id) for user_id in user_ids], ignore_conflicts=True
+    )
+    rows = Cart.objects.filter(user=OuterRef("user")).order_by().values("user")
+    CartSummary.objects.filter(user__in=user_ids).update(
+        item_count=Coalesce(
+            Subquery(rows.annotate(total=Sum("quantity")).values("total")), 0
+        ),
+        subtotal=Coalesce(
+            Subquery(rows.annotate(total=Sum("price")).values("total")), Decimal(0)
+        ),
+    )
+
+
+def reprice(menuitem_ids):
+    """Bring the Cart rows holding menuitem_ids to the items' current prices
+    and update their owners' summaries, in three queries at most."""
+    price = MenuItem.objects.filter(pk=OuterRef("menuitem")).values("price")
+    stale = Cart.objects.filter(menuitem__in=menuitem_ids).exclude(
+        unit_price=Subquery(price)
+    )
+    user_ids = list(stale.values_list("user", flat=True).distinct())
+    if not user_ids:
+        return
+    stale.update(unit_price=Subquery(price), price=F("quantity") * Subquery(price))
+    rebuild(user_ids)
+
+
+def summarize(summary):
+    """The totals for CartSummarySerializer, from a CartSummary or None."""
+    item_count = summary.item_count if summary is not None else 0
+    subtotal = summary.subtotal if summary is not None else Decimal("0.00")
+    tax = (subtotal * (TAX_RATE - 1)).quantize(CENT)
+    return {
+        "item_count": item_count,
+        "subtotal": subtotal,
+        "tax": tax,
+        "total": subtotal + tax,
+    }
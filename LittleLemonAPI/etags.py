@@ -0,0 +1,77 @@
+from hashlib import sha1
+
+from django.db.models import Count, Max
+from django.utils.cache import get_conditional_response, quote_etag
+
+from .models import Category, MenuItem
+
+
+def make_etag(request, *fingerprint):
+    """Strong ETag for one representation (media type) of a resource whose
+    state is summarised by fingerprint."""
+    parts = [request.accepted_media_type, *map(str, fingerprint)]
+    return quote_etag(sha1("|".join(parts).encode()).hexdigest())
+
+
+# one aggregate: any edit moves a max(updated_at), any delete the count
+MENU_FINGERPRINT = {
+    "count": Count("id"),
+    "updated": Max("updated_at"),
+    "category_updated": Max("category__updated_at"),
+}
+
+
+def menu_item_fingerprint(id):
+    return MenuItem.objects.filter(pk=id).values_list(
+        "updated_at", "category__updated_at"
+    )
+
+
+def category_fingerprint(pk):
+    return Category.objects.filter(pk=pk).values_list("updated_at")
+
+
+def menu_etag(request):
+    fingerprint = MenuItem.objects.aggregate(**MENU_FINGERPRINT)
+    return make_etag(request, *fingerprint.values())
+
+
+def fingerprinted_etag(request, pk, fingerprint):
+    # None for a row that does not exist, which has no representation
+    if fingerprint is None:
+        return None
+    return make_etag(request, pk, fingerprint)
+
+
+def menu_item_etag(request, id):
+    """ETag of a menu item, or None if there is no such item."""
+    return fingerprinted_etag(request, id, menu_item_fingerprint(id).first())
+
+
+def category_etag(request, pk):
+    """ETag of a category, or None if there is no such category."""
+    return fingerprinted_etag(request, pk, category_fingerprint(pk).first())
+
+
+# the same, for async views
+
+
+async def amenu_etag(request):
+    fingerprint = await MenuItem.objects.aaggregate(**MENU_FINGERPRINT)
+    return make_etag(request, *fingerprint.values())
+
+
+async def amenu_item_etag(request, id):
+    return fingerprinted_etag(request, id, await menu_item_fingerprint(id).afirst())
+
+
+async def acategory_etag(request, pk):
+    return fingerprinted_etag(request, pk, await category_fingerprint(pk).afirst())
+
+
+def not_modified(request, etag):
+    """Return a 304 response if the client already holds etag, else None."""
+    response = get_conditional_response(request, etag=etag)
+    if response is not None:
+        response["ETag"] = etag
+    return response
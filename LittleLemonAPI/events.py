@@ -0,0 +1,134 @@
+"""Live order changes, pushed to clients as server-sent events.
+
+signals.py publishes every saved order to the broker once its transaction
+commits. Each open /api/orders/events stream holds a subscription, a
+bounded queue on the event loop that serves it, and passes on the changes
+its user may see: managers see every order, delivery crew the orders
+assigned to them and customers their own, as in the order list. A client
+that falls further behind than the queue holds has its stream closed, and
+reconnects.
+
+The broker is in-process: a stream hears about orders saved by the process
+serving it. Run the API as one ASGI process, or have clients fall back to
+reading /api/orders now and then, when workers elsewhere (manage.py
+run_tasks) change orders.
+"""
+
+import asyncio
+import json
+import threading
+
+from .roles import DELIVERY_CREW, MANAGER
+
+
+def order_event(order):
+    return {
+        "id": order.pk,
+        "user": order.user_id,
+        "delivery_crew": order.delivery_crew_id,
+        "status": bool(order.status),
+    }
+
+
+def visible(event, user, roles):
+    """Whether user, with roles, may see event: the order list's scoping."""
+    if MANAGER in roles:
+        return True
+    if DELIVERY_CREW in roles:
+        return event["delivery_crew"] == user.pk
+    return event["user"] == user.pk
+
+
+def format_event(event):
+    return f"event: order\ndata: {json.dumps(event, separators=(',', ':'))}\n\n"
+
+
+class Subscription:
+    def __init__(self, broker, maxsize):
+        self.broker = broker
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize)
+        self.overflowed = False
+
+    def deliver(self, event):
+        # on the subscriber's event loop
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.overflowed = True
+            self.close()
+
+    async def get(self, timeout):
+        """The next event, or None if there was none for timeout seconds."""
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+
+class Broker:
+    def __init__(self, maxsize=100):
+        self.maxsize = maxsize
+        self._subscriptions = set()
+        self._lock = threading.Lock()
+
+    def subscribe(self):
+        """A Subscription to every event published from now on. Call from
+        the event loop that will read it, and close() it when done."""
+        subscription = Subscription(self, self.maxsize)
+        with self._lock:
+            self._subscriptions.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscriptions.discard(subscription)
+
+    def publish(self, event):
+        """Send event to every subscription, from any thread."""
+        with self._lock:
+            subscriptions = list(self._subscriptions)
+        for subscription in subscriptions:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.deliver, event)
+            except RuntimeError:
+                # its event loop has shut down
+                self.unsubscribe(subscription)
+
+    def __len__(self):
+        return len(self._subscriptions)
+
+
+broker = Broker()
+
+
+async def stream(subscription, user, roles, heartbeat, timeout, order=None):
+    """The text of an event stream for user: the order changes they may
+    see, a comment every heartbeat seconds to keep idle connections open,
+    and an end after timeout seconds so that connections whose client has
+    gone do not pile up. Given an order's event, the stream starts with it
+    and follows that order only."""
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    order_id = order["id"] if order is not None else None
+    try:
+        # how long to wait before reconnecting, in milliseconds
+        yield "retry: 1000\n\n"
+        if order is not None:
+            yield format_event(order)
+        while not subscription.overflowed:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            event = await subscription.get(min(heartbeat, remaining))
+            if event is None:
+                yield ": keep-alive\n\n"
+            elif (order_id is None or event["id"] == order_id) and visible(
+                event, user, roles
+            ):
+                yield format_event(event)
+    finally:
+        subscription.close()
@@ -0,0 +1,148 @@
+"""Streamed NDJSON and CSV exports of the orders and the menu.
+
+Rows are read with QuerySet.iterator(chunk_size=...), which also prefetches
+order items one chunk at a time, and each chunk is serialized and sent
+before the next is read. Memory use depends on the chunk size, not on how
+many rows there are.
+"""
+
+import csv
+import io
+import json
+from itertools import islice
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.http import StreamingHttpResponse
+from rest_framework.utils.encoders import JSONEncoder
+
+from .models import MenuItem, Order
+from .serializers import MenuItemSerializer, OrderSerializer
+
+ORDER_COLUMNS = [
+    "order_id",
+    "date",
+    "user_id",
+    "username",
+    "status",
+    "delivery_crew_id",
+    "total",
+    "menuitem_id",
+    "quantity",
+    "unit_price",
+    "price",
+]
+
+MENU_COLUMNS = ["id", "title", "price", "featured", "category_id", "category"]
+
+
+def chunk_size():
+    return getattr(settings, "EXPORT_CHUNK_SIZE", 2000)
+
+
+def chunks(queryset):
+    rows = queryset.iterator(chunk_size=chunk_size())
+    while chunk := list(islice(rows, chunk_size())):
+        yield chunk
+
+
+def ndjson(queryset, serializer_class):
+    for chunk in chunks(queryset):
+        yield "".join(
+            json.dumps(row, cls=JSONEncoder, ensure_ascii=False, separators=(",", ":"))
+            + "\n"
+            for row in serializer_class(chunk, many=True).data
+        )
+
+
+def csv_lines(header, rows):
+    """Yield header and then rows (an iterable of lists per chunk) as CSV."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(header)
+    for chunk in rows:
+        writer.writerows(chunk)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def order_csv(queryset):
+    def lines(order):
+        head = [
+            order.id,
+            order.date,
+            order.user_id,
+            order.user.username,
+            int(order.status),
+            order.delivery_crew_id or "",
+            order.total,
+        ]
+        items = order.orderitems.all()
+        if not items:
+            return [head + ["", "", "", ""]]
+        return [
+            head + [item.menuitem_id, item.quantity, item.unit_price, item.price]
+            for item in items
+        ]
+
+    def rows():
+        for chunk in chunks(queryset):
+            yield [line for order in chunk for line in lines(order)]
+
+    return csv_lines(ORDER_COLUMNS, rows())
+
+
+def menu_csv(queryset):
+    def rows():
+        for chunk in chunks(queryset):
+            yield [
+                [
+                    item.id,
+                    item.title,
+                    item.price,
+                    int(item.featured),
+                    item.category_id,
+                    item.category.title,
+                ]
+                for item in chunk
+            ]
+
+    return csv_lines(MENU_COLUMNS, rows())
+
+
+def orders(format):
+    queryset = Order.objects.with_details().order_by("id")
+    if format == "csv":
+        return order_csv(queryset)
+    return ndjson(queryset, OrderSerializer)
+
+
+def menu(format):
+    queryset = MenuItem.objects.select_related("category").order_by("id")
+    if format == "csv":
+        return menu_csv(queryset)
+    return ndjson(queryset, MenuItemSerializer)
+
+
+async def aiterate(iterator):
+    """Serve a sync iterator of database reads from an async server, one
+    chunk at a time in the thread the request's sync code runs in."""
+    done = object()
+    while (chunk := await sync_to_async(next)(iterator, done)) is not done:
+        yield chunk
+
+
+def stream(request, lines, content_type, filename):
+    """A StreamingHttpResponse downloading lines as filename."""
+    if isinstance(getattr(request, "_request", request), ASGIRequest):
+        # Django would otherwise read the whole iterator into memory first
+        lines = aiterate(lines)
+    return StreamingHttpResponse(
+        lines,
+        content_type=content_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
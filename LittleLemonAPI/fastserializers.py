@@ -0,0 +1,108 @@
+"""Plain-dict read serializers for large list responses.
+
+These build the exact structures MenuItemSerializer and OrderSerializer
+produce, but straight from .values() rows, skipping model instantiation and
+DRF's per-field machinery. Enable them with settings.FAST_SERIALIZERS; the
+rendered bytes are the same either way.
+"""
+
+from collections import defaultdict
+
+from django.conf import settings
+
+from .models import OrderItem
+from .serializers import TAX_RATE
+
+MENU_ITEM_FIELDS = (
+    "id",
+    "title",
+    "price",
+    "featured",
+    "category__id",
+    "category__slug",
+    "category__title",
+)
+
+ORDER_FIELDS = (
+    "id",
+    "user__id",
+    "user__username",
+    "user__first_name",
+    "user__last_name",
+    "user__email",
+    "status",
+    "total",
+    "date",
+)
+
+ORDER_ITEM_FIELDS = ("order_id", "menuitem_id", "quantity", "unit_price", "price")
+
+
+def enabled():
+    return getattr(settings, "FAST_SERIALIZERS", False)
+
+
+def decimal(value):
+    # DecimalField(coerce_to_string=True); the database already quantizes
+    return f"{value:f}"
+
+
+def menu_item_rows(queryset):
+    return queryset.values(*MENU_ITEM_FIELDS)
+
+
+def serialize_menu_items(rows):
+    return [
+        {
+            "id": row["id"],
+            "title": row["title"],
+            "price": decimal(row["price"]),
+            "featured": row["featured"],
+            "price_after_tax": row["price"] * TAX_RATE,
+            "category": {
+                "id": row["category__id"],
+                "slug": row["category__slug"],
+                "title": row["category__title"],
+            },
+        }
+        for row in rows
+    ]
+
+
+def order_rows(queryset):
+    return queryset.values(*ORDER_FIELDS)
+
+
+def serialize_orders(rows):
+    orderitems = defaultdict(list)
+    item_rows = (
+        OrderItem.objects.filter(order_id__in=[row["id"] for row in rows])
+        .order_by("id")
+        .values_list(*ORDER_ITEM_FIELDS)
+    )
+    for order_id, menuitem, quantity, unit_price, price in item_rows:
+        orderitems[order_id].append(
+            {
+                "menuitem": menuitem,
+                "quantity": quantity,
+                "unit_price": decimal(unit_price),
+                "price": decimal(price),
+            }
+        )
+    return [
+        {
+            "id": row["id"],
+            "user": {
+                "id": row["user__id"],
+                "username": row["user__username"],
+                "first_name": row["user__first_name"],
+                "last_name": row["user__last_name"],
+                "email": row["user__email"],
+            },
+            "orderitems": orderitems[row["id"]],
+            "status": row["status"],
+            "total": decimal(row["total"]),
+            "date": row["date"].isoformat(),
+        }
+        for row in rows
+    ]
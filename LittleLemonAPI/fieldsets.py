@@ -0,0 +1,141 @@
+"""Sparse fieldsets (?fields=) and expansion (?expand=) for menu items and
+orders.
+
+fields names the top-level fields to send; all of them when it is absent or
+empty. expand names the relations to embed as objects, every one of them
+when it is absent, as the endpoints always did. A relation that is not
+expanded is sent as its id (category, user) or left out (orderitems).
+
+The same Fieldset plans the query: only() the columns the requested fields
+read, and a join or prefetch only for the relations that are expanded.
+"""
+
+from django.db.models import Prefetch
+from rest_framework.exceptions import ValidationError
+
+from .models import OrderItem
+
+
+class Fieldset:
+    def __init__(self, fields, expand):
+        self.fields = fields
+        self.expand = expand
+
+    def __contains__(self, name):
+        return name in self.fields
+
+    def expands(self, name):
+        return name in self.fields and name in self.expand
+
+
+class Spec:
+    """The fields of one representation. columns maps each field to the
+    model fields it reads, relations each expandable field to the related
+    fields its nested serializer reads."""
+
+    def __init__(self, columns, relations):
+        self.columns = columns
+        self.relations = relations
+        self.default = Fieldset(tuple(columns), frozenset(relations))
+
+    def parse(self, query_params):
+        """The Fieldset query_params ask for. Raises ValidationError for
+        names that are not fields, or not relations, of this spec."""
+        fields = self.names(query_params, "fields", self.columns)
+        expand = self.names(query_params, "expand", self.relations)
+        if fields is None and expand is None:
+            return self.default
+        return Fieldset(
+            tuple(name for name in self.columns if fields is None or name in fields),
+            frozenset(self.relations if expand is None else expand),
+        )
+
+    def names(self, query_params, param, allowed):
+        value = query_params.get(param)
+        if value is None:
+            return None
+        names = {name.strip() for name in value.split(",") if name.strip()}
+        if param == "fields" and not names:
+            # ?fields= (or blanks and commas only) asks for every field
+            return None
+        unknown = sorted(names - set(allowed))
+        if unknown:
+            raise ValidationError(
+                {
+                    param: [
+                        f"Unknown {param} {', '.join(unknown)}; choose from "
+                        f"{', '.join(allowed)}."
+                    ]
+                }
+            )
+        return names
+
+    def only(self, fieldset):
+        """The only() arguments for fieldset, before any relations."""
+        columns = {"id"}
+        for name in fieldset.fields:
+            columns.update(self.columns[name])
+        return columns
+
+
+MENU_ITEM = Spec(
+    columns={
+        "id": (),
+        "title": ("title",),
+        "price": ("price",),
+        "featured": ("featured",),
+        "price_after_tax": ("price",),
+        "category": ("category",),
+    },
+    relations={"category": ("category__id", "category__slug", "category__title")},
+)
+
+ORDER = Spec(
+    columns={
+        "id": (),
+        "user": ("user",),
+        "orderitems": (),
+        "status": ("status",),
+        "total": ("total",),
+        "date": ("date",),
+    },
+    relations={
+        "user": (
+            "user__id",
+            "user__username",
+            "user__first_name",
+            "user__last_name",
+            "user__email",
+        ),
+        "orderitems": (),
+    },
+)
+
+
+def menu_items(queryset, fieldset):
+    """Plan a MenuItem queryset for MenuItemSerializer(fieldset=fieldset)."""
+    columns = MENU_ITEM.only(fieldset)
+    if fieldset.expands("category"):
+        queryset = queryset.select_related("category")
+        columns.update(MENU_ITEM.relations["category"])
+    return queryset.only(*columns)
+
+
+def orders(queryset, fieldset):
+    """Plan an Order queryset for OrderSerializer(fieldset=fieldset)."""
+    # the date makes the order list's cursor, the user id the detail's
+    # ownership check
+    columns = ORDER.only(fieldset) | {"date", "user"}
+    if fieldset.expands("user"):
+        queryset = queryset.select_related("user")
+        columns.update(ORDER.relations["user"])
+    if fieldset.expands("orderitems"):
+        queryset = queryset.prefetch_related(
+            Prefetch(
+                "orderitems",
+                queryset=OrderItem.objects.order_by("id").only(
+                    "order", "menuitem", "quantity", "unit_price", "price"
+                ),
+            )
+        )
+    return queryset.only(*columns)
@@ -0,0 +1,73 @@
+"""Idempotency-Key support for POST endpoints.
+
+A client that sends an Idempotency-Key header can retry the request as often
+as it likes: the first attempt runs, and later ones get its response back,
+marked with an Idempotent-Replayed header. The key is claimed in the same
+transaction as the request's writes, so a request either ran and recorded
+its response or did neither; a retry racing the first attempt waits for it
+on the key's unique index. Keys are per user, expire after
+settings.IDEMPOTENCY_KEY_TTL seconds, and may not be reused for a different
+request.
+"""
+
+import json
+from datetime import timedelta
+from hashlib import sha256
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.response import Response
+
+from .models import IdempotencyKey
+
+HEADER = "Idempotency-Key"
+
+
+def fingerprint(request):
+    body = json.dumps(request.data, sort_keys=True, default=str)
+    return sha256(
+        f"{request.method} {request.get_full_path()}\n{body}".encode()
+    ).hexdigest()
+
+
+def run(request, handler):
+    """Return handler(), run in a transaction, or the response it returned
+    for an earlier request with the same Idempotency-Key."""
+    key = request.headers.get(HEADER)
+    if key is None:
+        with transaction.atomic():
+            return handler()
+    if not 0 < len(key) <= IdempotencyKey._meta.get_field("key").max_length:
+        return Response(
+            f"{HEADER} must be 1 to 255 characters.", status.HTTP_400_BAD_REQUEST
+        )
+    request_fingerprint = fingerprint(request)
+    expired = timezone.now() - timedelta(seconds=settings.IDEMPOTENCY_KEY_TTL)
+    with transaction.atomic():
+        IdempotencyKey.objects.filter(user=request.user, created__lt=expired).delete()
+        try:
+            with transaction.atomic():
+                claim = IdempotencyKey.objects.create(
+                    user=request.user, key=key, fingerprint=request_fingerprint
+                )
+        except IntegrityError:
+            # used before, or by a concurrent request that has now committed
+            claim = IdempotencyKey.objects.get(user=request.user, key=key)
+            if claim.fingerprint != request_fingerprint:
+                return Response(
+                    f"This {HEADER} was used for a different request.",
+                    status.HTTP_422_UNPROCESSABLE_ENTITY,
+                )
+            return Response(
+                claim.response, claim.status, headers={"Idempotent-Replayed": "true"}
+            )
+        response = handler()
+        if response.status_code >= 500:
+            # nothing worth replaying: undo the claim so a retry runs again
+            transaction.set_rollback(True)
+            return response
+        claim.status, claim.response = response.status_code, response.data
+        claim.save(update_fields=["status", "response"])
+        return response
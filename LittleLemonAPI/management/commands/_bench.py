@@ -0,0 +1,53 @@
+import logging
+import tempfile
+from contextlib import contextmanager
+from pathlib import Path
+
+from django.core.management.base import CommandError
+from django.db import connection, transaction
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+
+class Rollback(Exception):
+    pass
+
+
+@contextmanager
+def rolled_back():
+    """Run a benchmark against the configured database without keeping any
+    of the rows it creates."""
+    try:
+        with transaction.atomic():
+            yield
+            raise Rollback
+    except Rollback:
+        pass
+
+
+@contextmanager
+def throwaway_database(name):
+    """Run a load test against a migrated, initially empty SQLite file that
+    is deleted afterwards, with per-request logging silenced."""
+    settings_dict = connection.settings_dict
+    if settings_dict["ENGINE"] != "django.db.backends.sqlite3":
+        raise CommandError("Load tests run against SQLite only.")
+    setup_test_environment()
+    workdir = tempfile.TemporaryDirectory()
+    settings_dict["TEST"]["NAME"] = str(Path(workdir.name) / f"{name}.sqlite3")
+    old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+    # 5xx responses are counted in the report, not logged with tracebacks,
+    # and per-request metrics lines would drown the report
+    loggers = [
+        logging.getLogger("django.request"),
+        logging.getLogger("LittleLemonAPI.metrics"),
+    ]
+    for logger in loggers:
+        logger.disabled = True
+    try:
+        yield
+    finally:
+        for logger in loggers:
+            logger.disabled = False
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        teardown_test_environment()
+        workdir.cleanup()
@@ -0,0 +1,132 @@
+import asyncio
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from time import perf_counter
+
+from django.core.management.base import BaseCommand
+from django.test import AsyncClient, Client, override_settings
+
+from .loadtest import ENDPOINTS, Dataset, add_dataset_arguments, percentile
+from ._bench import throwaway_database
+
+READ_ENDPOINTS = (
+    "menu-items list",
+    "menu-item detail",
+    "category detail",
+    "orders list (customer)",
+)
+
+# mode: the URLconf it is served with
+MODES = {
+    "wsgi": "LittleLemon.urls",
+    "asgi sync views": "LittleLemon.urls",
+    "asgi async views": "LittleLemon.asgi_urls",
+}
+
+# the catalogue responses come from the database rather than the cache
+NO_CATALOGUE_CACHE = {
+    "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"},
+    "catalogue": {"BACKEND": "django.core.cache.backends.dummy.DummyCache"},
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare the read endpoints' throughput under WSGI (sync views, one "
+        "thread per connection) and under ASGI, with the sync views and with "
+        "the async views, at each concurrency level. Requests go through "
+        "Django's in-process test clients against a throwaway SQLite "
+        "database, so HTTP parsing and the network are not included."
+    )
+
+    def add_arguments(self, parser):
+        add_dataset_arguments(parser)
+        parser.add_argument(
+            "--requests", type=int, default=2000, help="Requests per run."
+        )
+        parser.add_argument(
+            "--concurrency",
+            type=int,
+            nargs="+",
+            default=[100, 500],
+            help="Concurrent connections to compare.",
+        )
+        parser.add_argument(
+            "--no-cache",
+            action="store_true",
+            help="Bypass the catalogue cache so every menu read hits the database.",
+        )
+
+    def handle(self, *args, **options):
+        endpoints = [e for e in ENDPOINTS if e.name in READ_ENDPOINTS]
+        caches = nullcontext()
+        if options["no_cache"]:
+            caches = override_settings(CACHES=NO_CATALOGUE_CACHE)
+        with throwaway_database("bench_asgi"), caches:
+            dataset = Dataset(options)
+            dataset.seed()
+            self.stdout.write(
+                f"{'endpoint':<24} {'conns':>5} {'mode':<17} {'rps':>7} "
+                f"{'p50 ms':>8} {'p99 ms':>8}  statuses"
+            )
+            for endpoint in endpoints:
+                for concurrency in options["concurrency"]:
+                    for mode in MODES:
+                        result = self.run(mode, endpoint, dataset, concurrency, options)
+                        self.stdout.write(
+                            f"{endpoint.name:<24} {concurrency:>5} {mode:<17} "
+                            f"{result['rps']:>7} {result['p50_ms']:>8} "
+                            f"{result['p99_ms']:>8}  {result['statuses']}"
+                        )
+
+    def run(self, mode, endpoint, dataset, concurrency, options):
+        with override_settings(ROOT_URLCONF=MODES[mode]):
+            if mode == "wsgi":
+                return self.wsgi(endpoint, dataset, concurrency, options)
+            return asyncio.run(self.asgi(endpoint, dataset, concurrency, options))
+
+    def request(self, endpoint, dataset):
+        user = dataset.user(endpoint.role)
+        headers = {"Authorization": f"Token {dataset.tokens[user.id]}"}
+        return endpoint.path(dataset, user), headers
+
+    def wsgi(self, endpoint, dataset, concurrency, options):
+        def call(_):
+            path, headers = self.request(endpoint, dataset)
+            client = Client(raise_request_exception=False)
+            start = perf_counter()
+            response = client.get(path, headers=headers)
+            return perf_counter() - start, response.status_code
+
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            start = perf_counter()
+            samples = list(pool.map(call, range(options["requests"])))
+            return self.summary(samples, perf_counter() - start)
+
+    async def asgi(self, endpoint, dataset, concurrency, options):
+        remaining = iter(range(options["requests"]))
+        samples = []
+
+        async def connection():
+            # one keep-alive connection: requests one after another
+            client = AsyncClient(raise_request_exception=False)
+            for _ in remaining:
+                path, headers = self.request(endpoint, dataset)
+                start = perf_counter()
+                response = await client.get(path, headers=headers)
+                samples.append((perf_counter() - start, response.status_code))
+
+        start = perf_counter()
+        await asyncio.gather(*(connection() for _ in range(concurrency)))
+        return self.summary(samples, perf_counter() - start)
+
+    def summary(self, samples, wall):
+        latencies = sorted(elapsed * 1000 for elapsed, _ in samples)
+        statuses = Counter(status for _, status in samples)
+        return {
+            "rps": round(len(samples) / wall, 1),
+            "p50_ms": round(percentile(latencies, 50), 2),
+            "p99_ms": round(percentile(latencies, 99), 2),
+            "statuses": " ".join(f"{k}x{v}" for k, v in sorted(statuses.items())),
+        }
@@ -0,0 +1,69 @@
+from statistics import mean, median
+from time import perf_counter
+
+from django.contrib.auth.models import Group, User
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIRequestFactory
+
+from LittleLemonAPI import views
+from LittleLemonAPI.authentication import CachedTokenAuthentication, token_cache
+from LittleLemonAPI.roles import MANAGER
+
+from ._bench import rolled_back
+
+VIEWS = [
+    ("GET /api/orders", views.order, "/api/orders"),
+    ("GET /api/cart/menu-items", views.cartitems, "/api/cart/menu-items"),
+    ("GET /api/manager-view/", views.manager_view, "/api/manager-view/"),
+]
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare queries and time per token-authenticated request with DRF's "
+        "TokenAuthentication and with CachedTokenAuthentication. Everything "
+        "runs in a transaction that is rolled back afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=20)
+        parser.add_argument("--requests", type=int, default=500)
+
+    def handle(self, *args, **options):
+        with rolled_back():
+            self.run(options["users"], options["requests"])
+
+    def run(self, users, requests):
+        group, _ = Group.objects.get_or_create(name=MANAGER)
+        users = User.objects.bulk_create(
+            User(username=f"bench-auth-{i}") for i in range(users)
+        )
+        group.user_set.add(*users[::2])
+        tokens = [Token.objects.create(user=user).key for user in users]
+        factory = APIRequestFactory()
+        self.stdout.write(
+            f"{'endpoint':<26} {'authentication':<26} {'queries':>8} {'median ms':>10}"
+        )
+        for name, view, path in VIEWS:
+            for authentication in (TokenAuthentication, CachedTokenAuthentication):
+                token_cache.clear()
+                handler = view.cls.as_view(authentication_classes=[authentication])
+                queries, timings = [], []
+                for i in range(requests):
+                    request = factory.get(
+                        path, HTTP_AUTHORIZATION=f"Token {tokens[i % len(tokens)]}"
+                    )
+                    with CaptureQueriesContext(connection) as captured:
+                        start = perf_counter()
+                        response = handler(request)
+                        timings.append(perf_counter() - start)
+                    assert response.status_code in (200, 403), response.data
+                    queries.append(len(captured))
+                self.stdout.write(
+                    f"{name:<26} {authentication.__name__:<26} "
+                    f"{mean(queries):>8.2f} {median(timings) * 1000:>10.3f}"
+                )
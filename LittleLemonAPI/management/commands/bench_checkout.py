@@ -0,0 +1,62 @@
+from decimal import Decimal
+from statistics import median
+from time import perf_counter
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from LittleLemonAPI import views
+from LittleLemonAPI.models import Cart, Category, MenuItem
+
+from ._bench import rolled_back
+
+
+class Command(BaseCommand):
+    help = (
+        "Time checkout (POST /api/orders) for carts of different sizes. "
+        "Everything runs in a transaction that is rolled back afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sizes", type=int, nargs="+", default=[1, 10, 100])
+        parser.add_argument("--repeat", type=int, default=20)
+
+    def handle(self, *args, **options):
+        with rolled_back():
+            self.run(options["sizes"], options["repeat"])
+
+    def run(self, sizes, repeat):
+        user = User.objects.create_user("bench-checkout")
+        category = Category.objects.create(slug="bench", title="Bench")
+        menuitems = MenuItem.objects.bulk_create(
+            MenuItem(title=f"Bench {i}", price=Decimal("9.99"), category=category)
+            for i in range(max(sizes))
+        )
+        factory = APIRequestFactory()
+        self.stdout.write(f"{'items':>6} {'queries':>8} {'median ms':>10}")
+        for size in sizes:
+            timings = []
+            for _ in range(repeat):
+                Cart.objects.bulk_create(
+                    Cart(
+                        user=user,
+                        menuitem=menuitem,
+                        quantity=1,
+                        unit_price=menuitem.price,
+                        price=menuitem.price,
+                    )
+                    for menuitem in menuitems[:size]
+                )
+                request = factory.post("/api/orders")
+                force_authenticate(request, user)
+                with CaptureQueriesContext(connection) as queries:
+                    start = perf_counter()
+                    response = views.order(request)
+                    timings.append(perf_counter() - start)
+                assert response.status_code == 201, response.data
+            self.stdout.write(
+                f"{size:>6} {len(queries):>8} {median(timings) * 1000:>10.2f}"
+            )
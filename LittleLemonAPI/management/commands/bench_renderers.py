@@ -0,0 +1,84 @@
+import gzip
+from statistics import median
+from time import perf_counter
+
+from django.core.management.base import BaseCommand
+from rest_framework.renderers import JSONRenderer
+from rest_framework_xml.renderers import XMLRenderer
+
+from LittleLemonAPI.middleware import CompressionMiddleware, brotli
+from LittleLemonAPI.models import MenuItem, Order
+from LittleLemonAPI.renderers import MessagePackRenderer
+from LittleLemonAPI.serializers import MenuItemSerializer, OrderSerializer
+
+from ._bench import rolled_back
+from .bench_serializers import Command as SerializerBenchmark
+
+RENDERERS = [JSONRenderer, MessagePackRenderer, XMLRenderer]
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare bytes on the wire and render time per renderer for large "
+        "menu and order lists, uncompressed and compressed as "
+        "CompressionMiddleware would. Everything runs in a transaction that "
+        "is rolled back afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--menu-items", type=int, default=1_000)
+        parser.add_argument("--orders", type=int, default=1_000)
+        parser.add_argument("--items-per-order", type=int, default=3)
+        parser.add_argument("--repeat", type=int, default=5)
+
+    def handle(self, *args, **options):
+        with rolled_back():
+            SerializerBenchmark().seed(options)
+            menu = MenuItem.objects.select_related("category").order_by("id")
+            orders = Order.objects.with_details().order_by("-date", "-id")
+            self.compare(
+                f"{options['menu_items']} menu items",
+                MenuItemSerializer(menu, many=True).data,
+                options["repeat"],
+            )
+            self.compare(
+                f"{options['orders']} orders",
+                OrderSerializer(orders, many=True).data,
+                options["repeat"],
+            )
+
+    def compare(self, label, data, repeat):
+        middleware = CompressionMiddleware(lambda request: None)
+        encodings = {
+            "gzip": lambda content: gzip.compress(
+                content, middleware.gzip_level, mtime=0
+            )
+        }
+        if brotli is not None:
+            encodings["br"] = lambda content: brotli.compress(
+                content, quality=middleware.brotli_quality
+            )
+        header = f"{'renderer':<10} {'bytes':>10} {'render ms':>10}"
+        for encoding in encodings:
+            header += f" {encoding + ' bytes':>11} {encoding + ' ms':>8}"
+        self.stdout.write(f"{label}:\n{header}")
+        for renderer_class in RENDERERS:
+            renderer = renderer_class()
+            content, render_time = self.time(lambda: renderer.render(data), repeat)
+            if isinstance(content, str):
+                # XMLRenderer leaves encoding to the response
+                content = content.encode(renderer.charset)
+            line = f"{renderer.format:<10} {len(content):>10} {render_time:>10.2f}"
+            for compress in encodings.values():
+                compressed, compress_time = self.time(lambda: compress(content), repeat)
+                line += f" {len(compressed):>11} {compress_time:>8.2f}"
+            self.stdout.write(line)
+
+    def time(self, func, repeat):
+        """func()'s result and its median run time in milliseconds."""
+        timings = []
+        for _ in range(repeat):
+            start = perf_counter()
+            result = func()
+            timings.append(perf_counter() - start)
+        return result, median(timings) * 1000
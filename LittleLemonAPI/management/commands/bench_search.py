@@ -0,0 +1,87 @@
+import random
+from decimal import Decimal
+from statistics import median
+from time import perf_counter
+
+from django.core.management.base import BaseCommand
+
+from LittleLemonAPI.models import Category, MenuItem
+from LittleLemonAPI.search import search_menu_items
+
+from ._bench import rolled_back
+
+WORDS = (
+    "lemon garlic chicken grilled salmon pasta penne spaghetti carbonara "
+    "arrabbiata pesto basil tomato mozzarella greek salad feta olive lamb "
+    "souvlaki hummus falafel pita baklava tiramisu sorbet espresso"
+).split()
+SYLLABLES = "ka lo mi ne ra so tu vi ze po da fe gi hu ja".split()
+
+
+class Command(BaseCommand):
+    help = (
+        "Time menu search on a large catalogue: the old title__contains "
+        "scan and its case-insensitive variant against the full-text index. "
+        "Everything runs in a transaction that is rolled back afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--menu-items", type=int, default=100_000)
+        parser.add_argument("--repeat", type=int, default=5)
+        parser.add_argument(
+            "--terms",
+            nargs="+",
+            default=["kalomine", "kalomi", "kalomne", "carbonara", "tiramsu"],
+        )
+
+    def handle(self, *args, **options):
+        with rolled_back():
+            self.seed(options["menu_items"])
+            items = MenuItem.objects.select_related("category")
+            self.stdout.write(
+                f"{'term':>12} {'contains ms':>12} {'icontains ms':>13} {'index ms':>9}"
+            )
+            for term in options["terms"]:
+                contains = self.time(
+                    lambda: items.filter(title__contains=term), options["repeat"]
+                )
+                icontains = self.time(
+                    lambda: items.filter(title__icontains=term), options["repeat"]
+                )
+                indexed = self.time(
+                    lambda: search_menu_items(items, term), options["repeat"]
+                )
+                self.stdout.write(
+                    f"{term:>12} {contains:>12.2f} {icontains:>13.2f} {indexed:>9.2f}"
+                )
+
+    def seed(self, count):
+        rng = random.Random(0)
+        categories = Category.objects.bulk_create(
+            Category(slug=f"bench-{i}", title=f"Bench {word}")
+            for i, word in enumerate(WORDS[:8])
+        )
+        MenuItem.objects.bulk_create(
+            (
+                MenuItem(
+                    title=" ".join(
+                        ["".join(rng.choices(SYLLABLES, k=4)), *rng.sample(WORDS, 2)]
+                    ).title(),
+                    price=Decimal(rng.randint(100, 5000)) / 100,
+                    category=rng.choice(categories),
+                )
+                for _ in range(count)
+            ),
+            batch_size=5000,
+        )
+
+    def time(self, search, repeat):
+        # what a menu-items page costs: the count plus the first page
+        timings = []
+        for _ in range(repeat):
+            start = perf_counter()
+            queryset = search()
+            queryset.count()
+            list(queryset[:20])
+            timings.append(perf_counter() - start)
+        return median(timings) * 1000
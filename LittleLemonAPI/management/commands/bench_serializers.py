@@ -0,0 +1,99 @@
+from datetime import date, timedelta
+from decimal import Decimal
+from statistics import median
+from time import perf_counter
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.renderers import JSONRenderer
+
+from LittleLemonAPI import fastserializers
+from LittleLemonAPI.models import Category, MenuItem, Order, OrderItem
+from LittleLemonAPI.serializers import MenuItemSerializer, OrderSerializer
+
+from ._bench import rolled_back
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare DRF serializers with the plain-dict fast serializers on large "
+        "menu and order lists, checking both render to the same bytes. "
+        "Everything runs in a transaction that is rolled back afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--menu-items", type=int, default=10_000)
+        parser.add_argument("--orders", type=int, default=1_000)
+        parser.add_argument("--items-per-order", type=int, default=3)
+        parser.add_argument("--repeat", type=int, default=5)
+
+    def handle(self, *args, **options):
+        with rolled_back():
+            self.seed(options)
+            menu = MenuItem.objects.select_related("category").order_by("id")
+            orders = Order.objects.order_by("-date", "-id")
+            self.compare(
+                f"{options['menu_items']} menu items",
+                lambda: MenuItemSerializer(menu, many=True).data,
+                lambda: fastserializers.serialize_menu_items(
+                    fastserializers.menu_item_rows(menu)
+                ),
+                options["repeat"],
+            )
+            self.compare(
+                f"{options['orders']} orders",
+                lambda: OrderSerializer(orders.with_details(), many=True).data,
+                lambda: fastserializers.serialize_orders(
+                    list(fastserializers.order_rows(orders))
+                ),
+                options["repeat"],
+            )
+
+    def seed(self, options):
+        category = Category.objects.create(slug="bench", title="Bench")
+        menuitems = MenuItem.objects.bulk_create(
+            MenuItem(
+                title=f"Bench {i}",
+                price=Decimal(i % 5000) / 100 + 1,
+                category=category,
+            )
+            for i in range(max(options["menu_items"], options["items_per_order"]))
+        )
+        user = User.objects.create_user("bench-serializers")
+        orders = Order.objects.bulk_create(
+            Order(
+                user=user,
+                total=Decimal("30.00"),
+                date=date.today() - timedelta(days=i % 365),
+            )
+            for i in range(options["orders"])
+        )
+        OrderItem.objects.bulk_create(
+            OrderItem(
+                order=order,
+                menuitem=menuitem,
+                quantity=1,
+                unit_price=menuitem.price,
+                price=menuitem.price,
+            )
+            for order in orders
+            for menuitem in menuitems[: options["items_per_order"]]
+        )
+
+    def compare(self, label, slow, fast, repeat):
+        renderer = JSONRenderer()
+        results = {}
+        for name, build in (("drf", slow), ("fast", fast)):
+            timings = []
+            for _ in range(repeat):
+                start = perf_counter()
+                content = renderer.render(build())
+                timings.append(perf_counter() - start)
+            results[name] = (median(timings), content)
+        if results["drf"][1] != results["fast"][1]:
+            raise CommandError(f"{label}: fast serializers rendered different bytes")
+        drf, fast = results["drf"][0], results["fast"][0]
+        self.stdout.write(
+            f"{label}: drf {drf * 1000:.1f} ms, fast {fast * 1000:.1f} ms "
+            f"({drf / fast:.1f}x)"
+        )
@@ -0,0 +1,51 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from LittleLemonAPI.menuimport import import_items, read_csv
+
+
+class Command(BaseCommand):
+    help = (
+        "Create and update menu items from a CSV file with the columns of "
+        "/api/menu-items/export, or a JSON list of the same fields. Rows with "
+        "an id update that item, e.g. id,price for a price change; nothing is "
+        "written unless every row is valid."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="A .csv or .json file.")
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Only validate the rows.",
+        )
+
+    def handle(self, *args, **options):
+        path = options["path"]
+        try:
+            with open(path, encoding="utf-8", newline="") as file:
+                rows = read_csv(file) if path.endswith(".csv") else json.load(file)
+        except (OSError, ValueError) as exc:
+            raise CommandError(f"Could not read {path}: {exc}")
+        if not isinstance(rows, list) or not all(isinstance(row, dict) for row in rows):
+            raise CommandError(f"{path} does not hold a list of menu items.")
+        applied, results = import_items(rows, dry_run=options["dry_run"])
+        invalid = [result for result in results if "errors" in result]
+        for result in results:
+            if "errors" in result:
+                errors = "; ".join(
+                    f"{field}: {' '.join(map(str, messages))}"
+                    for field, messages in result["errors"].items()
+                )
+                self.stdout.write(f"row {result['row']}: {errors}")
+            elif applied:
+                self.stdout.write(
+                    f"row {result['row']}: {result['status']} {result['id']}"
+                )
+        if invalid:
+            raise CommandError(f"{len(invalid)} of {len(rows)} rows are invalid.")
+        if applied:
+            self.stdout.write(f"Imported {len(rows)} menu items.")
+        else:
+            self.stdout.write(f"All {len(rows)} menu items are valid.")
@@ -0,0 +1,584 @@
+import json
+import random
+import subprocess
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta, timezone
+from decimal import Decimal
+from pathlib import Path
+from time import perf_counter
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import Group, User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from rest_framework.authtoken.models import Token
+
+from LittleLemonAPI import carts, rollups, urls
+from LittleLemonAPI.models import Cart, Category, MenuItem, Order, OrderItem
+from LittleLemonAPI.roles import DELIVERY_CREW, MANAGER
+
+from ._bench import throwaway_database
+
+PASSWORD = "loadtest-password"
+
+
+@dataclass
+class Endpoint:
+    """One request shape to drive: route is the pattern in LittleLemonAPI.urls,
+    path/data/setup are called with the dataset and a random generator."""
+
+    name: str
+    method: str
+    route: str
+    role: str
+    path: object
+    data: object = None
+    setup: object = None
+
+
+class Dataset:
+    def __init__(self, options):
+        self.rng = random.Random(options["seed"])
+        self.options = options
+        self.lock = threading.Lock()
+
+    def seed(self):
+        options, rng = self.options, self.rng
+        password = make_password(PASSWORD)
+        self.users = {}
+        for role, count in (
+            ("manager", options["managers"]),
+            ("crew", options["crew"]),
+            ("customer", options["customers"]),
+            # only ever moved in and out of groups by the role endpoints
+            ("spare", options["spare_users"]),
+        ):
+            self.users[role] = User.objects.bulk_create(
+                User(username=f"{role}-{i}", password=password) for i in range(count)
+            )
+        Group.objects.get_or_create(name=MANAGER)[0].user_set.add(
+            *self.users["manager"]
+        )
+        Group.objects.get_or_create(name=DELIVERY_CREW)[0].user_set.add(
+            *self.users["crew"]
+        )
+        self.tokens = {
+            token.user_id: token.key
+            for token in Token.objects.bulk_create(
+                Token(user=user, key=Token.generate_key())
+                for users in self.users.values()
+                for user in users
+            )
+        }
+        self.categories = Category.objects.bulk_create(
+            Category(slug=f"category-{i}", title=f"Category {i}")
+            for i in range(options["categories"])
+        )
+        self.menuitems = MenuItem.objects.bulk_create(
+            MenuItem(
+                title=f"Item {i}",
+                price=Decimal(rng.randint(100, 3000)) / 100,
+                featured=rng.random() < 0.2,
+                category=rng.choice(self.categories),
+            )
+            for i in range(options["menu_items"])
+        )
+        Cart.objects.bulk_create(
+            Cart(
+                user=user,
+                menuitem=menuitem,
+                quantity=1,
+                unit_price=menuitem.price,
+                price=menuitem.price,
+            )
+            for user in self.users["customer"]
+            for menuitem in rng.sample(self.menuitems, options["cart_items"])
+        )
+        carts.rebuild([user.pk for user in self.users["customer"]])
+        orders = Order.objects.bulk_create(
+            Order(
+                user=rng.choice(self.users["customer"]),
+                delivery_crew=rng.choice(self.users["crew"] + [None]),
+                status=rng.random() < 0.5,
+                total=Decimal("0.00"),
+                date=date.today() - timedelta(days=rng.randint(0, 365)),
+            )
+            for _ in range(options["orders"])
+        )
+        OrderItem.objects.bulk_create(
+            OrderItem(
+                order=order,
+                menuitem=menuitem,
+                quantity=1,
+                unit_price=menuitem.price,
+                price=menuitem.price,
+            )
+            for order in orders
+            for menuitem in rng.sample(self.menuitems, 3)
+        )
+        rollups.rebuild()
+        self.orders = orders
+        # orders the DELETE endpoint may consume, one per request
+        self.disposable_orders = [order.id for order in orders[: options["requests"]]]
+
+    def user(self, role):
+        with self.lock:
+            return self.rng.choice(self.users[role])
+
+    def choice(self, items):
+        with self.lock:
+            return self.rng.choice(items)
+
+    def pop_order(self):
+        with self.lock:
+            return self.disposable_orders.pop() if self.disposable_orders else 0
+
+
+def fill_cart(dataset, user):
+    clear_cart(dataset, user)
+    menuitem = dataset.choice(dataset.menuitems)
+    cart = Cart.objects.create(
+        user=user,
+        menuitem=menuitem,
+        quantity=2,
+        unit_price=menuitem.price,
+        price=menuitem.price * 2,
+    )
+    carts.added(user, cart.quantity, cart.price)
+
+
+def clear_cart(dataset, user):
+    Cart.objects.filter(user=user).delete()
+    carts.emptied(user)
+
+
+def customer_order(dataset, user):
+    return Order.objects.filter(user=user).values_list("id", flat=True).first() or 0
+
+
+ENDPOINTS = [
+    Endpoint("metrics", "get", "metrics", "manager", lambda d, u: "/api/metrics"),
+    Endpoint(
+        "orders export",
+        "get",
+        "orders/export",
+        "manager",
+        lambda d, u: "/api/orders/export?format=csv",
+    ),
+    Endpoint(
+        "menu-items export",
+        "get",
+        "menu-items/export",
+        "manager",
+        lambda d, u: "/api/menu-items/export",
+    ),
+    Endpoint(
+        "analytics",
+        "get",
+        "analytics",
+        "manager",
+        lambda d, u: "/api/analytics?from_date=2000-01-01",
+    ),
+    Endpoint(
+        "menu-items list",
+        "get",
+        "menu-items",
+        "customer",
+        lambda d, u: f"/api/menu-items?perpage=20&page={d.rng.randint(1, 5)}",
+    ),
+    Endpoint(
+        "menu-items create",
+        "post",
+        "menu-items",
+        "manager",
+        lambda d, u: "/api/menu-items",
+        data=lambda d, u: {
+            "title": f"New item {d.rng.random()}",
+            "price": "9.99",
+            "category_id": d.choice(d.categories).id,
+        },
+    ),
+    Endpoint(
+        "menu-item detail",
+        "get",
+        "menu-items/<int:id>",
+        "customer",
+        lambda d, u: f"/api/menu-items/{d.choice(d.menuitems).id}",
+    ),
+    Endpoint(
+        "menu-item update",
+        "patch",
+        "menu-items/<int:id>",
+        "manager",
+        lambda d, u: f"/api/menu-items/{d.choice(d.menuitems).id}",
+        data=lambda d, u: {"price": f"{d.rng.randint(100, 3000) / 100:.2f}"},
+    ),
+    Endpoint(
+        "menu-items bulk price update",
+        "post",
+        "menu-items/bulk",
+        "manager",
+        lambda d, u: "/api/menu-items/bulk",
+        data=lambda d, u: [
+            {"id": menuitem.id, "price": f"{d.rng.randint(100, 3000) / 100:.2f}"}
+            for menuitem in d.rng.sample(d.menuitems, 20)
+        ],
+    ),
+    Endpoint(
+        "category detail",
+        "get",
+        "category/<int:pk>",
+        "customer",
+        lambda d, u: f"/api/category/{d.choice(d.categories).id}",
+    ),
+    Endpoint("secret", "get", "secret/", "customer", lambda d, u: "/api/secret/"),
+    Endpoint(
+        "token login",
+        "post",
+        "api-token-auth/",
+        "anonymous",
+        lambda d, u: "/api/api-token-auth/",
+        data=lambda d, u: {
+            "username": d.user("customer").username,
+            "password": PASSWORD,
+        },
+    ),
+    Endpoint(
+        "manager view",
+        "get",
+        "manager-view/",
+        "manager",
+        lambda d, u: "/api/manager-view/",
+    ),
+    Endpoint(
+        "throttle check",
+        "get",
+        "throttle-check/",
+        "anonymous",
+        lambda d, u: "/api/throttle-check/",
+    ),
+    Endpoint(
+        "throttle check (auth)",
+        "get",
+        "throttle-check-auth/",
+        "customer",
+        lambda d, u: "/api/throttle-check-auth/",
+    ),
+    Endpoint(
+        "managers list",
+        "get",
+        "groups/manager/users",
+        "manager",
+        lambda d, u: "/api/groups/manager/users",
+    ),
+    Endpoint(
+        "managers add",
+        "post",
+        "groups/manager/users",
+        "manager",
+        lambda d, u: "/api/groups/manager/users",
+        data=lambda d, u: {"username": d.user("spare").username},
+    ),
+    Endpoint(
+        "managers remove",
+        "delete",
+        "groups/manager/users/<int:id>",
+        "manager",
+        lambda d, u: f"/api/groups/manager/users/{d.user('spare').id}",
+    ),
+    Endpoint(
+        "delivery crew list",
+        "get",
+        "groups/delivery-crew/users",
+        "manager",
+        lambda d, u: "/api/groups/delivery-crew/users",
+    ),
+    Endpoint(
+        "delivery crew add",
+        "post",
+        "groups/delivery-crew/users",
+        "manager",
+        lambda d, u: "/api/groups/delivery-crew/users",
+        data=lambda d, u: {"username": d.user("spare").username},
+    ),
+    Endpoint(
+        "delivery crew remove",
+        "delete",
+        "groups/delivery-crew/users/<int:id>",
+        "manager",
+        lambda d, u: f"/api/groups/delivery-crew/users/{d.user('spare').id}",
+    ),
+    Endpoint(
+        "cart list",
+        "get",
+        "cart/menu-items",
+        "customer",
+        lambda d, u: "/api/cart/menu-items",
+    ),
+    Endpoint(
+        "cart add",
+        "post",
+        "cart/menu-items",
+        "customer",
+        lambda d, u: "/api/cart/menu-items",
+        data=lambda d, u: {"item": d.choice(d.menuitems).id, "quantity": 1},
+        setup=clear_cart,
+    ),
+    Endpoint(
+        "cart add (batch)",
+        "post",
+        "cart/menu-items/batch",
+        "customer",
+        lambda d, u: "/api/cart/menu-items/batch",
+        data=lambda d, u: [
+            {"item": d.choice(d.menuitems).id, "quantity": 1} for _ in range(5)
+        ],
+        setup=clear_cart,
+    ),
+    Endpoint(
+        "cart empty",
+        "delete",
+        "cart/menu-items",
+        "customer",
+        lambda d, u: "/api/cart/menu-items",
+        setup=fill_cart,
+    ),
+    Endpoint(
+        "orders list (manager)", "get", "orders", "manager", lambda d, u: "/api/orders"
+    ),
+    Endpoint("orders list (crew)", "get", "orders", "crew", lambda d, u: "/api/orders"),
+    Endpoint(
+        "orders list (customer)",
+        "get",
+        "orders",
+        "customer",
+        lambda d, u: "/api/orders",
+    ),
+    Endpoint(
+        "checkout",
+        "post",
+        "orders",
+        "customer",
+        lambda d, u: "/api/orders",
+        setup=fill_cart,
+    ),
+    Endpoint(
+        "order detail",
+        "get",
+        "orders/<int:id>",
+        "customer",
+        lambda d, u: f"/api/orders/{customer_order(d, u)}",
+    ),
+    Endpoint(
+        "order update (manager)",
+        "patch",
+        "orders/<int:id>",
+        "manager",
+        lambda d, u: f"/api/orders/{d.choice(d.orders).id}",
+        data=lambda d, u: {"status": 1, "delivery_crew": d.user("crew").username},
+    ),
+    Endpoint(
+        "order update (crew)",
+        "patch",
+        "orders/<int:id>",
+        "crew",
+        lambda d, u: f"/api/orders/{d.choice(d.orders).id}",
+        data=lambda d, u: {"status": 1},
+    ),
+    Endpoint(
+        "order delete",
+        "delete",
+        "orders/<int:id>",
+        "manager",
+        lambda d, u: f"/api/orders/{d.pop_order()}",
+    ),
+]
+
+
+def add_dataset_arguments(parser):
+    parser.add_argument("--managers", type=int, default=2)
+    parser.add_argument("--crew", type=int, default=5)
+    parser.add_argument("--customers", type=int, default=50)
+    parser.add_argument("--spare-users", type=int, default=10)
+    parser.add_argument("--categories", type=int, default=10)
+    parser.add_argument("--menu-items", type=int, default=500)
+    parser.add_argument("--cart-items", type=int, default=3)
+    parser.add_argument("--orders", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=0)
+
+
+def percentile(sorted_values, percent):
+    # nearest-rank
+    index = max(0, int(round(percent / 100 * len(sorted_values))) - 1)
+    return sorted_values[index]
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed a throwaway SQLite database and drive every LittleLemonAPI route "
+        "concurrently with token auth, reporting latency percentiles, "
+        "throughput and query counts per endpoint."
+    )
+
+    def add_arguments(self, parser):
+        add_dataset_arguments(parser)
+        parser.add_argument(
+            "--requests", type=int, default=100, help="Requests per endpoint."
+        )
+        parser.add_argument("--concurrency", type=int, default=8)
+        parser.add_argument(
+            "--endpoint",
+            action="append",
+            default=[],
+            help="Only run endpoints whose name contains this (repeatable).",
+        )
+        parser.add_argument("--output", help="Write the results to this JSON file.")
+        parser.add_argument(
+            "--compare", help="Print p95 changes against an earlier JSON result."
+        )
+
+    def handle(self, *args, **options):
+        uncovered = {str(p.pattern) for p in urls.urlpatterns} - {
+            endpoint.route for endpoint in ENDPOINTS
+        }
+        if uncovered:
+            raise CommandError(f"No load test for routes: {sorted(uncovered)}")
+        endpoints = [
+            endpoint
+            for endpoint in ENDPOINTS
+            if not options["endpoint"]
+            or any(name in endpoint.name for name in options["endpoint"])
+        ]
+
+        with throwaway_database("loadtest"):
+            dataset = Dataset(options)
+            dataset.seed()
+            results = {
+                endpoint.name: self.drive(endpoint, dataset, options)
+                for endpoint in endpoints
+            }
+
+        report = {"meta": self.meta(options), "endpoints": results}
+        self.print_report(results)
+        if options["compare"]:
+            self.print_comparison(
+                results, json.loads(Path(options["compare"]).read_text())
+            )
+        if options["output"]:
+            Path(options["output"]).write_text(json.dumps(report, indent=2))
+            self.stdout.write(f"Results written to {options['output']}")
+
+    def drive(self, endpoint, dataset, options):
+        def call(_):
+            user = None if endpoint.role == "anonymous" else dataset.user(endpoint.role)
+            headers = {}
+            if user is not None:
+                headers["HTTP_AUTHORIZATION"] = f"Token {dataset.tokens[user.id]}"
+            if endpoint.setup is not None:
+                endpoint.setup(dataset, user)
+            path = endpoint.path(dataset, user)
+            data = endpoint.data(dataset, user) if endpoint.data else None
+            client = Client(raise_request_exception=False, **headers)
+            queries = []
+
+            def count(execute, sql, params, many, context):
+                queries.append(sql)
+                return execute(sql, params, many, context)
+
+            with connection.execute_wrapper(count):
+                start = perf_counter()
+                if endpoint.method == "get":
+                    response = client.get(path)
+                else:
+                    response = getattr(client, endpoint.method)(
+                        path, data, content_type="application/json"
+                    )
+                if response.streaming:
+                    # streamed bodies are produced as they are read
+                    b"".join(response.streaming_content)
+                    response.close()
+                elapsed = perf_counter() - start
+            return elapsed, response.status_code, len(queries)
+
+        with ThreadPoolExecutor(max_workers=options["concurrency"]) as pool:
+            start = perf_counter()
+            samples = list(pool.map(call, range(options["requests"])))
+            wall = perf_counter() - start
+        latencies = sorted(elapsed * 1000 for elapsed, _, _ in samples)
+        return {
+            "method": endpoint.method.upper(),
+            "route": endpoint.route,
+            "role": endpoint.role,
+            "requests": len(samples),
+            "statuses": dict(Counter(str(status) for _, status, _ in samples)),
+            "throughput_rps": round(len(samples) / wall, 1),
+            "p50_ms": round(percentile(latencies, 50), 2),
+            "p95_ms": round(percentile(latencies, 95), 2),
+            "p99_ms": round(percentile(latencies, 99), 2),
+            "queries_mean": round(sum(q for _, _, q in samples) / len(samples), 1),
+            "queries_max": max(q for _, _, q in samples),
+        }
+
+    def meta(self, options):
+        try:
+            commit = subprocess.run(
+                ["git", "rev-parse", "HEAD"],
+                capture_output=True,
+                text=True,
+                cwd=settings.BASE_DIR,
+            ).stdout.strip()
+        except OSError:
+            commit = ""
+        return {
+            "commit": commit or None,
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "options": {
+                key: options[key]
+                for key in (
+                    "managers",
+                    "crew",
+                    "customers",
+                    "spare_users",
+                    "categories",
+                    "menu_items",
+                    "cart_items",
+                    "orders",
+                    "requests",
+                    "concurrency",
+                    "seed",
+                )
+            },
+        }
+
+    def print_report(self, results):
+        self.stdout.write(
+            f"{'endpoint':<24} {'rps':>7} {'p50':>8} {'p95':>8} {'p99':>8} "
+            f"{'queries':>7}  statuses"
+        )
+        for name, result in results.items():
+            statuses = " ".join(
+                f"{k}x{v}" for k, v in sorted(result["statuses"].items())
+            )
+            self.stdout.write(
+                f"{name:<24} {result['throughput_rps']:>7} {result['p50_ms']:>8} "
+                f"{result['p95_ms']:>8} {result['p99_ms']:>8} "
+                f"{result['queries_mean']:>7}  {statuses}"
+            )
+
+    def print_comparison(self, results, baseline):
+        self.stdout.write(f"\nCompared with {baseline['meta'].get('commit')}:")
+        for name, result in results.items():
+            before = baseline["endpoints"].get(name)
+            if before is None:
+                continue
+            change = (result["p95_ms"] - before["p95_ms"]) / before["p95_ms"] * 100
+            self.stdout.write(
+                f"{name:<24} p95 {before['p95_ms']:>8} -> {result['p95_ms']:>8} "
+                f"({change:+.0f}%), queries {before['queries_mean']} -> "
+                f"{result['queries_mean']}"
+            )
@@ -0,0 +1,23 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand
+
+from LittleLemonAPI.rollups import rebuild
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute the daily order rollups behind /api/analytics from the "
+        "orders, e.g. after upgrading or after writing orders in bulk."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--from-date",
+            type=date.fromisoformat,
+            help="Only rebuild the days from this date (YYYY-MM-DD) on.",
+        )
+
+    def handle(self, *args, **options):
+        days = rebuild(options["from_date"])
+        self.stdout.write(f"Rebuilt the rollups of {days} days.")
@@ -0,0 +1,45 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from LittleLemonAPI import tasks
+
+
+class Command(BaseCommand):
+    help = (
+        "Run the jobs queued through LittleLemonAPI.tasks, such as assigning "
+        "new orders to the delivery crew. Start as many workers as needed."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Exit once no job is due instead of waiting for more.",
+        )
+        parser.add_argument(
+            "--batch", type=int, default=10, help="Jobs claimed at a time."
+        )
+        parser.add_argument(
+            "--sleep",
+            type=float,
+            default=1.0,
+            help="Seconds to wait when no job is due.",
+        )
+
+    def handle(self, *args, **options):
+        if options["once"]:
+            ran, failed = tasks.run_pending(options["batch"])
+            self.stdout.write(f"Ran {ran} jobs, {failed} failed.")
+            return
+        try:
+            while True:
+                close_old_connections()
+                jobs = tasks.claim(options["batch"])
+                for job in jobs:
+                    tasks.run(job)
+                if not jobs:
+                    time.sleep(options["sleep"])
+        except KeyboardInterrupt:
+            pass
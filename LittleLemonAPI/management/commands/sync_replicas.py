@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from LittleLemonAPI.routers import replicas
+
+
+class Command(BaseCommand):
+    help = (
+        "Copy the SQLite primary database over each SQLite replica in "
+        "settings.DATABASE_REPLICAS, standing in for replication when trying "
+        "out read replicas locally."
+    )
+
+    def handle(self, *args, **options):
+        primary = connections[DEFAULT_DB_ALIAS]
+        if not replicas():
+            raise CommandError("No replicas configured, see LITTLELEMON_DB_REPLICAS.")
+        for alias in replicas():
+            replica = connections[alias]
+            if primary.vendor != "sqlite" or replica.vendor != "sqlite":
+                raise CommandError("Only SQLite replicas can be synced this way.")
+            primary.ensure_connection()
+            replica.ensure_connection()
+            primary.connection.backup(replica.connection)
+            self.stdout.write(f"Copied {primary.settings_dict['NAME']} to {alias}.")
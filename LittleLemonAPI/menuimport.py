@@ -0,0 +1,144 @@
+"""Bulk menu imports and price updates.
+
+Each row either creates a menu item (no id) or updates the fields it gives
+of an existing one, so a price update is just rows of id and price. CSV
+files use the columns of the menu export, with empty cells left unchanged.
+
+All rows are validated before anything is written: categories and existing
+items are each looked up with one query, and if any row is invalid nothing
+is applied. Valid imports are written with bulk_create and bulk_update in one
+transaction, reprice open carts once and bump the catalogue version once.
+"""
+
+import csv
+
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from . import carts
+from .cache import catalogue_cache
+from .models import Category, MenuItem
+from .serializers import MenuImportRowSerializer
+
+FIELDS = ("title", "price", "featured", "category")
+
+
+def read_csv(lines):
+    """Rows from CSV text lines, without the empty cells."""
+    return [
+        {column: value for column, value in row.items() if value not in ("", None)}
+        for row in csv.DictReader(lines)
+    ]
+
+
+def import_items(rows, dry_run=False):
+    """Validate rows and, unless dry_run, apply them. Returns (applied,
+    results): results holds one dict per row, with its errors or the id of
+    the item it created or updated."""
+    results = [{"row": number} for number in range(1, len(rows) + 1)]
+    validated = []
+    for result, row in zip(results, rows):
+        serializer = MenuImportRowSerializer(data=row)
+        if serializer.is_valid():
+            validated.append(serializer.validated_data)
+        else:
+            validated.append(None)
+            result["errors"] = serializer.errors
+    ids = [data["id"] for data in validated if data and "id" in data]
+    existing = MenuItem.objects.in_bulk(ids)
+    categories = lookup_categories(data for data in validated if data)
+    seen = set()
+    for result, data in zip(results, validated):
+        if data is None:
+            continue
+        errors = {}
+        if "id" in data:
+            if data["id"] not in existing:
+                errors["id"] = [f"Menu item {data['id']} does not exist."]
+            elif data["id"] in seen:
+                errors["id"] = [f"Menu item {data['id']} appears more than once."]
+            seen.add(data["id"])
+        if "category_id" in data or "category" in data:
+            category = categories.get(category_key(data))
+            if not isinstance(category, Category):
+                errors["category"] = [category]
+            data["category"] = category
+        if errors:
+            result["errors"] = errors
+    if dry_run or any("errors" in result for result in results):
+        return False, results
+    apply(validated, existing, results)
+    return True, results
+
+
+def category_key(data):
+    if "category_id" in data:
+        return ("id", data["category_id"])
+    return ("title", data["category"])
+
+
+def lookup_categories(rows):
+    """Map each row's category_key() to its Category, or to an error message
+    if there is no single such category, in one query."""
+    keys = {
+        category_key(data)
+        for data in rows
+        if "category_id" in data or "category" in data
+    }
+    ids = [value for kind, value in keys if kind == "id"]
+    titles = [value for kind, value in keys if kind == "title"]
+    found = {}
+    if keys:
+        for category in Category.objects.filter(Q(pk__in=ids) | Q(title__in=titles)):
+            found.setdefault(("id", category.pk), category)
+            title = ("title", category.title)
+            found[title] = (
+                f"More than one category is called {category.title!r}."
+                if title in found
+                else category
+            )
+    for kind, value in keys:
+        found.setdefault((kind, value), f"Category {value!r} does not exist.")
+    return found
+
+
+@transaction.atomic
+def apply(validated, existing, results):
+    # bulk_update skips auto_now, so every written item gets the same
+    # explicit updated_at, which the menu ETags are computed from
+    now = timezone.now()
+    created, updated, repriced, fields = [], [], [], {"updated_at"}
+    for data in validated:
+        if "id" in data:
+            item = existing[data["id"]]
+            if "price" in data and data["price"] != item.price:
+                repriced.append(item.pk)
+            for field in FIELDS:
+                if field in data:
+                    setattr(item, field, data[field])
+                    fields.add(field)
+            item.updated_at = now
+            updated.append(item)
+        else:
+            created.append(
+                MenuItem(
+                    title=data["title"],
+                    price=data["price"],
+                    featured=data.get("featured", True),
+                    category=data["category"],
+                    updated_at=now,
+                )
+            )
+    MenuItem.objects.bulk_create(created)
+    MenuItem.objects.bulk_update(updated, sorted(fields))
+    new = iter(created)
+    for result, data in zip(results, validated):
+        if "id" in data:
+            result.update(id=data["id"], status="updated")
+        else:
+            result.update(id=next(new).pk, status="created")
+    if repriced:
+        carts.reprice(repriced)
+    # saves of single items bump through signals.py, bulk writes send none
+    transaction.on_commit(catalogue_cache.bump)
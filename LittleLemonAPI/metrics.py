@@ -0,0 +1,115 @@
+import re
+import threading
+from bisect import bisect_left
+from collections import Counter
+from contextvars import ContextVar
+from time import perf_counter
+
+# upper bounds, in milliseconds, of the latency histogram buckets
+LATENCY_BUCKETS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500)
+
+_IN_LIST = re.compile(r"\((?:%s, )*%s\)")
+
+# the collector of the request being handled; context variables follow a
+# request into the threads sync_to_async runs its queries in
+current_collector = ContextVar("current_collector", default=None)
+
+
+def query_shape(sql):
+    """Collapse the parts of a query that vary between executions of the same
+    ORM call: parameters are already placeholders, except IN lists."""
+    return _IN_LIST.sub("(...)", sql)
+
+
+class RequestCollector:
+    """Everything measured for one request."""
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.shapes = Counter()
+        self.start = None
+        self.render_start = self.render_end = None
+
+    def record_query(self, execute, sql, params, many, context):
+        start = perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_time += perf_counter() - start
+            self.queries += 1
+            self.shapes[query_shape(sql)] += 1
+
+    def duplicates(self, threshold):
+        """Query shapes run at least threshold times: likely N+1 loops."""
+        return {sql: n for sql, n in self.shapes.items() if n >= threshold}
+
+
+def record_query(execute, sql, params, many, context):
+    """Execute wrapper installed on every connection (see signals.py)."""
+    collector = current_collector.get()
+    if collector is None:
+        return execute(sql, params, many, context)
+    return collector.record_query(execute, sql, params, many, context)
+
+
+def instrument(connection):
+    # connections are reopened on the same wrapper object, so only add once
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+class MetricsRegistry:
+    """Per-route aggregates for this process, served by /api/metrics."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.routes = {}
+
+    def observe(self, route, status_code, total, collector, duplicates):
+        with self.lock:
+            stats = self.routes.get(route)
+            if stats is None:
+                stats = self.routes[route] = {
+                    "count": 0,
+                    "errors": 0,
+                    "latency_ms": {
+                        "buckets": [0] * (len(LATENCY_BUCKETS) + 1),
+                        "sum": 0.0,
+                    },
+                    "db_ms_sum": 0.0,
+                    "queries_sum": 0,
+                    "queries_max": 0,
+                    "duplicate_query_requests": 0,
+                }
+            total_ms = total * 1000
+            stats["count"] += 1
+            stats["errors"] += status_code >= 500
+            stats["latency_ms"]["buckets"][bisect_left(LATENCY_BUCKETS, total_ms)] += 1
+            stats["latency_ms"]["sum"] += total_ms
+            stats["db_ms_sum"] += collector.db_time * 1000
+            stats["queries_sum"] += collector.queries
+            stats["queries_max"] = max(stats["queries_max"], collector.queries)
+            stats["duplicate_query_requests"] += bool(duplicates)
+
+    def snapshot(self):
+        labels = [f"le_{bound}" for bound in LATENCY_BUCKETS] + ["le_inf"]
+        with self.lock:
+            return {
+                route: {
+                    **stats,
+                    "latency_ms": {
+                        "buckets": dict(zip(labels, stats["latency_ms"]["buckets"])),
+                        "sum": round(stats["latency_ms"]["sum"], 3),
+                    },
+                    "db_ms_sum": round(stats["db_ms_sum"], 3),
+                }
+                for route, stats in self.routes.items()
+            }
+
+    def reset(self):
+        with self.lock:
+            self.routes.clear()
+
+
+registry = MetricsRegistry()
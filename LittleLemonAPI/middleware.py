@@ -0,0 +1,295 @@
+import gzip
+import json
+import logging
+import zlib
+from time import perf_counter
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.cache import patch_vary_headers
+
+try:
+    import brotli
+except ImportError:
+    # optional: without it responses are only ever gzipped
+    brotli = None
+
+from .metrics import RequestCollector, current_collector, registry
+from .routers import ReplicaState, current_state, pin_key, replicas
+
+logger = logging.getLogger("LittleLemonAPI.metrics")
+
+
+class RequestMetricsMiddleware:
+    """Time each request and count its queries.
+
+    The split is reported in a Server-Timing header and a JSON log line, and
+    aggregated per route for /api/metrics:
+
+    - db: time spent executing SQL, on every configured database
+    - app: everything else before rendering, i.e. filtering and serialization
+    - render: turning the response data into bytes
+    - total: the whole request as seen by this middleware
+
+    Query shapes repeated settings.DUPLICATE_QUERY_THRESHOLD times or more
+    are logged as likely N+1 loops. The cost is a wrapper call and a Counter
+    update per query, plus a few clock reads per request.
+
+    The middleware runs natively under both WSGI and ASGI, so async views are
+    not pushed back onto a thread by it.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.duplicate_threshold = getattr(settings, "DUPLICATE_QUERY_THRESHOLD", 3)
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        collector, token = self.start(request)
+        try:
+            response = self.get_response(request)
+        finally:
+            current_collector.reset(token)
+        return self.finish(request, response, collector)
+
+    async def __acall__(self, request):
+        collector, token = self.start(request)
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_collector.reset(token)
+        return self.finish(request, response, collector)
+
+    def start(self, request):
+        collector = request.metrics = RequestCollector()
+        collector.start = perf_counter()
+        return collector, current_collector.set(collector)
+
+    def finish(self, request, response, collector):
+        total = perf_counter() - collector.start
+        duplicates = collector.duplicates(self.duplicate_threshold)
+        timings = self.timings(collector, total)
+        entries = [f"{name};dur={value:.2f}" for name, value in timings.items()]
+        entries.append(f'queries;desc="{collector.queries}"')
+        response["Server-Timing"] = ", ".join(entries)
+
+        match = request.resolver_match
+        route = f"{request.method} {match.route if match else '<unresolved>'}"
+        registry.observe(route, response.status_code, total, collector, duplicates)
+        record = {"route": route, "path": request.path}
+        logger.info(
+            json.dumps(
+                {
+                    **record,
+                    "status": response.status_code,
+                    "queries": collector.queries,
+                    **{f"{name}_ms": round(v, 2) for name, v in timings.items()},
+                }
+            )
+        )
+        if duplicates:
+            logger.warning(json.dumps({**record, "duplicate_queries": duplicates}))
+        return response
+
+    def process_template_response(self, request, response):
+        # DRF responses are rendered right after this hook returns
+        metrics = request.metrics
+        metrics.render_start = perf_counter()
+
+        def rendered(response):
+            metrics.render_end = perf_counter()
+
+        response.add_post_render_callback(rendered)
+        return response
+
+    def timings(self, collector, total):
+        render = 0.0
+        if collector.render_end is not None:
+            render = collector.render_end - collector.render_start
+        timings = {
+            "db": collector.db_time * 1000,
+            "app": max(total - collector.db_time - render, 0) * 1000,
+        }
+        if collector.render_end is not None:
+            timings["render"] = render * 1000
+        timings["total"] = total * 1000
+        return timings
+
+
+class ReplicaPinningMiddleware:
+    """Read-your-writes on top of the read replicas (see routers.py).
+
+    Requests that may write, i.e. anything but GET, HEAD and OPTIONS, read
+    from the primary throughout. So does every request from a client for
+    settings.REPLICA_PIN_SECONDS after one of its requests wrote, by which
+    time the replicas have caught up. Clients are told apart by their token
+    or session cookie, and the marks live in the default cache, which has to
+    be shared between workers. Without replicas this costs nothing.
+    """
+
+    sync_capable = True
+    async_capable = True
+    safe_methods = ("GET", "HEAD", "OPTIONS")
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        if not replicas():
+            return self.get_response(request)
+        key = pin_key(request)
+        pinned = request.method not in self.safe_methods or (
+            key is not None and cache.get(key) is not None
+        )
+        state = ReplicaState(pinned)
+        token = current_state.set(state)
+        try:
+            return self.get_response(request)
+        finally:
+            current_state.reset(token)
+            if state.wrote and key is not None:
+                cache.set(key, True, settings.REPLICA_PIN_SECONDS)
+
+    async def __acall__(self, request):
+        if not replicas():
+            return await self.get_response(request)
+        key = pin_key(request)
+        pinned = request.method not in self.safe_methods or (
+            key is not None and await cache.aget(key) is not None
+        )
+        state = ReplicaState(pinned)
+        token = current_state.set(state)
+        try:
+            return await self.get_response(request)
+        finally:
+            current_state.reset(token)
+            if state.wrote and key is not None:
+                await cache.aset(key, True, settings.REPLICA_PIN_SECONDS)
+
+
+class CompressionMiddleware:
+    """Compress responses of settings.COMPRESSION_MIN_SIZE bytes or more.
+
+    Brotli is used when the brotli package is installed and the client
+    accepts it, else gzip. Streamed responses (the exports) are compressed
+    chunk by chunk and flushed after each, so they still arrive as they are
+    produced; event streams are left alone. As with Django's GZipMiddleware,
+    strong ETags become weak ones, which If-None-Match still matches. That
+    happens for every response to a client accepting an encoding, whether
+    or not its body is compressed, so a 304 carries the ETag of the 200.
+    """
+
+    sync_capable = True
+    async_capable = True
+    # dynamic content: fast settings that get most of the gain
+    gzip_level = 6
+    brotli_quality = 5
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.min_size = getattr(settings, "COMPRESSION_MIN_SIZE", 1024)
+        self.encodings = ["br", "gzip"] if brotli is not None else ["gzip"]
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        return self.compress(request, self.get_response(request))
+
+    async def __acall__(self, request):
+        return self.compress(request, await self.get_response(request))
+
+    def negotiate(self, request):
+        """The preferred encoding the client accepts, or None."""
+        accepted = {}
+        for part in request.headers.get("Accept-Encoding", "").split(","):
+            coding, _, params = part.strip().lower().partition(";")
+            quality = 1.0
+            if params.strip().startswith("q="):
+                try:
+                    quality = float(params.strip()[2:])
+                except ValueError:
+                    quality = 0.0
+            accepted[coding.strip()] = quality
+        for encoding in self.encodings:
+            if accepted.get(encoding, accepted.get("*", 0)) > 0:
+                return encoding
+        return None
+
+    def compress(self, request, response):
+        if response.has_header("Content-Encoding") or response.get(
+            "Content-Type", ""
+        ).startswith("text/event-stream"):
+            return response
+        encoding = self.negotiate(request)
+        etag = response.get("ETag")
+        if encoding is not None and etag and etag.startswith('"'):
+            response["ETag"] = f"W/{etag}"
+            patch_vary_headers(response, ["Accept-Encoding"])
+        if not response.streaming and len(response.content) < self.min_size:
+            return response
+        patch_vary_headers(response, ["Accept-Encoding"])
+        if encoding is None:
+            return response
+        if response.streaming:
+            if response.is_async:
+                response.streaming_content = self.acompress_stream(
+                    encoding, response.streaming_content
+                )
+            else:
+                response.streaming_content = self.compress_stream(
+                    encoding, response.streaming_content
+                )
+            del response["Content-Length"]
+        else:
+            if encoding == "br":
+                content = brotli.compress(response.content, quality=self.brotli_quality)
+            else:
+                content = gzip.compress(response.content, self.gzip_level, mtime=0)
+            if len(content) >= len(response.content):
+                return response
+            response.content = content
+            response["Content-Length"] = str(len(content))
+        response["Content-Encoding"] = encoding
+        return response
+
+    def compressor(self, encoding):
+        """(compress, flush, finish) functions of a new stream compressor."""
+        if encoding == "br":
+            compressor = brotli.Compressor(quality=self.brotli_quality)
+            return compressor.process, compressor.flush, compressor.finish
+        compressor = zlib.compressobj(
+            self.gzip_level, zlib.DEFLATED, 16 + zlib.MAX_WBITS
+        )
+        return (
+            compressor.compress,
+            lambda: compressor.flush(zlib.Z_SYNC_FLUSH),
+            compressor.flush,
+        )
+
+    def compress_stream(self, encoding, chunks):
+        compress, flush, finish = self.compressor(encoding)
+        for chunk in chunks:
+            yield compress(chunk) + flush()
+        yield finish()
+
+    async def acompress_stream(self, encoding, chunks):
+        compress, flush, finish = self.compressor(encoding)
+        async for chunk in chunks:
+            yield compress(chunk) + flush()
+        yield finish()
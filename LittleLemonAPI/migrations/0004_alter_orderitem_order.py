@@ -0,0 +1,22 @@
+# Generated by Django 4.2 on 2026-10-18 06:02
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("LittleLemonAPI", "0003_remove_menuitem_inventory_menuitem_featured_and_more"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="orderitem",
+            name="order",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="orderitems",
+                to="LittleLemonAPI.order",
+            ),
+        ),
+    ]
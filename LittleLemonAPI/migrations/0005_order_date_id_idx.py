@@ -0,0 +1,18 @@
+# Generated by Django 4.2 on 2026-10-18 06:03
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("LittleLemonAPI", "0004_alter_orderitem_order"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="order",
+            index=models.Index(fields=["date", "id"], name="order_date_id_idx"),
+        ),
+    ]
@@ -0,0 +1,81 @@
+# Generated by Django 4.2 on 2026-10-18 07:10
+
+from django.db import migrations
+
+# A trigram FTS5 index over menu item and category titles, kept in sync by
+# triggers so bulk_create/update() are covered too. SQLite only; other
+# databases fall back to icontains in LittleLemonAPI.search.
+CREATE_SQL = [
+    """
+    CREATE VIRTUAL TABLE "LittleLemonAPI_menuitem_fts"
+    USING fts5(title, category, tokenize='trigram')
+    """,
+    """
+    INSERT INTO "LittleLemonAPI_menuitem_fts" (rowid, title, category)
+    SELECT m.id, m.title, c.title
+    FROM "LittleLemonAPI_menuitem" m
+    JOIN "LittleLemonAPI_category" c ON c.id = m.category_id
+    """,
+    """
+    CREATE TRIGGER "LittleLemonAPI_menuitem_fts_insert"
+    AFTER INSERT ON "LittleLemonAPI_menuitem" BEGIN
+        INSERT INTO "LittleLemonAPI_menuitem_fts" (rowid, title, category)
+        SELECT new.id, new.title, c.title
+        FROM "LittleLemonAPI_category" c WHERE c.id = new.category_id;
+    END
+    """,
+    """
+    CREATE TRIGGER "LittleLemonAPI_menuitem_fts_update"
+    AFTER UPDATE OF title, category_id ON "LittleLemonAPI_menuitem" BEGIN
+        DELETE FROM "LittleLemonAPI_menuitem_fts" WHERE rowid = old.id;
+        INSERT INTO "LittleLemonAPI_menuitem_fts" (rowid, title, category)
+        SELECT new.id, new.title, c.title
+        FROM "LittleLemonAPI_category" c WHERE c.id = new.category_id;
+    END
+    """,
+    """
+    CREATE TRIGGER "LittleLemonAPI_menuitem_fts_delete"
+    AFTER DELETE ON "LittleLemonAPI_menuitem" BEGIN
+        DELETE FROM "LittleLemonAPI_menuitem_fts" WHERE rowid = old.id;
+    END
+    """,
+    """
+    CREATE TRIGGER "LittleLemonAPI_category_fts_update"
+    AFTER UPDATE OF title ON "LittleLemonAPI_category" BEGIN
+        UPDATE "LittleLemonAPI_menuitem_fts" SET category = new.title
+        WHERE rowid IN (
+            SELECT id FROM "LittleLemonAPI_menuitem" WHERE category_id = new.id
+        );
+    END
+    """,
+]
+
+DROP_SQL = [
+    'DROP TRIGGER IF EXISTS "LittleLemonAPI_category_fts_update"',
+    'DROP TRIGGER IF EXISTS "LittleLemonAPI_menuitem_fts_delete"',
+    'DROP TRIGGER IF EXISTS "LittleLemonAPI_menuitem_fts_update"',
+    'DROP TRIGGER IF EXISTS "LittleLemonAPI_menuitem_fts_insert"',
+    'DROP TABLE IF EXISTS "LittleLemonAPI_menuitem_fts"',
+]
+
+
+def create_index(apps, schema_editor):
+    if schema_editor.connection.vendor == "sqlite":
+        for sql in CREATE_SQL:
+            schema_editor.execute(sql)
+
+
+def drop_index(apps, schema_editor):
+    if schema_editor.connection.vendor == "sqlite":
+        for sql in DROP_SQL:
+            schema_editor.execute(sql)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("LittleLemonAPI", "0006_category_updated_at_menuitem_updated_at"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_index, drop_index),
+    ]
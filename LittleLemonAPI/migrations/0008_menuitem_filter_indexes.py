@@ -0,0 +1,24 @@
+# Generated by Django 4.2 on 2026-10-18 06:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("LittleLemonAPI", "0007_menuitem_search_index"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="menuitem",
+            index=models.Index(
+                fields=["category", "price"], name="menuitem_category_price_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="menuitem",
+            index=models.Index(
+                fields=["featured", "price"], name="menuitem_featured_price_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.2 on 2026-10-18 06:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("LittleLemonAPI", "0008_menuitem_filter_indexes"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="RateLimitCounter",
+            fields=[
+                (
+                    "key",
+                    models.CharField(max_length=255, primary_key=True, serialize=False),
+                ),
+                ("count", models.IntegerField(default=0)),
+                ("expires", models.FloatField(db_index=True)),
+            ],
+        ),
+    ]
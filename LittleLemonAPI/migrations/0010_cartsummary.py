@@ -0,0 +1,52 @@
+# Generated by Django 4.2 on 2026-10-18 06:49
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+from django.db.models import Sum
+
+
+def summarize_open_carts(apps, schema_editor):
+    Cart = apps.get_model("LittleLemonAPI", "Cart")
+    CartSummary = apps.get_model("LittleLemonAPI", "CartSummary")
+    CartSummary.objects.bulk_create(
+        CartSummary(
+            user_id=row["user"],
+            item_count=row["item_count"],
+            subtotal=row["subtotal"],
+        )
+        for row in Cart.objects.values("user").annotate(
+            item_count=Sum("quantity"), subtotal=Sum("price")
+        )
+    )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("LittleLemonAPI", "0009_ratelimitcounter"),
+        ("auth", "0012_alter_user_first_name_max_length"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="CartSummary",
+            fields=[
+                (
+                    "user",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="cart_summary",
+                        serialize=False,
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+                ("item_count", models.PositiveIntegerField(default=0)),
+                (
+                    "subtotal",
+                    models.DecimalField(decimal_places=2, default=0, max_digits=10),
+                ),
+            ],
+        ),
+        migrations.RunPython(summarize_open_carts, migrations.RunPython.noop),
+    ]
@@ -1,11 +1,13 @@
 from django.db import models
 from django.contrib.auth.models import User
+from django.utils import timezone
 
 
 # Create your models here.
 class Category(models.Model):
     slug = models.SlugField()
     title = models.CharField(max_length=255, db_index=True)
+    updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return self.title
@@ -16,6 +18,17 @@ class MenuItem(models.Model):
     price = models.DecimalField(max_digits=6, decimal_places=2, db_index=True)
     featured = models.BooleanField(db_index=True, default=True)
     category = models.ForeignKey(Category, on_delete=models.PROTECT)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["category", "price"], name="menuitem_category_price_idx"
+            ),
+            models.Index(
+                fields=["featured", "price"], name="menuitem_featured_price_idx"
+            ),
+        ]
 
     def __str__(self):
         return self.title
@@ -32,6 +45,28 @@ class Cart(models.Model):
         unique_together = ("menuitem", "user")
 
 
+class CartSummary(models.Model):
+    """Totals of a user's Cart rows, kept up to date by carts.py."""
+
+    user = models.OneToOneField(
+        User, on_delete=models.CASCADE, primary_key=True, related_name="cart_summary"
+    )
+    item_count = models.PositiveIntegerField(default=0)
+    subtotal = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+
+
+class OrderQuerySet(models.QuerySet):
+    def with_details(self):
+        """Plan every join OrderSerializer needs so a page of orders costs a
+        fixed number of queries instead of one per order and per item."""
+        return self.select_related("user").prefetch_related(
+            models.Prefetch(
+                "orderitems",
+                queryset=OrderItem.objects.order_by("id"),
+            )
+        )
+
+
 class Order(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     delivery_crew = models.ForeignKey(
@@ -41,6 +76,11 @@ class Order(models.Model):
     total = models.DecimalField(max_digits=6, decimal_places=2)
     date = models.DateField(db_index=True)
 
+    objects = OrderQuerySet.as_manager()
+
+    class Meta:
+        indexes = [models.Index(fields=["date", "id"], name="order_date_id_idx")]
+
 
 class OrderItem(models.Model):
     order = models.ForeignKey(
@@ -53,3 +93,86 @@ class OrderItem(models.Model):
 
     class Meta:
         unique_together = ("order", "menuitem")
+
+
+class DailySales(models.Model):
+    """Orders placed on one day, kept up to date by rollups.py."""
+
+    date = models.DateField(primary_key=True)
+    orders = models.IntegerField(default=0)
+    delivered = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+
+
+class DailyMenuItemSales(models.Model):
+    """How much of one menu item the orders of one day hold, kept up to date
+    by rollups.py."""
+
+    date = models.DateField()
+    menuitem = models.ForeignKey(MenuItem, on_delete=models.CASCADE)
+    quantity = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+
+    class Meta:
+        unique_together = ("date", "menuitem")
+
+
+class DailyCrewDeliveries(models.Model):
+    """Orders of one day assigned to and delivered by one delivery crew
+    member, kept up to date by rollups.py."""
+
+    date = models.DateField()
+    delivery_crew = models.ForeignKey(User, on_delete=models.CASCADE)
+    assigned = models.IntegerField(default=0)
+    delivered = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = ("date", "delivery_crew")
+
+
+class RateLimitCounter(models.Model):
+    """Requests counted in one rate limit window, for ratelimit.DatabaseBackend."""
+
+    key = models.CharField(max_length=255, primary_key=True)
+    count = models.IntegerField(default=0)
+    # unix time after which the window no longer matters
+    expires = models.FloatField(db_index=True)
+
+
+class IdempotencyKey(models.Model):
+    """The response to a request sent with an Idempotency-Key header, replayed
+    when the client retries it. See idempotency.py."""
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    key = models.CharField(max_length=255)
+    # of the method, path and body the key was first used with
+    fingerprint = models.CharField(max_length=64)
+    status = models.PositiveSmallIntegerField(null=True)
+    response = models.JSONField(null=True)
+    created = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        unique_together = ("user", "key")
+
+
+class Job(models.Model):
+    """A task queued for the worker (manage.py run_tasks). See tasks.py."""
+
+    QUEUED = "queued"
+    FAILED = "failed"
+
+    task = models.CharField(max_length=100)
+    kwargs = models.JSONField(default=dict)
+    status = models.CharField(
+        max_length=10,
+        choices=[(QUEUED, "Queued"), (FAILED, "Failed")],
+        default=QUEUED,
+    )
+    attempts = models.PositiveSmallIntegerField(default=0)
+    # when the job is next due; moved past the lease while a worker runs it
+    run_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    created = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [models.Index(fields=["status", "run_at"], name="job_due_idx")]
@@ -0,0 +1,97 @@
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from datetime import date
+
+from django.db.models import Q
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class OrderCursorPagination(BasePagination):
+    """Keyset pagination over orders, newest first.
+
+    The cursor is the (date, id) of the last order on the previous page, so
+    every page is an index seek on the (date, id) index instead of an OFFSET
+    scan, and pages stay stable while new orders are being placed.
+    """
+
+    cursor_query_param = "cursor"
+    page_size_query_param = "perpage"
+    page_size = 50
+    max_page_size = 500
+    ordering = ("-date", "-id")
+    invalid_cursor_message = "Invalid cursor"
+
+    def paginate_queryset(self, queryset, request, view=None):
+        return self.set_page(list(self.page_queryset(queryset, request)))
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        queryset = self.page_queryset(queryset, request)
+        return self.set_page([result async for result in queryset])
+
+    def page_queryset(self, queryset, request):
+        """The requested page plus one row, to tell whether there is another."""
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        queryset = queryset.order_by(*self.ordering)
+        position = self.decode_cursor(request)
+        if position is not None:
+            last_date, last_id = position
+            queryset = queryset.filter(
+                Q(date__lt=last_date) | Q(date=last_date, id__lt=last_id)
+            )
+        return queryset[: self.page_size + 1]
+
+    def set_page(self, results):
+        self.has_next = len(results) > self.page_size
+        self.page = results[: self.page_size]
+        return self.page
+
+    def get_paginated_response(self, data):
+        headers = {}
+        next_link = self.get_next_link()
+        if next_link is not None:
+            headers["Link"] = f'<{next_link}>; rel="next"'
+        return Response(data, headers=headers)
+
+    def get_page_size(self, request):
+        perpage = request.query_params.get(self.page_size_query_param)
+        if perpage is None:
+            return self.page_size
+        try:
+            perpage = int(perpage)
+        except ValueError:
+            raise ValidationError({self.page_size_query_param: "Must be an integer."})
+        if perpage < 1:
+            raise ValidationError({self.page_size_query_param: "Must be positive."})
+        return min(perpage, self.max_page_size)
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        last = self.page[-1]
+        if isinstance(last, dict):
+            # a .values() page
+            last_date, last_id = last["date"], last["id"]
+        else:
+            last_date, last_id = last.date, last.id
+        url = self.request.build_absolute_uri()
+        return replace_query_param(
+            url, self.cursor_query_param, self.encode_cursor(last_date, last_id)
+        )
+
+    def encode_cursor(self, last_date, last_id):
+        position = f"{last_date.isoformat()}.{last_id}"
+        return urlsafe_b64encode(position.encode("ascii")).decode("ascii")
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return None
+        try:
+            position = urlsafe_b64decode(encoded.encode("ascii")).decode("ascii")
+            last_date, last_id = position.split(".")
+            return date.fromisoformat(last_date), int(last_id)
+        except (TypeError, ValueError, UnicodeError):
+            raise NotFound(self.invalid_cursor_message)
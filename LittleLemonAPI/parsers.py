@@ -0,0 +1,22 @@
+import codecs
+
+from django.conf import settings
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import BaseParser
+
+from .menuimport import read_csv
+
+
+class CSVParser(BaseParser):
+    """CSV with a header row, parsed to a list of dicts without the empty
+    cells, as bulk menu imports read it."""
+
+    media_type = "text/csv"
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        encoding = parser_context.get("encoding", settings.DEFAULT_CHARSET)
+        try:
+            return read_csv(codecs.iterdecode(stream, encoding))
+        except (UnicodeDecodeError, ValueError) as exc:
+            raise ParseError(f"CSV parse error - {exc}")
@@ -0,0 +1,13 @@
+from rest_framework.permissions import BasePermission
+
+from .roles import is_delivery_crew, is_manager
+
+
+class IsManager(BasePermission):
+    def has_permission(self, request, view):
+        return is_manager(request.user)
+
+
+class IsDeliveryCrew(BasePermission):
+    def has_permission(self, request, view):
+        return is_delivery_crew(request.user)
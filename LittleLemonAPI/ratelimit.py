@@ -0,0 +1,264 @@
+"""Sliding window rate limiting with pluggable counter backends.
+
+Each key costs two integers: the number of hits in the current fixed window
+and in the one before it. A hit is allowed while
+
+    previous * (share of the previous window still inside the sliding
+    window) + current <= limit
+
+which approximates a true sliding window without keeping timestamps. The
+current counter is incremented before the check and decremented again if
+the hit is refused, so concurrent hits can never admit more than the limit:
+each increment returns a distinct count, and only counts that fit are kept.
+
+Backends only need an atomic increment:
+
+    LocalBackend     a dict in this process; one worker, or per-worker limits
+    CacheBackend     a Django cache alias; atomic on Redis and Memcached (and
+                     on locmem, within one process)
+    DatabaseBackend  an upsert on RateLimitCounter in the primary database;
+                     shared by every worker without a cache server
+
+settings.RATE_LIMIT_BACKEND names the one the throttles use.
+"""
+
+import math
+import threading
+import time
+from collections import namedtuple
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.exceptions import ImproperlyConfigured
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.utils.module_loading import import_string
+
+DURATIONS = {"s": 1, "m": 60, "h": 60 * 60, "d": 24 * 60 * 60}
+
+Decision = namedtuple("Decision", "allowed limit remaining reset retry_after")
+
+
+def parse_rate(rate):
+    """'5/minute' -> (5, 60), as DRF's rate strings."""
+    num, period = rate.split("/")
+    if int(num) < 1:
+        raise ImproperlyConfigured(
+            f"Rate {rate!r} allows no requests; remove it to leave the "
+            "scope unlimited, or allow at least one."
+        )
+    return int(num), DURATIONS[period[0]]
+
+
+class LocalBackend:
+    """Counters in a dict guarded by a lock. Expired counters are swept out
+    every sweep_every increments, so memory stays proportional to the keys
+    seen in the last two windows."""
+
+    sweep_every = 1000
+
+    def __init__(self):
+        self._counters = {}
+        self._lock = threading.Lock()
+        self._hits = 0
+
+    def incr(self, key, timeout):
+        now = time.monotonic()
+        with self._lock:
+            self._hits += 1
+            if self._hits % self.sweep_every == 0:
+                self._sweep(now)
+            counter = self._counters.get(key)
+            if counter is None or counter[1] <= now:
+                counter = self._counters[key] = [0, now + timeout]
+            counter[0] += 1
+            return counter[0]
+
+    def decr(self, key):
+        with self._lock:
+            counter = self._counters.get(key)
+            if counter is not None:
+                counter[0] -= 1
+
+    def get(self, key):
+        now = time.monotonic()
+        with self._lock:
+            counter = self._counters.get(key)
+            if counter is None or counter[1] <= now:
+                return 0
+            return counter[0]
+
+    def _sweep(self, now):
+        expired = [
+            key for key, (_, expires) in self._counters.items() if expires <= now
+        ]
+        for key in expired:
+            del self._counters[key]
+
+
+class CacheBackend:
+    """Counters in the cache settings.RATE_LIMIT_CACHE names.
+
+    add() creates the counter with its timeout and incr() bumps it, which is
+    a single atomic command on Redis and Memcached. The database and file
+    caches implement incr() as a read and a write, so use DatabaseBackend
+    rather than those.
+    """
+
+    @property
+    def cache(self):
+        return caches[getattr(settings, "RATE_LIMIT_CACHE", "default")]
+
+    def incr(self, key, timeout):
+        while True:
+            self.cache.add(key, 0, timeout)
+            try:
+                return self.cache.incr(key)
+            except ValueError:
+                # expired between add() and incr()
+                continue
+
+    def decr(self, key):
+        try:
+            self.cache.decr(key)
+        except ValueError:
+            pass
+
+    def get(self, key):
+        return self.cache.get(key, 0)
+
+
+class DatabaseBackend:
+    """Counters in the RateLimitCounter table of the primary database.
+
+    Each increment is one INSERT ... ON CONFLICT DO UPDATE ... RETURNING
+    statement (SQLite 3.35+, PostgreSQL), atomic in any number of processes.
+    The SQL goes straight to the primary connection, so counting a request
+    neither passes through the ORM nor pins its reads away from the replicas.
+    Expired rows are purged every purge_every increments.
+    """
+
+    purge_every = 1000
+
+    def __init__(self):
+        self._hits = 0
+
+    def _sql(self):
+        from .models import RateLimitCounter
+
+        connection = connections[DEFAULT_DB_ALIAS]
+        quote = connection.ops.quote_name
+        names = {
+            "table": quote(RateLimitCounter._meta.db_table),
+            "key": quote("key"),
+            "count": quote("count"),
+            "expires": quote("expires"),
+        }
+        return connection, names
+
+    def incr(self, key, timeout):
+        connection, names = self._sql()
+        now = time.time()
+        self._hits += 1
+        with connection.cursor() as cursor:
+            if self._hits % self.purge_every == 0:
+                cursor.execute(
+                    "DELETE FROM {table} WHERE {expires} <= %s".format(**names),
+                    [now],
+                )
+            # an expired row is restarted rather than incremented
+            cursor.execute(
+                "INSERT INTO {table} ({key}, {count}, {expires}) "
+                "VALUES (%s, 1, %s) "
+                "ON CONFLICT ({key}) DO UPDATE SET "
+                "{count} = CASE WHEN {table}.{expires} <= %s "
+                "THEN 1 ELSE {table}.{count} + 1 END, "
+                "{expires} = CASE WHEN {table}.{expires} <= %s "
+                "THEN excluded.{expires} ELSE {table}.{expires} END "
+                "RETURNING {count}".format(**names),
+                [key, now + timeout, now, now],
+            )
+            return cursor.fetchone()[0]
+
+    def decr(self, key):
+        connection, names = self._sql()
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "UPDATE {table} SET {count} = {count} - 1 WHERE {key} = %s".format(
+                    **names
+                ),
+                [key],
+            )
+
+    def get(self, key):
+        connection, names = self._sql()
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT {count} FROM {table} WHERE {key} = %s AND {expires} > %s".format(
+                    **names
+                ),
+                [key, time.time()],
+            )
+            row = cursor.fetchone()
+        return row[0] if row else 0
+
+
+@lru_cache
+def _backend(path):
+    return import_string(path)()
+
+
+def get_backend():
+    """The backend settings.RATE_LIMIT_BACKEND names, one per process."""
+    return _backend(
+        getattr(settings, "RATE_LIMIT_BACKEND", "LittleLemonAPI.ratelimit.LocalBackend")
+    )
+
+
+class SlidingWindow:
+    """Allow limit hits per key in any window-second span (approximately)."""
+
+    def __init__(self, limit, window, backend=None):
+        self.limit = limit
+        self.window = window
+        self.backend = backend if backend is not None else get_backend()
+
+    def hit(self, key, now=None):
+        """Count a hit on key and return the Decision for it."""
+        if now is None:
+            now = time.time()
+        index, elapsed = divmod(now, self.window)
+        index = int(index)
+        weight = 1 - elapsed / self.window
+        # the current window's counter is read as the previous one during
+        # the next window
+        current = self.backend.incr(f"{key}:{index}", 2 * self.window)
+        previous = self.backend.get(f"{key}:{index - 1}")
+        estimate = previous * weight + current
+        if estimate <= self.limit:
+            return Decision(
+                allowed=True,
+                limit=self.limit,
+                remaining=int(self.limit - estimate),
+                reset=math.ceil(self.window - elapsed),
+                retry_after=None,
+            )
+        self.backend.decr(f"{key}:{index}")
+        wait = self._wait(previous, current - 1, elapsed)
+        return Decision(
+            allowed=False,
+            limit=self.limit,
+            remaining=0,
+            reset=math.ceil(wait),
+            retry_after=wait,
+        )
+
+    def _wait(self, previous, current, elapsed):
+        """Seconds until one more hit fits, given the counts without it."""
+        if current + 1 <= self.limit:
+            # the previous window slides out far enough during this one
+            fits_at = self.window * (1 - (self.limit - 1 - current) / previous)
+            return max(fits_at - elapsed, 0)
+        # this window's hits have to slide out during the next one
+        fits_at = self.window * (1 - (self.limit - 1) / current)
+        return self.window - elapsed + max(fits_at, 0)
@@ -0,0 +1,58 @@
+import csv
+import io
+import json
+
+import msgpack
+from rest_framework.renderers import BaseRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+
+class NDJSONRenderer(BaseRenderer):
+    """Newline-delimited JSON. Exports stream their own rows (see
+    exports.py); this renders anything else, such as errors, as one line."""
+
+    media_type = "application/x-ndjson"
+    format = "ndjson"
+    charset = "utf-8"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+        line = json.dumps(data, cls=JSONEncoder, ensure_ascii=False)
+        return f"{line}\n".encode()
+
+
+class CSVRenderer(BaseRenderer):
+    """CSV. Exports stream their own rows (see exports.py); this renders
+    anything else, such as errors, as a header and one row."""
+
+    media_type = "text/csv"
+    format = "csv"
+    charset = "utf-8"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+        if not isinstance(data, dict):
+            data = {"detail": data}
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(data.keys())
+        writer.writerow(data.values())
+        return buffer.getvalue().encode()
+
+
+class MessagePackRenderer(BaseRenderer):
+    """MessagePack (msgpack.org): JSON's data model in a compact binary form
+    that is quicker to parse. Values JSON has no type for, such as dates and
+    decimals, become what JSONRenderer makes of them."""
+
+    media_type = "application/msgpack"
+    format = "msgpack"
+    charset = None
+    render_style = "binary"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+        return msgpack.packb(data, default=JSONEncoder().default)
@@ -0,0 +1,97 @@
+from django.conf import settings
+from django.core.cache import caches
+
+MANAGER = "Manager"
+DELIVERY_CREW = "Delivery crew"
+
+_ATTRIBUTE = "_littlelemon_roles"
+
+
+def _cache():
+    alias = getattr(settings, "ROLE_CACHE", None)
+    return caches[alias] if alias else None
+
+
+def _cache_key(user_id):
+    return f"roles:{user_id}"
+
+
+def get_roles(user):
+    """Return the names of the groups user belongs to.
+
+    The names are loaded with a single query and memoized on the user object,
+    which lives for one request, so any number of role checks during a
+    request cost at most one query. With settings.ROLE_CACHE set they are
+    also shared across requests until a group membership changes.
+    """
+    if not user.is_authenticated:
+        return frozenset()
+    roles = getattr(user, _ATTRIBUTE, None)
+    if roles is not None:
+        return roles
+    cache = _cache()
+    if cache is not None:
+        roles = cache.get(_cache_key(user.pk))
+    if roles is None:
+        roles = frozenset(user.groups.values_list("name", flat=True))
+        if cache is not None:
+            cache.set(
+                _cache_key(user.pk),
+                roles,
+                getattr(settings, "ROLE_CACHE_TIMEOUT", 60),
+            )
+    setattr(user, _ATTRIBUTE, roles)
+    return roles
+
+
+async def aget_roles(user):
+    """get_roles() for async views."""
+    if not user.is_authenticated:
+        return frozenset()
+    roles = getattr(user, _ATTRIBUTE, None)
+    if roles is not None:
+        return roles
+    cache = _cache()
+    if cache is not None:
+        roles = await cache.aget(_cache_key(user.pk))
+    if roles is None:
+        names = user.groups.values_list("name", flat=True)
+        roles = frozenset([name async for name in names])
+        if cache is not None:
+            await cache.aset(
+                _cache_key(user.pk),
+                roles,
+                getattr(settings, "ROLE_CACHE_TIMEOUT", 60),
+            )
+    setattr(user, _ATTRIBUTE, roles)
+    return roles
+
+
+def remember_roles(user, roles):
+    """Memoize roles, known from elsewhere, as user's for this request."""
+    setattr(user, _ATTRIBUTE, frozenset(roles))
+
+
+def has_role(user, role):
+    return role in get_roles(user)
+
+
+def is_manager(user):
+    return has_role(user, MANAGER)
+
+
+def is_delivery_crew(user):
+    return has_role(user, DELIVERY_CREW)
+
+
+def forget_roles(*users_or_ids):
+    """Drop memoized and cached roles, e.g. after a membership change."""
+    user_ids = []
+    for user in users_or_ids:
+        if hasattr(user, "pk"):
+            user.__dict__.pop(_ATTRIBUTE, None)
+            user = user.pk
+        user_ids.append(user)
+    cache = _cache()
+    if cache is not None:
+        cache.delete_many([_cache_key(user_id) for user_id in user_ids])
@@ -0,0 +1,196 @@
+"""Per-day order rollups behind the manager analytics endpoint.
+
+DailySales, DailyMenuItemSales and DailyCrewDeliveries hold each day's
+order counts, revenue, menu item sales and delivery crew throughput, keyed
+on Order.date, so a report reads one row per day (per item, per crew
+member) however many orders there are. The order views report their writes
+here, inside their transactions: order_added() and order_removed() apply an
+order's contribution, order_changed() the difference between two versions
+of it. Each table takes one additive upsert per call, which concurrent
+writers cannot lose. rebuild() recomputes the rollups from the orders, for
+existing data and for orders written around the views.
+"""
+
+from collections import defaultdict
+from copy import copy
+
+from django.db import connections, router, transaction
+from django.db.models import Count, Q, Sum
+
+from .models import (
+    DailyCrewDeliveries,
+    DailyMenuItemSales,
+    DailySales,
+    Order,
+    OrderItem,
+)
+
+STATUS = Order._meta.get_field("status")
+
+
+def snapshot(order):
+    """A copy of order to pass to order_changed() once it has been edited."""
+    return copy(order)
+
+
+def order_added(order, orderitems):
+    _apply([(order, orderitems, 1)])
+
+
+def order_removed(order, orderitems):
+    _apply([(order, orderitems, -1)])
+
+
+def order_changed(before, after):
+    """Move an order's contribution from snapshot before to after. Only the
+    date, total, status and delivery crew are compared, not the items."""
+    _apply([(before, (), -1), (after, (), 1)])
+
+
+def _apply(changes):
+    sales = defaultdict(lambda: {"orders": 0, "delivered": 0, "revenue": 0})
+    menuitems = defaultdict(lambda: {"quantity": 0, "revenue": 0})
+    crew = defaultdict(lambda: {"assigned": 0, "delivered": 0})
+    for order, orderitems, sign in changes:
+        delivered = sign if STATUS.to_python(order.status) else 0
+        row = sales[order.date]
+        row["orders"] += sign
+        row["delivered"] += delivered
+        row["revenue"] += sign * order.total
+        for item in orderitems:
+            row = menuitems[order.date, item.menuitem_id]
+            row["quantity"] += sign * item.quantity
+            row["revenue"] += sign * item.price
+        if order.delivery_crew_id is not None:
+            row = crew[order.date, order.delivery_crew_id]
+            row["assigned"] += sign
+            row["delivered"] += delivered
+    _add(DailySales, ["date"], sales)
+    _add(DailyMenuItemSales, ["date", "menuitem"], menuitems)
+    _add(DailyCrewDeliveries, ["date", "delivery_crew"], crew)
+
+
+def _add(model, key_fields, rows):
+    """Add rows ({key: {field: delta}}) to model's table in one INSERT ... ON
+    CONFLICT DO UPDATE, which the ORM can only express as an overwrite."""
+    rows = {
+        key if isinstance(key, tuple) else (key,): deltas
+        for key, deltas in rows.items()
+        if any(deltas.values())
+    }
+    if not rows:
+        return
+    connection = connections[router.db_for_write(model)]
+    quote = connection.ops.quote_name
+    value_fields = list(next(iter(rows.values())))
+    fields = [model._meta.get_field(name) for name in key_fields + value_fields]
+    table = quote(model._meta.db_table)
+    params = []
+    for key, deltas in rows.items():
+        for field, value in zip(fields, key + tuple(deltas.values())):
+            params.append(field.get_db_prep_save(value, connection))
+    values = "({})".format(", ".join(["%s"] * len(fields)))
+    sql = "INSERT INTO {} ({}) VALUES {} ON CONFLICT ({}) DO UPDATE SET {}".format(
+        table,
+        ", ".join(quote(field.column) for field in fields),
+        ", ".join([values] * len(rows)),
+        ", ".join(quote(field.column) for field in fields[: len(key_fields)]),
+        ", ".join(
+            "{0} = {1}.{0} + excluded.{0}".format(quote(field.column), table)
+            for field in fields[len(key_fields) :]
+        ),
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+
+
+def rebuild(from_date=None):
+    """Recompute the rollups of the days from from_date on (all days if None)
+    from the orders. Returns the number of days rebuilt."""
+    orders = Order.objects.order_by()
+    orderitems = OrderItem.objects.order_by()
+    rollups = [DailySales, DailyMenuItemSales, DailyCrewDeliveries]
+    if from_date is not None:
+        orders = orders.filter(date__gte=from_date)
+        orderitems = orderitems.filter(order__date__gte=from_date)
+    delivered = Count("id", filter=Q(status=True))
+    with transaction.atomic():
+        for model in rollups:
+            rows = model.objects.all()
+            if from_date is not None:
+                rows = rows.filter(date__gte=from_date)
+            rows.delete()
+        days = DailySales.objects.bulk_create(
+            DailySales(**row)
+            for row in orders.values("date").annotate(
+                orders=Count("id"), delivered=delivered, revenue=Sum("total")
+            )
+        )
+        DailyMenuItemSales.objects.bulk_create(
+            DailyMenuItemSales(
+                date=row["order__date"],
+                menuitem_id=row["menuitem"],
+                quantity=row["quantity"],
+                revenue=row["revenue"],
+            )
+            for row in orderitems.values("order__date", "menuitem").annotate(
+                quantity=Sum("quantity"), revenue=Sum("price")
+            )
+        )
+        DailyCrewDeliveries.objects.bulk_create(
+            DailyCrewDeliveries(
+                date=row["date"],
+                delivery_crew_id=row["delivery_crew"],
+                assigned=row["assigned"],
+                delivered=row["delivered"],
+            )
+            for row in orders.filter(delivery_crew__isnull=False)
+            .values("date", "delivery_crew")
+            .annotate(assigned=Count("id"), delivered=delivered)
+        )
+    return len(days)
+
+
+def report(from_date, to_date, top):
+    """The analytics endpoint's data for the days from_date to to_date."""
+    days = {"date__gte": from_date, "date__lte": to_date}
+    daily = list(DailySales.objects.filter(**days).order_by("date"))
+    top_items = (
+        DailyMenuItemSales.objects.filter(**days)
+        .values("menuitem", "menuitem__title")
+        .annotate(quantity=Sum("quantity"), revenue=Sum("revenue"))
+        .filter(quantity__gt=0)
+        .order_by("-quantity", "-revenue", "menuitem")[:top]
+    )
+    crew = (
+        DailyCrewDeliveries.objects.filter(**days)
+        .values("delivery_crew", "delivery_crew__username")
+        .annotate(assigned=Sum("assigned"), delivered=Sum("delivered"))
+        .filter(assigned__gt=0)
+        .order_by("-delivered", "-assigned", "delivery_crew")
+    )
+    return {
+        "from_date": from_date,
+        "to_date": to_date,
+        "orders": sum(day.orders for day in daily),
+        "revenue": sum(day.revenue for day in daily),
+        "daily": daily,
+        "top_items": [
+            {
+                "id": row["menuitem"],
+                "title": row["menuitem__title"],
+                "quantity": row["quantity"],
+                "revenue": row["revenue"],
+            }
+            for row in top_items
+        ],
+        "delivery_crew": [
+            {
+                "id": row["delivery_crew"],
+                "username": row["delivery_crew__username"],
+                "assigned": row["assigned"],
+                "delivered": row["delivered"],
+            }
+            for row in crew
+        ],
+    }
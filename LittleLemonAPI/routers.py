@@ -0,0 +1,87 @@
+import random
+from contextvars import ContextVar
+from hashlib import sha256
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+# models whose reads may be served slightly stale; everything else (users,
+# groups, tokens, carts) is always read from the primary
+REPLICA_MODELS = {
+    "LittleLemonAPI.category",
+    "LittleLemonAPI.menuitem",
+    "LittleLemonAPI.order",
+    "LittleLemonAPI.orderitem",
+    "LittleLemonAPI.dailysales",
+    "LittleLemonAPI.dailymenuitemsales",
+    "LittleLemonAPI.dailycrewdeliveries",
+}
+
+# the routing state of the request being handled, set by
+# ReplicaPinningMiddleware; outside of requests everything uses the primary
+current_state = ContextVar("replica_state", default=None)
+
+
+def replicas():
+    return getattr(settings, "DATABASE_REPLICAS", [])
+
+
+def pin_key(request):
+    """Cache key identifying the client behind request, or None if it sends
+    no credentials."""
+    credential = request.META.get("HTTP_AUTHORIZATION") or request.COOKIES.get(
+        settings.SESSION_COOKIE_NAME
+    )
+    if not credential:
+        return None
+    return f"replica-pin:{sha256(credential.encode()).hexdigest()}"
+
+
+class ReplicaState:
+    def __init__(self, pinned):
+        # read from the primary for the rest of the request
+        self.pinned = pinned
+        self.wrote = False
+        # one replica per request, so its reads are mutually consistent
+        self.replica = None
+
+
+class ReplicaRouter:
+    """Send reads of REPLICA_MODELS to settings.DATABASE_REPLICAS and all
+    writes to the primary.
+
+    Reads stay on the primary within a transaction, once the request has
+    written, and whenever ReplicaPinningMiddleware pinned the request for
+    read-your-writes. Objects read from a replica fetch their relations from
+    the same replica.
+    """
+
+    def db_for_read(self, model, **hints):
+        state = current_state.get()
+        if (
+            state is None
+            or state.pinned
+            or model._meta.label_lower not in REPLICA_MODELS
+            or connections[DEFAULT_DB_ALIAS].in_atomic_block
+        ):
+            return DEFAULT_DB_ALIAS
+        instance = hints.get("instance")
+        if instance is not None and instance._state.db is not None:
+            return instance._state.db
+        if state.replica is None:
+            state.replica = random.choice(replicas())
+        return state.replica
+
+    def db_for_write(self, model, **hints):
+        state = current_state.get()
+        if state is not None:
+            state.pinned = state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # the replicas hold copies of the same rows
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # replicas receive the primary's schema through replication
+        return db not in replicas()
@@ -0,0 +1,115 @@
+from django.db import connections, transaction
+from django.db.models import Q
+
+from .models import Category, MenuItem
+
+FTS_TABLE = "LittleLemonAPI_menuitem_fts"
+# bm25 column weights: a hit in the item title counts more than its category
+TITLE_WEIGHT = 10.0
+CATEGORY_WEIGHT = 1.0
+
+
+def search_words(search):
+    # the trigram index cannot match anything shorter than three characters
+    return [word for word in search.lower().split() if len(word) >= 3]
+
+
+def quote(term):
+    """term as an FTS5 string, which escapes " by doubling it."""
+    return '"{}"'.format(term.replace('"', '""'))
+
+
+def short_words(search):
+    """The words search_words() leaves out, matched as substrings instead."""
+    return [word for word in search.split() if len(word) < 3]
+
+
+def exact_expression(words):
+    """Every word must appear somewhere in the item or category title, which
+    also makes any word a prefix match."""
+    return " AND ".join(quote(word) for word in words)
+
+
+def fuzzy_expression(words):
+    """Each word OR'ed with its own trigrams, so a misspelt word still finds
+    items sharing most of its letters; bm25 ranks those sharing more first."""
+    terms = []
+    for word in words:
+        terms.append(quote(word))
+        terms.extend(quote(word[i : i + 3]) for i in range(len(word) - 2))
+    return " OR ".join(dict.fromkeys(terms))
+
+
+def matching(queryset, expression):
+    connection = connections[queryset.db]
+    fts = connection.ops.quote_name(FTS_TABLE)
+    menuitem = connection.ops.quote_name(MenuItem._meta.db_table)
+    return queryset.extra(
+        tables=[FTS_TABLE],
+        where=[f"{fts}.rowid = {menuitem}.id", f"{fts} MATCH %s"],
+        params=[expression],
+        select={"search_rank": f"bm25({fts}, {TITLE_WEIGHT}, {CATEGORY_WEIGHT})"},
+        order_by=["search_rank", "id"],
+    )
+
+
+def containing(queryset, words):
+    # each word somewhere in the item or category title
+    for word in words:
+        queryset = queryset.filter(
+            Q(title__icontains=word) | Q(category__title__icontains=word)
+        )
+    return queryset
+
+
+def search_menu_items(queryset, search):
+    """Filter a MenuItem queryset to items matching search, best match first.
+
+    Exact (case-insensitive substring) matches are used when there are any;
+    only otherwise does the search fall back to the broader, slower typo
+    tolerant match. Words too short for the index must appear in either.
+    """
+    words = search_words(search)
+    if connections[queryset.db].vendor != "sqlite" or not words:
+        return substring_matching(queryset, search)
+    queryset = containing(queryset, short_words(search))
+    results = matching(queryset, exact_expression(words))
+    if not results.exists():
+        results = matching(queryset, fuzzy_expression(words))
+    return results
+
+
+async def asearch_menu_items(queryset, search):
+    """search_menu_items() for async views."""
+    words = search_words(search)
+    if connections[queryset.db].vendor != "sqlite" or not words:
+        return substring_matching(queryset, search)
+    queryset = containing(queryset, short_words(search))
+    results = matching(queryset, exact_expression(words))
+    if not await results.aexists():
+        results = matching(queryset, fuzzy_expression(words))
+    return results
+
+
+def substring_matching(queryset, search):
+    return queryset.filter(
+        Q(title__icontains=search) | Q(category__title__icontains=search)
+    ).order_by("id")
+
+
+def rebuild_index(using="default"):
+    """Repopulate the search index from the menu, returning the row count."""
+    connection = connections[using]
+    if connection.vendor != "sqlite":
+        return 0
+    fts = connection.ops.quote_name(FTS_TABLE)
+    menuitem = connection.ops.quote_name(MenuItem._meta.db_table)
+    category = connection.ops.quote_name(Category._meta.db_table)
+    with transaction.atomic(using=using), connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {fts}")
+        cursor.execute(
+            f"INSERT INTO {fts} (rowid, title, category) "
+            f"SELECT m.id, m.title, c.title FROM {menuitem} m "
+            f"JOIN {category} c ON c.id = m.category_id"
+        )
+        return cursor.rowcount
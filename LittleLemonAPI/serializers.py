@@ -1,8 +1,39 @@
 from rest_framework import serializers
-from .models import Cart, MenuItem, Category, Order, OrderItem
+from .models import Cart, DailySales, MenuItem, Category, Order, OrderItem
+from datetime import date, timedelta
 from decimal import Decimal
 from django.contrib.auth.models import User
 
+# built once rather than converting the float on every item
+TAX_RATE = Decimal(1.1)
+# Cart.quantity is a SmallIntegerField
+MAX_QUANTITY = 32767
+
+
+class FieldsetMixin:
+    """Takes a fieldsets.Fieldset as fieldset=, and renders only its fields,
+    with each relation it does not expand as the id in unexpanded[name], or
+    left out when that is None."""
+
+    unexpanded = {}
+
+    def __init__(self, *args, fieldset=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if fieldset is None:
+            return
+        for name in list(self.fields):
+            if self.fields[name].write_only:
+                continue
+            if name not in fieldset:
+                del self.fields[name]
+            elif name in self.unexpanded and not fieldset.expands(name):
+                if self.unexpanded[name] is None:
+                    del self.fields[name]
+                else:
+                    self.fields[name] = serializers.IntegerField(
+                        source=self.unexpanded[name], read_only=True
+                    )
+
 
 class OrderItemSerializer(serializers.ModelSerializer):
     class Meta:
@@ -16,7 +47,8 @@ class UserSerializer(serializers.ModelSerializer):
         fields = ["id", "username", "first_name", "last_name", "email"]
 
 
-class OrderSerializer(serializers.ModelSerializer):
+class OrderSerializer(FieldsetMixin, serializers.ModelSerializer):
+    unexpanded = {"user": "user_id", "orderitems": None}
     orderitems = OrderItemSerializer(many=True)
     user = UserSerializer()
 
@@ -26,11 +58,33 @@ class OrderSerializer(serializers.ModelSerializer):
         depth = 2
 
 
+class CartMenuItemSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = MenuItem
+        fields = ["id", "title", "price", "featured", "category"]
+
+
 class CartSerializer(serializers.ModelSerializer):
+    menuitem = CartMenuItemSerializer(read_only=True)
+
     class Meta:
         model = Cart
         fields = ["menuitem", "quantity"]
-        depth = 1
+
+
+class CartItemSerializer(serializers.Serializer):
+    # entries accepted by one batch request
+    MAX_BATCH = 100
+
+    item = serializers.IntegerField()
+    quantity = serializers.IntegerField(min_value=1, max_value=MAX_QUANTITY)
+
+
+class CartSummarySerializer(serializers.Serializer):
+    item_count = serializers.IntegerField()
+    subtotal = serializers.DecimalField(max_digits=10, decimal_places=2)
+    tax = serializers.DecimalField(max_digits=10, decimal_places=2)
+    total = serializers.DecimalField(max_digits=10, decimal_places=2)
 
 
 class CategorySerializer(serializers.ModelSerializer):
@@ -39,7 +93,8 @@ class CategorySerializer(serializers.ModelSerializer):
         fields = ["id", "slug", "title"]
 
 
-class MenuItemSerializer(serializers.ModelSerializer):
+class MenuItemSerializer(FieldsetMixin, serializers.ModelSerializer):
+    unexpanded = {"category": "category_id"}
     price_after_tax = serializers.SerializerMethodField(method_name="calculate_tax")
     category = CategorySerializer(read_only=True)
     category_id = serializers.IntegerField(write_only=True)
@@ -57,4 +112,120 @@ class MenuItemSerializer(serializers.ModelSerializer):
         ]
 
     def calculate_tax(self, product: MenuItem):
-        return product.price * Decimal(1.1)
+        return product.price * TAX_RATE
+
+
+class MenuImportRowSerializer(serializers.Serializer):
+    """A row of a bulk menu import: a new item without id, else the changes
+    to item id. The category is given by id or by title."""
+
+    # rows accepted by one bulk request
+    MAX_ROWS = 1000
+
+    id = serializers.IntegerField(required=False)
+    title = serializers.CharField(max_length=255, required=False)
+    price = serializers.DecimalField(
+        max_digits=6, decimal_places=2, min_value=0, required=False
+    )
+    featured = serializers.BooleanField(required=False)
+    category_id = serializers.IntegerField(required=False)
+    category = serializers.CharField(required=False)
+
+    def validate(self, data):
+        if "id" not in data:
+            missing = [field for field in ("title", "price") if field not in data]
+            if "category_id" not in data and "category" not in data:
+                missing.append("category_id")
+            if missing:
+                raise serializers.ValidationError(
+                    {
+                        field: "This field is required to create an item."
+                        for field in missing
+                    }
+                )
+        return data
+
+
+class OrderFilterSerializer(serializers.Serializer):
+    status = serializers.BooleanField(required=False, allow_null=True, default=None)
+    from_date = serializers.DateField(required=False)
+    to_date = serializers.DateField(required=False)
+    delivery_crew = serializers.CharField(required=False)
+    user = serializers.CharField(required=False)
+
+
+class MenuItemFilterSerializer(serializers.Serializer):
+    # orderings an index can return presorted; each ends in the primary key
+    # so pages are stable
+    ORDERINGS = {
+        "id": ("id",),
+        "-id": ("-id",),
+        "price": ("price", "id"),
+        "-price": ("-price", "-id"),
+        "title": ("title", "id"),
+        "-title": ("-title", "-id"),
+    }
+    MAX_PERPAGE = 100
+    # keeps the page's offset well within the database's integers
+    MAX_PAGE = 10000
+
+    category = serializers.CharField(required=False)
+    featured = serializers.BooleanField(required=False, allow_null=True, default=None)
+    to_price = serializers.DecimalField(
+        max_digits=None, decimal_places=None, min_value=0, required=False
+    )
+    search = serializers.CharField(required=False)
+    ordering = serializers.ChoiceField(choices=list(ORDERINGS), required=False)
+    page = serializers.IntegerField(min_value=1, max_value=MAX_PAGE, default=1)
+    perpage = serializers.IntegerField(min_value=1, default=2)
+
+    def validate_perpage(self, value):
+        return min(value, self.MAX_PERPAGE)
+
+
+class AnalyticsFilterSerializer(serializers.Serializer):
+    DEFAULT_DAYS = 30
+    MAX_TOP = 100
+
+    from_date = serializers.DateField(required=False)
+    to_date = serializers.DateField(required=False)
+    top = serializers.IntegerField(min_value=1, max_value=MAX_TOP, default=10)
+
+    def validate(self, data):
+        to_date = data.setdefault("to_date", date.today())
+        from_date = data.setdefault(
+            "from_date", to_date - timedelta(days=self.DEFAULT_DAYS - 1)
+        )
+        if from_date > to_date:
+            raise serializers.ValidationError("from_date must not be after to_date.")
+        return data
+
+
+class DailySalesSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = DailySales
+        fields = ["date", "orders", "delivered", "revenue"]
+
+
+class TopMenuItemSerializer(serializers.Serializer):
+    id = serializers.IntegerField()
+    title = serializers.CharField()
+    quantity = serializers.IntegerField()
+    revenue = serializers.DecimalField(max_digits=12, decimal_places=2)
+
+
+class CrewThroughputSerializer(serializers.Serializer):
+    id = serializers.IntegerField()
+    username = serializers.CharField()
+    assigned = serializers.IntegerField()
+    delivered = serializers.IntegerField()
+
+
+class AnalyticsSerializer(serializers.Serializer):
+    from_date = serializers.DateField()
+    to_date = serializers.DateField()
+    orders = serializers.IntegerField()
+    revenue = serializers.DecimalField(max_digits=12, decimal_places=2)
+    daily = DailySalesSerializer(many=True)
+    top_items = TopMenuItemSerializer(many=True)
+    delivery_crew = CrewThroughputSerializer(many=True)
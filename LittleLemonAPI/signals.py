@@ -0,0 +1,110 @@
+from django.conf import settings
+from django.contrib.auth.models import Group, User
+from django.contrib.auth.signals import user_logged_out
+from django.db import transaction
+from django.db.backends.signals import connection_created
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from . import carts, events, metrics
+from .authentication import token_cache
+from .cache import catalogue_cache
+from .models import Cart, Category, MenuItem, Order
+from .roles import forget_roles
+
+
+@receiver(post_save, sender=MenuItem)
+@receiver(post_delete, sender=MenuItem)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def bump_catalogue_version(sender, **kwargs):
+    # bump after commit, otherwise a concurrent read could cache the old rows
+    # under the new version
+    transaction.on_commit(catalogue_cache.bump)
+
+
+@receiver(post_save, sender=MenuItem)
+def reprice_carts(sender, instance, created, raw, **kwargs):
+    if not created and not raw:
+        carts.reprice([instance.pk])
+
+
+@receiver(pre_delete, sender=MenuItem)
+def remember_cart_owners(sender, instance, **kwargs):
+    # the item's Cart rows are about to be cascade deleted
+    instance._cart_owners = list(
+        Cart.objects.filter(menuitem=instance).values_list("user", flat=True)
+    )
+
+
+@receiver(post_delete, sender=MenuItem)
+def rebuild_cart_summaries(sender, instance, **kwargs):
+    owners = getattr(instance, "_cart_owners", None)
+    if owners:
+        carts.rebuild(owners)
+
+
+@receiver(post_save, sender=Order)
+def publish_order_event(sender, instance, raw, **kwargs):
+    if not raw:
+        event = events.order_event(instance)
+        transaction.on_commit(lambda: events.broker.publish(event))
+
+
+def forget_users(*user_ids):
+    # their roles, and the cached tokens holding their roles
+    forget_roles(*user_ids)
+    token_cache.forget_users(*user_ids)
+
+
+@receiver(m2m_changed, sender=User.groups.through)
+def forget_changed_roles(sender, instance, action, reverse, pk_set, **kwargs):
+    if not reverse:
+        # user.groups.add(...) and friends
+        if action.startswith("post_"):
+            forget_roles(instance)
+            token_cache.forget_users(instance.pk)
+    elif action == "pre_clear":
+        # group.user_set.clear(): pk_set is not given, so look the members up
+        forget_users(*instance.user_set.values_list("pk", flat=True))
+    elif action in ("post_add", "post_remove"):
+        forget_users(*pk_set)
+
+
+@receiver(post_save, sender=Group)
+@receiver(pre_delete, sender=Group)
+def forget_group_roles(sender, instance, **kwargs):
+    # a renamed or deleted group changes every member's role names
+    if instance.pk is not None:
+        forget_users(*instance.user_set.values_list("pk", flat=True))
+
+
+@receiver(post_delete, sender=Token)
+def forget_token(sender, instance, **kwargs):
+    # djoser's token logout deletes the user's tokens
+    token_cache.forget(instance.key)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+@receiver(user_logged_out)
+def forget_user_tokens(sender, user=None, instance=None, **kwargs):
+    # deactivated, renamed or deleted, or logged out
+    user = user or instance
+    if user is not None and user.pk is not None:
+        token_cache.forget_users(user.pk)
+
+
+@receiver(connection_created)
+def configure_sqlite(sender, connection, **kwargs):
+    if connection.vendor != "sqlite":
+        return
+    # on the raw connection: set-up, not queries of the current request
+    for name, value in getattr(settings, "SQLITE_PRAGMAS", {}).items():
+        connection.connection.execute(f"PRAGMA {name} = {value}")
+
+
+@receiver(connection_created)
+def instrument_connection(sender, connection, **kwargs):
+    metrics.instrument(connection)
@@ -0,0 +1,140 @@
+"""A database-backed task queue for work that need not hold up a request.
+
+Views queue work with enqueue(), which writes the Job row once their
+transaction commits, so workers never see jobs for writes that were rolled
+back. `manage.py run_tasks` claims due jobs, runs each in its own
+transaction and deletes it with the task's writes. A task that raises is
+retried after an exponentially growing delay, up to its max_attempts, and
+then kept as failed with its traceback. A job whose worker died is claimed
+again once its lease runs out, so tasks must be safe to run twice.
+"""
+
+import logging
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import Count, F, Q
+from django.utils import timezone
+
+from . import rollups
+from .models import Job, Order
+from .roles import DELIVERY_CREW
+
+logger = logging.getLogger(__name__)
+
+TASKS = {}
+
+# longest wait between two attempts of a job, in seconds
+MAX_RETRY_DELAY = 60 * 60
+
+
+def task(max_attempts=5):
+    """Register the decorated function as a task, under its name."""
+
+    def register(func):
+        func.max_attempts = max_attempts
+        TASKS[func.__name__] = func
+        return func
+
+    return register
+
+
+def enqueue(name, **kwargs):
+    """Queue task name to run with kwargs (JSON values) once the current
+    transaction commits, or now outside of one."""
+    if name not in TASKS:
+        raise LookupError(f"No task is called {name!r}.")
+    transaction.on_commit(lambda: Job.objects.create(task=name, kwargs=kwargs))
+
+
+def retry_delay(attempts):
+    """Seconds to wait before the attempt after attempts failed ones."""
+    delay = settings.TASK_RETRY_DELAY * 2 ** (attempts - 1)
+    return min(delay, MAX_RETRY_DELAY)
+
+
+def claim(limit):
+    """Take up to limit due jobs for this worker until their lease runs out."""
+    now = timezone.now()
+    lease = now + timedelta(seconds=settings.TASK_LEASE)
+    due = Job.objects.filter(status=Job.QUEUED, run_at__lte=now)
+    claimed = []
+    for job in due.order_by("run_at", "id")[:limit]:
+        # unless a concurrent worker has claimed it since
+        if Job.objects.filter(pk=job.pk, attempts=job.attempts).update(
+            run_at=lease, attempts=F("attempts") + 1
+        ):
+            job.run_at, job.attempts = lease, job.attempts + 1
+            claimed.append(job)
+    return claimed
+
+
+def run(job):
+    """Run a claimed job. Returns whether it succeeded."""
+    func = TASKS.get(job.task)
+    try:
+        if func is None:
+            raise LookupError(f"No task is called {job.task!r}.")
+        with transaction.atomic():
+            func(**job.kwargs)
+            Job.objects.filter(pk=job.pk).delete()
+        return True
+    except Exception:
+        error = traceback.format_exc()
+    if job.attempts >= getattr(func, "max_attempts", 1):
+        logger.error("Job %s (%s) failed for good:\n%s", job.pk, job.task, error)
+        Job.objects.filter(pk=job.pk).update(status=Job.FAILED, last_error=error)
+    else:
+        delay = retry_delay(job.attempts)
+        logger.warning("Job %s (%s) failed, retrying in %ss", job.pk, job.task, delay)
+        Job.objects.filter(pk=job.pk).update(
+            run_at=timezone.now() + timedelta(seconds=delay), last_error=error
+        )
+    return False
+
+
+def run_pending(batch=10):
+    """Run jobs until none are due. Returns how many ran and how many of
+    those failed."""
+    ran = failed = 0
+    while jobs := claim(batch):
+        for job in jobs:
+            ran += 1
+            failed += not run(job)
+    return ran, failed
+
+
+def least_busy_crew():
+    """The delivery crew member with the fewest undelivered orders."""
+    return (
+        User.objects.filter(groups__name=DELIVERY_CREW, is_active=True)
+        .annotate(
+            open_orders=Count("delivery_crew", filter=Q(delivery_crew__status=False))
+        )
+        .order_by("open_orders", "id")
+        .first()
+    )
+
+
+@task()
+def assign_delivery_crew(order_id):
+    """Give an order nobody delivers yet to the least busy crew member."""
+    order = (
+        Order.objects.select_for_update()
+        .filter(pk=order_id, delivery_crew__isnull=True)
+        .first()
+    )
+    if order is None:
+        # deleted, or a manager assigned it first
+        return
+    crew = least_busy_crew()
+    if crew is None:
+        logger.warning("No delivery crew to assign order %s to", order_id)
+        return
+    before = rollups.snapshot(order)
+    order.delivery_crew = crew
+    order.save(update_fields=["delivery_crew"])
+    rollups.order_changed(before, order)
@@ -1,3 +1,1882 @@
-from django.test import TestCase
+import csv
+import gzip
+import json
+import logging
+import multiprocessing
+import re
+import tempfile
+from asyncio import iscoroutinefunction
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+from decimal import Decimal
+from io import StringIO
+from pathlib import Path
 
-# Create your tests here.
+import msgpack
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import Group, User
+from django.core.cache import caches
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import call_command
+from django.db import connection, connections, transaction
+from django.test import (
+    AsyncClient,
+    Client,
+    TestCase,
+    TransactionTestCase,
+    override_settings,
+)
+from django.test.utils import CaptureQueriesContext
+from django.urls import resolve
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from . import events, ratelimit, tasks
+from .authentication import TokenCache, token_cache
+from .cache import catalogue_cache
+from .metrics import RequestCollector, registry
+from .middleware import brotli
+from .models import (
+    Cart,
+    CartSummary,
+    Category,
+    DailyCrewDeliveries,
+    Job,
+    MenuItem,
+    Order,
+    OrderItem,
+    RateLimitCounter,
+)
+from .roles import get_roles, is_manager
+from .renderers import MessagePackRenderer
+from .serializers import OrderSerializer
+from .routers import ReplicaRouter
+from .search import rebuild_index
+
+
+class LittleLemonTestCase(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        # keep the per-request metrics log lines out of the test output
+        logger = logging.getLogger("LittleLemonAPI.metrics")
+        cls.addClassCleanup(logger.setLevel, logger.level)
+        logger.setLevel(logging.ERROR)
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.manager_group = Group.objects.create(name="Manager")
+        cls.crew_group = Group.objects.create(name="Delivery crew")
+        cls.manager = User.objects.create_user("manager", password="pw")
+        cls.manager.groups.add(cls.manager_group)
+        cls.crew = User.objects.create_user("crew", password="pw")
+        cls.crew.groups.add(cls.crew_group)
+        cls.customer = User.objects.create_user("customer", password="pw")
+        cls.category = Category.objects.create(slug="mains", title="Mains")
+        cls.menuitems = [
+            MenuItem.objects.create(
+                title=f"Dish {i}", price=Decimal("5.00") + i, category=cls.category
+            )
+            for i in range(3)
+        ]
+
+    def setUp(self):
+        caches[catalogue_cache.alias].clear()
+        token_cache.clear()
+
+    def client_for(self, user):
+        client = APIClient()
+        client.force_authenticate(user)
+        return client
+
+    def make_orders(self, count, user=None, delivery_crew=None, **fields):
+        fields.setdefault("date", date.today())
+        for _ in range(count):
+            order = Order.objects.create(
+                user=user or self.customer,
+                delivery_crew=delivery_crew,
+                total=0,
+                **fields,
+            )
+            for menuitem in self.menuitems:
+                OrderItem.objects.create(
+                    order=order,
+                    menuitem=menuitem,
+                    quantity=1,
+                    unit_price=menuitem.price,
+                    price=menuitem.price,
+                )
+
+
+class OrderListQueryBudgetTests(LittleLemonTestCase):
+    # roles + orders joined with users + prefetched orderitems
+    QUERY_BUDGET = 3
+
+    def assert_constant_queries(self, user, **order_kwargs):
+        for count, expected in ((1, 1), (20, 21)):
+            self.make_orders(count, **order_kwargs)
+            # a fresh user object, as authentication would load per request
+            client = self.client_for(User.objects.get(pk=user.pk))
+            with self.assertNumQueries(self.QUERY_BUDGET):
+                self.assertEqual(len(client.get("/api/orders").data), expected)
+
+    def test_manager_listing(self):
+        self.assert_constant_queries(self.manager)
+
+    def test_delivery_crew_listing(self):
+        self.assert_constant_queries(self.crew, delivery_crew=self.crew)
+
+    def test_customer_listing(self):
+        self.assert_constant_queries(self.customer)
+
+    def test_nested_payload(self):
+        self.make_orders(1)
+        response = self.client_for(self.customer).get("/api/orders")
+        order = response.data[0]
+        self.assertEqual(order["user"]["username"], "customer")
+        self.assertEqual(
+            [item["menuitem"] for item in order["orderitems"]],
+            [menuitem.id for menuitem in self.menuitems],
+        )
+
+
+class OrderPaginationTests(LittleLemonTestCase):
+    def walk(self, client, url):
+        seen = []
+        while url:
+            response = client.get(url)
+            self.assertEqual(response.status_code, 200)
+            seen.extend(order["id"] for order in response.data)
+            link = response.headers.get("Link")
+            url = link[1 : link.index(">")] if link else None
+        return seen
+
+    def test_cursor_walks_every_order_once_newest_first(self):
+        for days_ago in (0, 1, 1, 2, 2, 2):
+            self.make_orders(1, date=date.today() - timedelta(days=days_ago))
+        expected = list(
+            Order.objects.order_by("-date", "-id").values_list("id", flat=True)
+        )
+        seen = self.walk(self.client_for(self.manager), "/api/orders?perpage=4")
+        self.assertEqual(seen, expected)
+
+    def test_cursor_is_stable_when_orders_are_added(self):
+        self.make_orders(4, date=date.today() - timedelta(days=1))
+        client = self.client_for(self.manager)
+        first = client.get("/api/orders?perpage=2")
+        self.make_orders(3)
+        link = first.headers["Link"]
+        second = client.get(link[1 : link.index(">")])
+        older = Order.objects.order_by("-id").values_list("id", flat=True)[3:]
+        seen = [order["id"] for order in first.data + second.data]
+        self.assertEqual(seen, list(older))
+
+    def test_invalid_cursor(self):
+        response = self.client_for(self.manager).get("/api/orders?cursor=nope")
+        self.assertEqual(response.status_code, 404)
+
+    def test_filters(self):
+        other = User.objects.create_user("other", password="pw")
+        self.make_orders(2, delivery_crew=self.crew, status=True)
+        self.make_orders(1, user=other, date=date.today() - timedelta(days=10))
+        client = self.client_for(self.manager)
+        self.assertEqual(len(client.get("/api/orders?status=1").data), 2)
+        self.assertEqual(len(client.get("/api/orders?delivery_crew=crew").data), 2)
+        self.assertEqual(len(client.get("/api/orders?user=other").data), 1)
+        since = (date.today() - timedelta(days=1)).isoformat()
+        self.assertEqual(len(client.get(f"/api/orders?from_date={since}").data), 2)
+        self.assertEqual(len(client.get(f"/api/orders?to_date={since}").data), 1)
+        self.assertEqual(client.get("/api/orders?to_date=soon").status_code, 400)
+
+
+class CheckoutTests(LittleLemonTestCase):
+    def fill_cart(self, menuitems):
+        for menuitem in menuitems:
+            Cart.objects.create(
+                user=self.customer,
+                menuitem=menuitem,
+                quantity=2,
+                unit_price=menuitem.price,
+                price=menuitem.price * 2,
+            )
+
+    def test_checkout_moves_cart_into_order(self):
+        self.fill_cart(self.menuitems)
+        response = self.client_for(self.customer).post("/api/orders")
+        self.assertEqual(response.status_code, 201)
+        order = Order.objects.get(pk=response.data["id"])
+        self.assertEqual(order.total, Decimal("36.00"))
+        self.assertEqual(order.orderitems.count(), 3)
+        self.assertFalse(Cart.objects.filter(user=self.customer).exists())
+
+    def test_checkout_query_count_does_not_grow_with_cart(self):
+        client = self.client_for(self.customer)
+        self.fill_cart(self.menuitems[:1])
+        # including zeroing the cart summary and the two rollup upserts
+        with self.assertNumQueries(10):
+            client.post("/api/orders")
+        self.fill_cart(self.menuitems)
+        with self.assertNumQueries(10):
+            client.post("/api/orders")
+
+    def test_empty_cart_is_rejected(self):
+        response = self.client_for(self.customer).post("/api/orders")
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Order.objects.exists())
+
+
+class CartSummaryTests(LittleLemonTestCase):
+    def add(self, client, menuitem, quantity):
+        response = client.post(
+            "/api/cart/menu-items", {"item": menuitem.pk, "quantity": quantity}
+        )
+        self.assertEqual(response.status_code, 201)
+
+    def summary(self, client):
+        return client.get("/api/cart/menu-items").data["summary"]
+
+    def test_summary_follows_the_cart(self):
+        client = self.client_for(self.customer)
+        self.assertEqual(
+            self.summary(client),
+            {"item_count": 0, "subtotal": "0.00", "tax": "0.00", "total": "0.00"},
+        )
+        self.add(client, self.menuitems[0], 2)
+        self.add(client, self.menuitems[2], 1)
+        self.assertEqual(
+            self.summary(client),
+            {"item_count": 3, "subtotal": "17.00", "tax": "1.70", "total": "18.70"},
+        )
+        client.delete("/api/cart/menu-items")
+        self.assertEqual(self.summary(client)["item_count"], 0)
+        self.add(client, self.menuitems[1], 1)
+        client.post("/api/orders")
+        self.assertEqual(self.summary(client)["subtotal"], "0.00")
+
+    def test_cart_is_read_in_one_query(self):
+        client = self.client_for(self.customer)
+        for menuitem in self.menuitems:
+            self.add(client, menuitem, 1)
+        with self.assertNumQueries(1):
+            response = client.get("/api/cart/menu-items")
+        self.assertEqual(len(response.data["items"]), 3)
+        self.assertEqual(response.data["items"][0]["menuitem"]["title"], "Dish 0")
+        # updated_at backs ETags, and stays out of the representation
+        self.assertEqual(
+            list(response.data["items"][0]["menuitem"]),
+            ["id", "title", "price", "featured", "category"],
+        )
+
+    def test_price_changes_reprice_open_carts(self):
+        client = self.client_for(self.customer)
+        self.add(client, self.menuitems[0], 2)
+        self.add(client, self.menuitems[1], 1)
+        other = self.client_for(self.crew)
+        self.add(other, self.menuitems[0], 1)
+        menuitem = self.menuitems[0]
+        menuitem.price = Decimal("7.50")
+        menuitem.save()
+        self.assertEqual(self.summary(client)["subtotal"], "21.00")
+        self.assertEqual(self.summary(other)["subtotal"], "7.50")
+        cart = Cart.objects.get(user=self.customer, menuitem=menuitem)
+        self.assertEqual((cart.unit_price, cart.price), (Decimal("7.50"), 15))
+        # a checkout charges the new price
+        response = client.post("/api/orders")
+        self.assertEqual(response.data["total"], "21.00")
+
+    def test_deleted_menu_items_leave_the_summary(self):
+        client = self.client_for(self.customer)
+        self.add(client, self.menuitems[0], 2)
+        self.add(client, self.menuitems[1], 1)
+        self.menuitems[0].delete()
+        self.assertEqual(self.summary(client)["item_count"], 1)
+        self.assertEqual(self.summary(client)["subtotal"], "6.00")
+
+
+class CartBatchTests(LittleLemonTestCase):
+    def post(self, path, data, **headers):
+        return self.client_for(self.customer).post(
+            path, data, format="json", headers=headers
+        )
+
+    def quantities(self):
+        return dict(
+            Cart.objects.filter(user=self.customer).values_list("menuitem", "quantity")
+        )
+
+    def test_adding_an_item_again_raises_its_quantity(self):
+        menuitem = self.menuitems[0]
+        for _ in range(2):
+            response = self.post(
+                "/api/cart/menu-items", {"item": menuitem.pk, "quantity": 2}
+            )
+            self.assertEqual(response.status_code, 201)
+        self.assertEqual(self.quantities(), {menuitem.pk: 4})
+        cart = Cart.objects.get(user=self.customer)
+        self.assertEqual(cart.price, Decimal("20.00"))
+
+    def test_batch(self):
+        first, second, third = (menuitem.pk for menuitem in self.menuitems)
+        self.post("/api/cart/menu-items", {"item": first, "quantity": 1})
+        response = self.post(
+            "/api/cart/menu-items/batch",
+            [
+                {"item": first, "quantity": 1},
+                {"item": second, "quantity": 2},
+                {"item": second, "quantity": 1},
+            ],
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(
+            [
+                (item["menuitem"]["id"], item["quantity"])
+                for item in response.data["items"]
+            ],
+            [(first, 2), (second, 3)],
+        )
+        self.assertEqual(response.data["summary"]["item_count"], 5)
+        self.assertEqual(response.data["summary"]["subtotal"], "28.00")
+        self.assertEqual(self.quantities(), {first: 2, second: 3})
+        response = self.post(
+            "/api/cart/menu-items/batch",
+            [{"item": third, "quantity": 1}, {"item": 0, "quantity": 1}],
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.quantities(), {first: 2, second: 3})
+
+    def test_batch_query_count_does_not_grow(self):
+        def add(menuitems):
+            with CaptureQueriesContext(connection) as queries:
+                response = self.post(
+                    "/api/cart/menu-items/batch",
+                    [{"item": menuitem.pk, "quantity": 1} for menuitem in menuitems],
+                )
+            self.assertEqual(response.status_code, 201)
+            return len(queries)
+
+        self.assertEqual(add(self.menuitems[:1]), add(self.menuitems))
+
+    def test_idempotency_key(self):
+        data = [{"item": self.menuitems[0].pk, "quantity": 1}]
+        first = self.post(
+            "/api/cart/menu-items/batch", data, **{"Idempotency-Key": "a"}
+        )
+        retry = self.post(
+            "/api/cart/menu-items/batch", data, **{"Idempotency-Key": "a"}
+        )
+        self.assertEqual(retry.status_code, 201)
+        self.assertEqual(retry.data, first.data)
+        self.assertEqual(retry["Idempotent-Replayed"], "true")
+        self.assertEqual(self.quantities(), {self.menuitems[0].pk: 1})
+        # a new key is a new request; a reused one must match the original
+        self.post("/api/cart/menu-items/batch", data, **{"Idempotency-Key": "b"})
+        self.assertEqual(self.quantities(), {self.menuitems[0].pk: 2})
+        data[0]["quantity"] = 5
+        response = self.post(
+            "/api/cart/menu-items/batch", data, **{"Idempotency-Key": "a"}
+        )
+        self.assertEqual(response.status_code, 422)
+
+    def test_failed_requests_are_not_replayed(self):
+        data = {"item": 0, "quantity": 1}
+        response = self.post("/api/cart/menu-items", data, **{"Idempotency-Key": "a"})
+        self.assertEqual(response.status_code, 400)
+        data["item"] = self.menuitems[0].pk
+        # the key was released with the failed request's writes, so the
+        # corrected request may use it
+        response = self.post("/api/cart/menu-items", data, **{"Idempotency-Key": "a"})
+        self.assertEqual(response.status_code, 201)
+
+
+class AnalyticsTests(LittleLemonTestCase):
+    def checkout(self, user, quantities):
+        client = self.client_for(user)
+        client.post(
+            "/api/cart/menu-items/batch",
+            [
+                {"item": menuitem.pk, "quantity": quantity}
+                for menuitem, quantity in zip(self.menuitems, quantities)
+                if quantity
+            ],
+            format="json",
+        )
+        return client.post("/api/orders").data["id"]
+
+    def report(self, **params):
+        response = self.client_for(self.manager).get("/api/analytics", params)
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_rollups_follow_orders(self):
+        first = self.checkout(self.customer, [2, 1])
+        self.checkout(self.crew, [0, 1, 1])
+        manager = self.client_for(self.manager)
+        manager.patch(f"/api/orders/{first}", {"delivery_crew": "crew"})
+        self.client_for(self.crew).patch(f"/api/orders/{first}", {"status": 1})
+        report = self.report()
+        self.assertEqual((report["orders"], report["revenue"]), (2, "29.00"))
+        self.assertEqual(
+            report["daily"],
+            [
+                {
+                    "date": date.today().isoformat(),
+                    "orders": 2,
+                    "delivered": 1,
+                    "revenue": "29.00",
+                }
+            ],
+        )
+        self.assertEqual(
+            [(item["title"], item["quantity"]) for item in report["top_items"]],
+            [("Dish 1", 2), ("Dish 0", 2), ("Dish 2", 1)],
+        )
+        self.assertEqual(
+            report["delivery_crew"],
+            [{"id": self.crew.pk, "username": "crew", "assigned": 1, "delivered": 1}],
+        )
+        manager.delete(f"/api/orders/{first}")
+        report = self.report(top=1)
+        self.assertEqual((report["orders"], report["revenue"]), (1, "13.00"))
+        self.assertEqual(len(report["top_items"]), 1)
+        self.assertEqual(report["delivery_crew"], [])
+
+    def test_rebuild_matches_incremental_rollups(self):
+        order = self.checkout(self.customer, [1, 2, 3])
+        self.client_for(self.manager).patch(
+            f"/api/orders/{order}", {"delivery_crew": "crew", "status": 1}
+        )
+        self.make_orders(2, delivery_crew=self.crew, date=date.today() - timedelta(1))
+        before = self.report()
+        out = StringIO()
+        call_command("rebuild_analytics", stdout=out)
+        self.assertIn("2 days", out.getvalue())
+        after = self.report()
+        self.assertEqual(after["orders"], 3)
+        self.assertEqual(after["daily"][1], before["daily"][0])
+        self.assertEqual(after["delivery_crew"][0]["assigned"], 3)
+
+    def test_report_reads_rollups_not_orders(self):
+        self.make_orders(20)
+        call_command("rebuild_analytics", stdout=StringIO())
+        client = self.client_for(self.manager)
+        with CaptureQueriesContext(connection) as queries:
+            client.get("/api/analytics")
+        # the manager's roles, then days, items and crew
+        self.assertEqual(len(queries), 4)
+        self.assertFalse(any('"LittleLemonAPI_order"' in q["sql"] for q in queries))
+
+    def test_managers_only(self):
+        response = self.client_for(self.customer).get("/api/analytics")
+        self.assertEqual(response.status_code, 403)
+        response = self.client_for(self.manager).get(
+            "/api/analytics", {"from_date": "2024-02-01", "to_date": "2024-01-01"}
+        )
+        self.assertEqual(response.status_code, 400)
+
+
+@override_settings(EXPORT_CHUNK_SIZE=2)
+class ExportTests(LittleLemonTestCase):
+    def export(self, url, user=None):
+        response = self.client_for(user or self.manager).get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        return response, b"".join(response.streaming_content).decode()
+
+    def test_orders_ndjson(self):
+        self.make_orders(5, delivery_crew=self.crew)
+        response, body = self.export("/api/orders/export")
+        self.assertEqual(
+            response["Content-Type"], "application/x-ndjson; charset=utf-8"
+        )
+        self.assertIn("orders.ndjson", response["Content-Disposition"])
+        expected = OrderSerializer(
+            Order.objects.with_details().order_by("id"), many=True
+        )
+        self.assertEqual(
+            [json.loads(line) for line in body.splitlines()],
+            json.loads(json.dumps(expected.data)),
+        )
+
+    def test_orders_csv(self):
+        self.make_orders(2)
+        Order.objects.create(user=self.crew, total=0, date=date(2024, 1, 2))
+        _, body = self.export("/api/orders/export?format=csv")
+        rows = list(csv.reader(StringIO(body)))
+        self.assertEqual(rows[0][:3], ["order_id", "date", "user_id"])
+        # one row per order item, and one for the order without items
+        self.assertEqual(len(rows), 1 + 2 * 3 + 1)
+        self.assertEqual(rows[1][3], "customer")
+        self.assertEqual(rows[-1][1:4], ["2024-01-02", str(self.crew.pk), "crew"])
+        self.assertEqual(rows[-1][7:], ["", "", "", ""])
+
+    def test_orders_are_read_a_chunk_at_a_time(self):
+        self.make_orders(5)
+        response = self.client_for(self.manager).get("/api/orders/export")
+        with CaptureQueriesContext(connection) as queries:
+            b"".join(response.streaming_content)
+        # an order query and an order item query per chunk of two
+        item_queries = [q for q in queries if '"LittleLemonAPI_orderitem"' in q["sql"]]
+        self.assertEqual(len(item_queries), 3)
+
+    def test_menu(self):
+        _, body = self.export("/api/menu-items/export?format=csv")
+        rows = list(csv.reader(StringIO(body)))
+        self.assertEqual(
+            rows[:2],
+            [
+                ["id", "title", "price", "featured", "category_id", "category"],
+                [
+                    str(self.menuitems[0].pk),
+                    "Dish 0",
+                    "5.00",
+                    "1",
+                    str(self.category.pk),
+                    "Mains",
+                ],
+            ],
+        )
+        _, body = self.export("/api/menu-items/export")
+        self.assertEqual(
+            [json.loads(line)["title"] for line in body.splitlines()],
+            ["Dish 0", "Dish 1", "Dish 2"],
+        )
+
+    def test_managers_only(self):
+        response = self.client_for(self.customer).get("/api/orders/export")
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(json.loads(response.content)["detail"][:3], "You")
+
+    @override_settings(ROOT_URLCONF="LittleLemon.asgi_urls")
+    async def test_asgi_streams_without_buffering(self):
+        await sync_to_async(self.make_orders)(3)
+        token = await Token.objects.acreate(user=self.manager)
+        response = await self.async_client.get(
+            "/api/orders/export", headers={"Authorization": f"Token {token.key}"}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.is_async)
+        lines = [line async for line in response.streaming_content]
+        # one piece per chunk, not one piece for everything
+        self.assertEqual(len(lines), 2)
+        self.assertEqual(b"".join(lines).count(b"\n"), 3)
+
+
+@override_settings(
+    ROOT_URLCONF="LittleLemon.asgi_urls",
+    ORDER_EVENTS_HEARTBEAT=0.05,
+    ORDER_EVENTS_TIMEOUT=0.3,
+)
+class OrderEventTests(LittleLemonTestCase):
+    async def open(self, user=None, query=""):
+        headers = {}
+        if user is not None:
+            token, _ = await Token.objects.aget_or_create(user=user)
+            headers["Authorization"] = f"Token {token.key}"
+        return await self.async_client.get(
+            f"/api/orders/events{query}", headers=headers
+        )
+
+    async def read(self, response):
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+        body = b"".join([chunk async for chunk in response.streaming_content])
+        return [
+            json.loads(line[len("data: ") :])
+            for line in body.decode().splitlines()
+            if line.startswith("data: ")
+        ]
+
+    def save_orders(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            mine = Order.objects.create(user=self.customer, total=0, date=date.today())
+            Order.objects.create(
+                user=self.manager, delivery_crew=self.crew, total=0, date=date.today()
+            )
+            with transaction.atomic():
+                Order.objects.create(user=self.customer, total=1, date=date.today())
+                transaction.set_rollback(True)
+        mine.status = True
+        with self.captureOnCommitCallbacks(execute=True):
+            mine.save()
+        return mine
+
+    async def test_changes_fan_out_to_the_users_who_may_see_them(self):
+        streams = {
+            "customer": await self.open(self.customer),
+            "crew": await self.open(self.crew),
+            "manager": await self.open(self.manager),
+        }
+        self.assertEqual(len(events.broker), 3)
+        mine = await sync_to_async(self.save_orders)()
+        received = {name: await self.read(stream) for name, stream in streams.items()}
+        self.assertEqual(
+            received["customer"],
+            [
+                {
+                    "id": mine.pk,
+                    "user": self.customer.pk,
+                    "delivery_crew": None,
+                    "status": False,
+                },
+                {
+                    "id": mine.pk,
+                    "user": self.customer.pk,
+                    "delivery_crew": None,
+                    "status": True,
+                },
+            ],
+        )
+        self.assertEqual(
+            [event["delivery_crew"] for event in received["crew"]], [self.crew.pk]
+        )
+        # the rolled back order is not among them
+        self.assertEqual(len(received["manager"]), 3)
+        # streams end after ORDER_EVENTS_TIMEOUT and unsubscribe
+        self.assertEqual(len(events.broker), 0)
+
+    async def test_single_order_starts_with_its_state(self):
+        order = await Order.objects.acreate(
+            user=self.customer, total=0, date=date.today()
+        )
+        response = await self.open(self.customer, f"?order={order.pk}")
+        await sync_to_async(self.save_orders)()
+        received = await self.read(response)
+        self.assertEqual([event["id"] for event in received], [order.pk])
+        self.assertFalse(received[0]["status"])
+
+    async def test_heartbeats(self):
+        response = await self.open(self.customer)
+        body = b"".join([chunk async for chunk in response.streaming_content])
+        self.assertTrue(body.startswith(b"retry: "))
+        self.assertIn(b": keep-alive\n\n", body)
+
+    async def test_authorization(self):
+        order = await Order.objects.acreate(
+            user=self.manager, total=0, date=date.today()
+        )
+        self.assertEqual((await self.open()).status_code, 401)
+        response = await self.open(self.customer, f"?order={order.pk}")
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual((await self.open(self.customer, "?order=0")).status_code, 404)
+        self.assertEqual((await self.open(self.customer, "?order=x")).status_code, 400)
+        self.assertEqual(len(events.broker), 0)
+
+
+class TokenCacheTests(LittleLemonTestCase):
+    def setUp(self):
+        super().setUp()
+        token_cache.stats.clear()
+
+    def client_with_token(self, user):
+        client = APIClient()
+        token = Token.objects.create(user=user)
+        client.credentials(HTTP_AUTHORIZATION=f"Token {token.key}")
+        return client
+
+    def test_repeat_requests_skip_token_and_role_queries(self):
+        self.make_orders(1)
+        client = self.client_with_token(self.customer)
+        # token and user, groups, orders with users, order items
+        with self.assertNumQueries(4):
+            first = client.get("/api/orders")
+        with self.assertNumQueries(2):
+            second = client.get("/api/orders")
+        self.assertEqual(first.content, second.content)
+        self.assertEqual(token_cache.stats["hits"], 1)
+
+    def test_djoser_logout_forgets_the_token(self):
+        client = self.client_with_token(self.customer)
+        self.assertEqual(client.get("/api/orders").status_code, 200)
+        self.assertEqual(client.post("/token/logout/").status_code, 204)
+        self.assertEqual(client.get("/api/orders").status_code, 401)
+
+    def test_deactivated_users_are_rejected(self):
+        client = self.client_with_token(self.customer)
+        self.assertEqual(client.get("/api/orders").status_code, 200)
+        self.customer.is_active = False
+        self.customer.save()
+        self.assertEqual(client.get("/api/orders").status_code, 401)
+
+    def test_membership_changes_apply(self):
+        client = self.client_with_token(self.customer)
+        self.assertEqual(client.get("/api/analytics").status_code, 403)
+        self.customer.groups.add(self.manager_group)
+        self.assertEqual(client.get("/api/analytics").status_code, 200)
+        self.manager_group.user_set.clear()
+        self.assertEqual(client.get("/api/analytics").status_code, 403)
+
+    def test_bounded_lru_with_ttl(self):
+        cache = TokenCache(maxsize=2, ttl=60)
+        for key in "abc":
+            cache.set(key, ((1,), frozenset()), cache.generation())
+        self.assertEqual(len(cache), 2)
+        self.assertIsNone(cache.get("a"))
+        # b is now the most recently used, so c goes first
+        self.assertIsNotNone(cache.get("b"))
+        cache.set("d", ((2,), frozenset()), cache.generation())
+        self.assertIsNone(cache.get("c"))
+        cache.forget_users(2)
+        self.assertIsNone(cache.get("d"))
+        cache.ttl = 0
+        cache.set("e", ((3,), frozenset()), cache.generation())
+        self.assertIsNone(cache.get("e"))
+
+    def test_lookups_racing_an_invalidation_are_not_stored(self):
+        cache = TokenCache(maxsize=2, ttl=60)
+        generation = cache.generation()
+        cache.forget("a")
+        cache.set("a", ((1,), frozenset()), generation)
+        self.assertIsNone(cache.get("a"))
+
+
+@override_settings(AUTO_ASSIGN_DELIVERY_CREW=True)
+class TaskQueueTests(LittleLemonTestCase):
+    def checkout(self):
+        Cart.objects.create(
+            user=self.customer,
+            menuitem=self.menuitems[0],
+            quantity=1,
+            unit_price=5,
+            price=5,
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client_for(self.customer).post("/api/orders")
+        return Order.objects.get(pk=response.data["id"])
+
+    def test_checkout_queues_assignment_for_the_worker(self):
+        order = self.checkout()
+        # nothing is assigned in the request itself
+        self.assertIsNone(order.delivery_crew)
+        self.assertEqual(Job.objects.get().kwargs, {"order_id": order.pk})
+        self.assertEqual(tasks.run_pending(), (1, 0))
+        order.refresh_from_db()
+        self.assertEqual(order.delivery_crew, self.crew)
+        self.assertFalse(Job.objects.exists())
+        self.assertEqual(
+            DailyCrewDeliveries.objects.get(delivery_crew=self.crew).assigned, 1
+        )
+
+    def test_checkout_queues_nothing_unless_turned_on(self):
+        with self.settings(AUTO_ASSIGN_DELIVERY_CREW=False):
+            order = self.checkout()
+        self.assertIsNone(order.delivery_crew)
+        self.assertFalse(Job.objects.exists())
+
+    def test_assigns_the_crew_member_with_fewest_open_orders(self):
+        busy = self.crew
+        idle = User.objects.create_user("idle", password="pw")
+        idle.groups.add(self.crew_group)
+        self.make_orders(2, delivery_crew=busy)
+        # delivered orders are not open
+        self.make_orders(3, delivery_crew=idle, status=True)
+        order = self.checkout()
+        tasks.run_pending()
+        order.refresh_from_db()
+        self.assertEqual(order.delivery_crew, idle)
+
+    def test_rolled_back_checkout_queues_nothing(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            with transaction.atomic():
+                tasks.enqueue("assign_delivery_crew", order_id=1)
+                transaction.set_rollback(True)
+        self.assertFalse(Job.objects.exists())
+
+    def test_failed_jobs_are_retried_with_backoff(self):
+        calls = []
+
+        @tasks.task(max_attempts=2)
+        def flaky():
+            calls.append(1)
+            Category.objects.create(slug="ghost", title="Ghost")
+            raise RuntimeError("kitchen printer offline")
+
+        self.addCleanup(tasks.TASKS.pop, "flaky")
+        with self.captureOnCommitCallbacks(execute=True):
+            tasks.enqueue("flaky")
+        with self.assertLogs("LittleLemonAPI.tasks", "WARNING"):
+            self.assertEqual(tasks.run_pending(), (1, 1))
+        job = Job.objects.get()
+        self.assertEqual((job.status, job.attempts), (Job.QUEUED, 1))
+        self.assertIn("kitchen printer offline", job.last_error)
+        self.assertAlmostEqual(
+            (job.run_at - timezone.now()).total_seconds(), tasks.retry_delay(1), 0
+        )
+        # the failed attempt's writes were rolled back
+        self.assertFalse(Category.objects.filter(slug="ghost").exists())
+        # not due yet
+        self.assertEqual(tasks.run_pending(), (0, 0))
+        Job.objects.update(run_at=timezone.now())
+        with self.assertLogs("LittleLemonAPI.tasks", "ERROR"):
+            call_command("run_tasks", "--once", stdout=StringIO())
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts, len(calls)), (Job.FAILED, 2, 2))
+        self.assertEqual(tasks.retry_delay(20), tasks.MAX_RETRY_DELAY)
+
+    def test_claimed_jobs_are_leased(self):
+        self.checkout()
+        self.assertEqual(len(tasks.claim(10)), 1)
+        # taken until the lease runs out, e.g. because its worker died
+        self.assertEqual(tasks.claim(10), [])
+        Job.objects.update(run_at=timezone.now())
+        self.assertEqual(tasks.claim(10)[0].attempts, 2)
+
+
+class MenuImportTests(LittleLemonTestCase):
+    def test_creates_and_updates_in_bulk(self):
+        cheap, dear = self.menuitems[:2]
+        Cart.objects.create(
+            user=self.customer, menuitem=cheap, quantity=2, unit_price=5, price=10
+        )
+        CartSummary.objects.create(user=self.customer, item_count=2, subtotal=10)
+        rows = [
+            {"title": "Soup", "price": "4.50", "category": "Mains"},
+            {"id": cheap.pk, "price": "6.00"},
+            {"id": dear.pk, "title": "Stew", "featured": False},
+            {"title": "Salad", "price": "3", "category_id": self.category.pk},
+        ]
+        before = dear.updated_at
+        # roles, existing items, categories, an insert, an update, the cart
+        # reprice (stale owners, update, summary insert and update) and the
+        # savepoint
+        with self.captureOnCommitCallbacks() as callbacks:
+            with self.assertNumQueries(11):
+                response = self.client_for(self.manager).post(
+                    "/api/menu-items/bulk", rows, format="json"
+                )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.data["created"], response.data["updated"]), (2, 2))
+        self.assertEqual(
+            [(row["row"], row["status"]) for row in response.data["rows"]],
+            [(1, "created"), (2, "updated"), (3, "updated"), (4, "created")],
+        )
+        soup = MenuItem.objects.get(pk=response.data["rows"][0]["id"])
+        self.assertEqual((soup.title, soup.price), ("Soup", Decimal("4.50")))
+        self.assertTrue(soup.featured)
+        dear.refresh_from_db()
+        self.assertEqual((dear.title, dear.featured), ("Stew", False))
+        self.assertEqual(dear.price, Decimal("6.00"))
+        self.assertGreater(dear.updated_at, before)
+        self.assertEqual(MenuItem.objects.get(pk=cheap.pk).price, Decimal("6.00"))
+        self.assertEqual(Cart.objects.get(user=self.customer).price, Decimal("12.00"))
+        self.assertEqual(
+            CartSummary.objects.get(user=self.customer).subtotal, Decimal("12.00")
+        )
+        # one catalogue version bump for the whole import
+        self.assertEqual(callbacks, [catalogue_cache.bump])
+
+    def test_invalid_rows_write_nothing(self):
+        Category.objects.create(slug="mains-2", title="Mains")
+        rows = [
+            {"id": self.menuitems[0].pk, "price": "1.00"},
+            {"id": 999, "price": "1.00"},
+            {"title": "Soup", "price": "-1", "category_id": self.category.pk},
+            {"title": "Soup", "price": "1.00", "category": "Mains"},
+            {"title": "Soup"},
+            {"id": self.menuitems[0].pk, "title": "Twice"},
+        ]
+        response = self.client_for(self.manager).post(
+            "/api/menu-items/bulk", rows, format="json"
+        )
+        self.assertEqual(response.status_code, 400)
+        errors = [row.get("errors", {}) for row in response.data["rows"]]
+        self.assertEqual(errors[0], {})
+        self.assertIn("does not exist", str(errors[1]["id"]))
+        self.assertIn("price", errors[2])
+        self.assertIn("More than one", str(errors[3]["category"]))
+        self.assertEqual(set(errors[4]), {"price", "category_id"})
+        self.assertIn("more than once", str(errors[5]["id"]))
+        self.assertEqual(MenuItem.objects.count(), 3)
+        self.assertEqual(self.menuitems[0].price, MenuItem.objects.first().price)
+
+    def test_export_csv_round_trips(self):
+        manager = self.client_for(self.manager)
+        body = b"".join(
+            manager.get("/api/menu-items/export?format=csv").streaming_content
+        )
+        edited = body.decode().replace("5.00", "7.25").encode()
+        response = manager.post("/api/menu-items/bulk", edited, content_type="text/csv")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["updated"], 3)
+        self.assertEqual(
+            list(MenuItem.objects.order_by("id").values_list("price", flat=True)),
+            [Decimal("7.25"), Decimal("6.00"), Decimal("7.00")],
+        )
+
+    def test_managers_only(self):
+        response = self.client_for(self.customer).post(
+            "/api/menu-items/bulk", [{"id": 1, "price": "1"}], format="json"
+        )
+        self.assertEqual(response.status_code, 403)
+
+    def test_command(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = Path(directory, "menu.csv")
+            path.write_text(
+                f"id,price,title,category\n{self.menuitems[1].pk},9.50,,\n"
+                ",2.00,Bread,Mains\n"
+            )
+            out = StringIO()
+            call_command("import_menu", str(path), "--dry-run", stdout=out)
+            self.assertIn("All 2 menu items are valid.", out.getvalue())
+            self.assertEqual(MenuItem.objects.count(), 3)
+            call_command("import_menu", str(path), stdout=out)
+        self.assertIn("row 2: created", out.getvalue())
+        self.assertEqual(MenuItem.objects.get(title="Bread").price, Decimal("2.00"))
+        self.assertEqual(
+            MenuItem.objects.get(pk=self.menuitems[1].pk).price, Decimal("9.50")
+        )
+
+
+class CompressionTests(LittleLemonTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        MenuItem.objects.bulk_create(
+            MenuItem(
+                title=f"Bulk dish {i}", price=Decimal("9.50"), category=cls.category
+            )
+            for i in range(50)
+        )
+
+    def test_large_responses_are_gzipped(self):
+        client = self.client_for(self.customer)
+        plain = client.get("/api/menu-items?perpage=50")
+        response = client.get("/api/menu-items?perpage=50", HTTP_ACCEPT_ENCODING="gzip")
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertIn("Accept-Encoding", response["Vary"])
+        self.assertEqual(gzip.decompress(response.content), plain.content)
+        self.assertLess(len(response.content), len(plain.content) / 4)
+        self.assertEqual(int(response["Content-Length"]), len(response.content))
+        # weakened, and still good for conditional requests
+        self.assertEqual(response["ETag"], f"W/{plain['ETag']}")
+        revalidated = client.get(
+            "/api/menu-items?perpage=50",
+            HTTP_ACCEPT_ENCODING="gzip",
+            HTTP_IF_NONE_MATCH=response["ETag"],
+        )
+        self.assertEqual(revalidated.status_code, 304)
+        self.assertEqual(revalidated["ETag"], response["ETag"])
+
+    def test_etags_agree_whatever_the_body_size(self):
+        client = self.client_for(self.customer)
+        small = client.get("/api/menu-items?perpage=2", HTTP_ACCEPT_ENCODING="gzip")
+        self.assertFalse(small.has_header("Content-Encoding"))
+        self.assertTrue(small["ETag"].startswith("W/"))
+        self.assertIn("Accept-Encoding", small["Vary"])
+        plain = client.get("/api/menu-items?perpage=2")
+        self.assertEqual(small["ETag"], f"W/{plain['ETag']}")
+
+    def test_small_or_unwanted_compression_is_skipped(self):
+        client = self.client_for(self.customer)
+        small = client.get("/api/menu-items?perpage=2", HTTP_ACCEPT_ENCODING="gzip")
+        self.assertFalse(small.has_header("Content-Encoding"))
+        refused = client.get(
+            "/api/menu-items?perpage=50", HTTP_ACCEPT_ENCODING="gzip;q=0, identity"
+        )
+        self.assertFalse(refused.has_header("Content-Encoding"))
+
+    def test_streamed_exports_are_compressed(self):
+        client = self.client_for(self.manager)
+        response = client.get(
+            "/api/menu-items/export?format=csv", HTTP_ACCEPT_ENCODING="gzip, br"
+        )
+        self.assertEqual(response["Content-Encoding"], "br" if brotli else "gzip")
+        if brotli is None:
+            body = gzip.decompress(b"".join(response.streaming_content))
+            self.assertEqual(body.decode().count("\n"), 1 + 53)
+
+    def test_messagepack(self):
+        self.assertEqual(
+            MessagePackRenderer().render(
+                {"id": 1, "price": "5.00", "ok": True, "none": None, "list": [-1, 300]}
+            ),
+            b"\x85\xa2id\x01\xa5price\xa45.00\xa2ok\xc3\xa4none\xc0"
+            b"\xa4list\x92\xff\xcd\x01\x2c",
+        )
+        self.assertEqual(
+            MessagePackRenderer().render([date(2024, 1, 2), -200, 2**40, 1.5]),
+            b"\x94\xaa2024-01-02\xd1\xff\x38\xcf\x00\x00\x01\x00\x00\x00\x00\x00"
+            b"\xcb\x3f\xf8\x00\x00\x00\x00\x00\x00",
+        )
+        response = self.client_for(self.customer).get(
+            "/api/menu-items?perpage=20", HTTP_ACCEPT="application/msgpack"
+        )
+        self.assertEqual(response["Content-Type"], "application/msgpack")
+        as_json = self.client_for(self.customer).get("/api/menu-items?perpage=20")
+        self.assertEqual(msgpack.unpackb(response.content), as_json.json())
+
+
+class CatalogueCacheTests(LittleLemonTestCase):
+    def setUp(self):
+        super().setUp()
+        catalogue_cache.stats.clear()
+
+    def test_repeat_reads_are_served_from_cache(self):
+        client = self.client_for(self.customer)
+        first = client.get("/api/menu-items?perpage=5")
+        # only the ETag fingerprint
+        with self.assertNumQueries(1):
+            second = client.get("/api/menu-items?perpage=5&page=1")
+        self.assertEqual(first.content, second.content)
+        self.assertEqual(catalogue_cache.stats["hits"], 1)
+        self.assertEqual(catalogue_cache.stats["misses"], 1)
+
+    def test_single_item_is_cached(self):
+        client = self.client_for(self.customer)
+        url = f"/api/menu-items/{self.menuitems[0].id}"
+        first = client.get(url)
+        with self.assertNumQueries(1):
+            self.assertEqual(client.get(url).content, first.content)
+
+    def test_writes_invalidate_cached_pages(self):
+        client = self.client_for(self.manager)
+        client.get("/api/menu-items?perpage=5")
+        with self.captureOnCommitCallbacks(execute=True):
+            client.patch(
+                f"/api/menu-items/{self.menuitems[0].id}", {"title": "Renamed"}
+            )
+        response = client.get("/api/menu-items?perpage=5")
+        self.assertEqual(response.data[0]["title"], "Renamed")
+        with self.captureOnCommitCallbacks(execute=True):
+            self.category.save()
+        self.assertEqual(client.get("/api/menu-items?perpage=5").status_code, 200)
+        self.assertEqual(catalogue_cache.stats["hits"], 0)
+
+    def test_formats_are_cached_separately(self):
+        client = self.client_for(self.customer)
+        client.get("/api/menu-items", HTTP_ACCEPT="application/json")
+        response = client.get("/api/menu-items", HTTP_ACCEPT="application/xml")
+        self.assertTrue(response.content.startswith(b"<?xml"))
+
+
+class ConditionalGetTests(LittleLemonTestCase):
+    def assert_revalidates(self, url, queries):
+        client = self.client_for(self.customer)
+        first = client.get(url)
+        self.assertEqual(first.status_code, 200)
+        with self.assertNumQueries(queries):
+            second = client.get(url, HTTP_IF_NONE_MATCH=first["ETag"])
+        self.assertEqual(second.status_code, 304)
+        self.assertEqual(second["ETag"], first["ETag"])
+        self.assertEqual(second.content, b"")
+        return first["ETag"]
+
+    def test_menu_items(self):
+        etag = self.assert_revalidates("/api/menu-items", 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            MenuItem.objects.create(
+                title="New", price=Decimal("1.00"), category=self.category
+            )
+        response = self.client_for(self.customer).get(
+            "/api/menu-items", HTTP_IF_NONE_MATCH=etag
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+
+    def test_single_item_changes_with_its_category(self):
+        url = f"/api/menu-items/{self.menuitems[0].id}"
+        etag = self.assert_revalidates(url, 1)
+        self.category.title = "Renamed"
+        self.category.save()
+        response = self.client_for(self.customer).get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["category"]["title"], "Renamed")
+
+    def test_category_detail(self):
+        self.assert_revalidates(f"/api/category/{self.category.id}", 1)
+
+    def test_etag_differs_per_media_type(self):
+        client = self.client_for(self.customer)
+        as_json = client.get("/api/category/%d" % self.category.id)
+        as_xml = client.get(
+            "/api/category/%d" % self.category.id, HTTP_ACCEPT="application/xml"
+        )
+        self.assertNotEqual(as_json["ETag"], as_xml["ETag"])
+
+    def test_missing_item_is_still_404(self):
+        response = self.client_for(self.customer).get("/api/menu-items/999")
+        self.assertEqual(response.status_code, 404)
+
+    def test_missing_rows_match_no_etag(self):
+        client = self.client_for(self.customer)
+        for url in ("/api/menu-items/999", "/api/category/999"):
+            response = client.get(url, HTTP_IF_NONE_MATCH="*")
+            self.assertEqual(response.status_code, 404, url)
+            self.assertNotIn("ETag", response)
+
+
+class RoleResolutionTests(LittleLemonTestCase):
+    def group_queries(self, queries):
+        return [q for q in queries if '"auth_group"' in q["sql"]]
+
+    def test_one_group_query_per_request(self):
+        self.make_orders(1)
+        order = Order.objects.get()
+        client = self.client_for(User.objects.get(pk=self.manager.pk))
+        # including the transaction and the two rollup upserts
+        with self.assertNumQueries(11) as queries:
+            response = client.patch(
+                f"/api/orders/{order.id}", {"delivery_crew": "crew", "status": 1}
+            )
+        self.assertEqual(response.status_code, 200)
+        # one for the manager, one for the crew member being assigned
+        self.assertEqual(len(self.group_queries(queries.captured_queries)), 2)
+
+    def test_roles_are_memoized_and_forgotten_on_change(self):
+        user = User.objects.get(pk=self.customer.pk)
+        self.assertFalse(is_manager(user))
+        with self.assertNumQueries(0):
+            self.assertEqual(get_roles(user), frozenset())
+        user.groups.add(self.manager_group)
+        self.assertTrue(is_manager(user))
+
+    @override_settings(ROLE_CACHE="default")
+    def test_cross_request_cache_is_invalidated(self):
+        caches["default"].clear()
+        crew = User.objects.get(pk=self.crew.pk)
+        self.assertEqual(get_roles(crew), {"Delivery crew"})
+        crew = User.objects.get(pk=self.crew.pk)
+        with self.assertNumQueries(0):
+            self.assertEqual(get_roles(crew), {"Delivery crew"})
+        self.manager_group.user_set.add(self.crew)
+        self.assertTrue(is_manager(User.objects.get(pk=self.crew.pk)))
+        self.manager_group.user_set.clear()
+        self.assertFalse(is_manager(User.objects.get(pk=self.crew.pk)))
+
+
+class FastSerializerTests(LittleLemonTestCase):
+    def assert_same_bytes(self, user, url, **headers):
+        slow = self.client_for(user).get(url, **headers)
+        caches[catalogue_cache.alias].clear()
+        with override_settings(FAST_SERIALIZERS=True):
+            fast = self.client_for(user).get(url, **headers)
+        self.assertEqual(slow.status_code, 200)
+        self.assertEqual(slow.content, fast.content)
+
+    def test_menu_items(self):
+        url = "/api/menu-items?perpage=10"
+        self.assert_same_bytes(self.customer, url)
+        self.assert_same_bytes(self.customer, url, HTTP_ACCEPT="application/xml")
+
+    def test_orders(self):
+        self.make_orders(3)
+        self.make_orders(2, date=date.today() - timedelta(days=3))
+        self.assert_same_bytes(self.manager, "/api/orders")
+        self.assert_same_bytes(self.manager, "/api/orders?perpage=2&status=0")
+
+
+class SparseFieldsetTests(LittleLemonTestCase):
+    def get(self, user, url, queries=None):
+        """The response data and the SQL of the query that loaded it."""
+        # a fresh user object, as authentication would load per request
+        client = self.client_for(User.objects.get(pk=user.pk))
+        with CaptureQueriesContext(connection) as captured:
+            response = client.get(url)
+        self.assertEqual(response.status_code, 200, response.content)
+        if queries is not None:
+            self.assertEqual(len(captured), queries)
+        return response.json(), captured[-1]["sql"]
+
+    def test_menu_item_fields(self):
+        item = self.menuitems[0]
+        data, sql = self.get(
+            self.customer, f"/api/menu-items/{item.id}?fields=id,title"
+        )
+        self.assertEqual(data, {"id": item.id, "title": "Dish 0"})
+        self.assertNotIn('"LittleLemonAPI_category"', sql)
+        self.assertNotIn('"price"', sql)
+        data, _ = self.get(self.customer, "/api/menu-items?fields=price_after_tax")
+        self.assertEqual(list(data[0]), ["price_after_tax"])
+
+    def test_unexpanded_category_is_its_id(self):
+        # the ETag's, the count and the page
+        data, sql = self.get(self.customer, "/api/menu-items?expand=", queries=3)
+        self.assertEqual(data[0]["category"], self.category.id)
+        self.assertNotIn('"LittleLemonAPI_category"', sql)
+        data, sql = self.get(self.customer, "/api/menu-items?expand=category")
+        self.assertEqual(data[0]["category"]["slug"], "mains")
+        self.assertIn('"LittleLemonAPI_category"', sql)
+
+    def test_defaults_unchanged(self):
+        default, _ = self.get(self.customer, "/api/menu-items")
+        everything, _ = self.get(
+            self.customer,
+            "/api/menu-items?fields=id,title,price,featured,price_after_tax,category"
+            "&expand=category",
+        )
+        self.assertEqual(everything, default)
+
+    def test_order_fields(self):
+        self.make_orders(3)
+        # roles and orders: no users joined, no order items prefetched
+        data, sql = self.get(
+            self.customer, "/api/orders?fields=id,user,total&expand=", queries=2
+        )
+        self.assertEqual(list(data[0]), ["id", "user", "total"])
+        self.assertEqual(data[0]["user"], self.customer.id)
+        self.assertNotIn('"auth_user"', sql)
+        data, sql = self.get(self.customer, "/api/orders?expand=orderitems", queries=3)
+        self.assertIn('"LittleLemonAPI_orderitem"', sql)
+        self.assertEqual(data[0]["user"], self.customer.id)
+        self.assertEqual(len(data[0]["orderitems"]), 3)
+        data, _ = self.get(self.customer, "/api/orders?expand=user")
+        self.assertNotIn("orderitems", data[0])
+        self.assertEqual(data[0]["user"]["username"], "customer")
+
+    def test_order_detail(self):
+        self.make_orders(1)
+        order = Order.objects.get()
+        url = f"/api/orders/{order.id}?fields=id,status"
+        data, _ = self.get(self.customer, url, queries=1)
+        self.assertEqual(data, {"id": order.id, "status": False})
+        response = self.client_for(self.crew).get(url)
+        self.assertEqual(response.status_code, 403)
+
+    def test_blank_fields_mean_every_field(self):
+        default, _ = self.get(self.customer, "/api/menu-items")
+        for blank in ("", "%20", ",", "%20,%20"):
+            data, _ = self.get(self.customer, f"/api/menu-items?fields={blank}")
+            self.assertEqual(data, default, blank)
+
+    def test_unknown_names(self):
+        client = self.client_for(self.customer)
+        response = client.get("/api/menu-items?fields=id,secret")
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("secret", response.data["fields"][0])
+        response = client.get("/api/orders?expand=status")
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("expand", response.data)
+
+    def test_cached_per_fieldset(self):
+        client = self.client_for(self.customer)
+        full = client.get("/api/menu-items").json()
+        flat = client.get("/api/menu-items?expand=").json()
+        self.assertIsInstance(full[0]["category"], dict)
+        self.assertEqual(flat[0]["category"], self.category.id)
+        self.assertEqual(client.get("/api/menu-items?expand").json(), flat)
+
+    def test_fast_serializers_cover_the_default_only(self):
+        self.make_orders(2)
+        with override_settings(FAST_SERIALIZERS=True):
+            data, _ = self.get(self.customer, "/api/orders?fields=id")
+        self.assertEqual(list(data[0]), ["id"])
+
+
+class MenuSearchTests(LittleLemonTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        desserts = Category.objects.create(slug="desserts", title="Desserts")
+        for title, category in (
+            ("Spaghetti Carbonara", cls.category),
+            ("Penne Arrabbiata", cls.category),
+            ("Lemon Tart", desserts),
+            ("Lemon Sorbet", desserts),
+        ):
+            MenuItem.objects.create(
+                title=title, price=Decimal("9.00"), category=category
+            )
+
+    def search(self, term, **params):
+        response = self.client_for(self.customer).get(
+            "/api/menu-items", {"search": term, "perpage": 20, **params}
+        )
+        self.assertEqual(response.status_code, 200)
+        return [item["title"] for item in response.data]
+
+    def test_case_insensitive_substring_and_prefix(self):
+        self.assertEqual(self.search("CARBON"), ["Spaghetti Carbonara"])
+        self.assertEqual(self.search("spag"), ["Spaghetti Carbonara"])
+
+    def test_typo_tolerant_with_best_match_first(self):
+        self.assertEqual(self.search("spagheti")[0], "Spaghetti Carbonara")
+        self.assertEqual(self.search("arabiata")[0], "Penne Arrabbiata")
+
+    def test_matches_category_title(self):
+        self.assertEqual(set(self.search("dessert")), {"Lemon Tart", "Lemon Sorbet"})
+
+    def test_explicit_ordering_wins_over_rank(self):
+        self.assertEqual(
+            self.search("lemon", ordering="-title"), ["Lemon Tart", "Lemon Sorbet"]
+        )
+
+    def test_index_follows_updates_and_deletes(self):
+        tart = MenuItem.objects.get(title="Lemon Tart")
+        tart.title = "Lime Tart"
+        tart.save()
+        MenuItem.objects.filter(title="Lemon Sorbet").delete()
+        Category.objects.filter(title="Desserts").update(title="Sweets")
+        self.assertEqual(self.search("lemon"), [])
+        self.assertEqual(self.search("sweets"), ["Lime Tart"])
+
+    def test_rebuild(self):
+        self.assertEqual(rebuild_index(), MenuItem.objects.count())
+        self.assertEqual(self.search("sorbet"), ["Lemon Sorbet"])
+
+    def test_short_terms_fall_back_to_substring(self):
+        self.assertEqual(self.search("ti"), ["Spaghetti Carbonara"])
+
+    def test_quotes_are_searched_for_literally(self):
+        for term in ('pasta"', 'ab"c', '"', 'tart" OR "x'):
+            self.assertEqual(self.search(term), [], term)
+        MenuItem.objects.create(
+            title='The "Special"', price=Decimal("9.00"), category=self.category
+        )
+        self.assertEqual(self.search('"special"'), ['The "Special"'])
+
+    def test_short_words_still_narrow_longer_ones(self):
+        for i in range(12):
+            MenuItem.objects.create(
+                title=f"Soup {i}", price=Decimal("4.00"), category=self.category
+            )
+        self.assertEqual(
+            self.search("Soup 1", ordering="title"), ["Soup 1", "Soup 10", "Soup 11"]
+        )
+        self.assertEqual(self.search("ta lemon"), ["Lemon Tart"])
+        self.assertEqual(self.search("ta lemnon"), ["Lemon Tart"])
+
+
+class MenuFilterTests(LittleLemonTestCase):
+    def get(self, **params):
+        return self.client_for(self.customer).get("/api/menu-items", params)
+
+    def page_query_plan(self, **params):
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.get(**params).status_code, 200)
+        (sql,) = [q["sql"] for q in queries if "LIMIT" in q["sql"]]
+        with connection.cursor() as cursor:
+            cursor.execute(f"EXPLAIN QUERY PLAN {sql}")
+            return [row[-1] for row in cursor.fetchall()]
+
+    def test_whitelisted_orderings_never_sort_the_table(self):
+        for ordering in ("id", "-id", "price", "-price", "title", "-title"):
+            with self.subTest(ordering=ordering):
+                plan = self.page_query_plan(ordering=ordering)
+                self.assertFalse([step for step in plan if "TEMP B-TREE" in step])
+
+    def test_filters_use_indexes(self):
+        plan = self.page_query_plan(category="Mains", to_price="6")
+        self.assertIn("menuitem_category_price_idx", " ".join(plan))
+        plan = self.page_query_plan(featured="1", to_price="6", ordering="price")
+        self.assertFalse([step for step in plan if step.startswith("SCAN")])
+
+    def test_ordering_outside_whitelist_is_rejected(self):
+        self.assertEqual(self.get(ordering="category__slug").status_code, 400)
+        self.assertEqual(self.get(ordering="price,title").status_code, 400)
+
+    def test_parameters_are_validated(self):
+        self.assertEqual(self.get(to_price="cheap").status_code, 400)
+        self.assertEqual(self.get(page="first").status_code, 400)
+        self.assertEqual(self.get(perpage="0").status_code, 400)
+        self.assertEqual(self.get(page="99999999999999999999").status_code, 400)
+        self.assertEqual(self.get(page="10000").status_code, 200)
+        self.assertEqual(self.get(category="").status_code, 200)
+
+    def test_perpage_is_capped(self):
+        MenuItem.objects.bulk_create(
+            MenuItem(title=f"Extra {i}", price=Decimal("1.00"), category=self.category)
+            for i in range(120)
+        )
+        self.assertEqual(len(self.get(perpage=1_000_000).data), 100)
+
+    def test_filters_and_ordering(self):
+        self.menuitems[0].featured = False
+        self.menuitems[0].save()
+        titles = [
+            item["title"] for item in self.get(featured="1", ordering="-price").data
+        ]
+        self.assertEqual(titles, ["Dish 2", "Dish 1"])
+
+
+class RequestMetricsTests(LittleLemonTestCase):
+    def setUp(self):
+        super().setUp()
+        registry.reset()
+
+    def test_server_timing_header(self):
+        response = self.client_for(self.customer).get("/api/menu-items")
+        timing = response["Server-Timing"]
+        for name in ("db;dur=", "app;dur=", "render;dur=", "total;dur="):
+            self.assertIn(name, timing)
+        self.assertIn('queries;desc="3"', timing)
+
+    def test_metrics_are_aggregated_per_route(self):
+        client = self.client_for(self.customer)
+        for item in self.menuitems:
+            client.get(f"/api/menu-items/{item.id}")
+        response = self.client_for(self.manager).get("/api/metrics")
+        self.assertEqual(response.status_code, 200)
+        stats = response.data["routes"]["GET api/menu-items/<int:id>"]
+        self.assertEqual(stats["count"], 3)
+        self.assertEqual(sum(stats["latency_ms"]["buckets"].values()), 3)
+        self.assertEqual(stats["queries_sum"], 6)
+
+    def test_metrics_are_manager_only(self):
+        response = self.client_for(self.customer).get("/api/metrics")
+        self.assertEqual(response.status_code, 403)
+
+    def test_repeated_query_shapes_are_flagged(self):
+        collector = RequestCollector()
+
+        def execute(sql, params, many, context):
+            return None
+
+        for pk in range(3):
+            collector.record_query(
+                execute, 'SELECT * FROM "menuitem" WHERE "id" = %s', [pk], False, {}
+            )
+        collector.record_query(
+            execute, 'SELECT * FROM "cart" WHERE "id" IN (%s, %s)', [1, 2], False, {}
+        )
+        collector.record_query(
+            execute, 'SELECT * FROM "cart" WHERE "id" IN (%s)', [1], False, {}
+        )
+        self.assertEqual(
+            collector.duplicates(3), {'SELECT * FROM "menuitem" WHERE "id" = %s': 3}
+        )
+        self.assertEqual(
+            collector.duplicates(2)['SELECT * FROM "cart" WHERE "id" IN (...)'], 2
+        )
+
+
+@override_settings(ROOT_URLCONF="LittleLemon.asgi_urls")
+class AsyncViewTests(LittleLemonTestCase):
+    HEADERS = ("Content-Type", "ETag", "Allow", "Vary", "Link", "WWW-Authenticate")
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.tokens = {
+            user: Token.objects.create(user=user).key
+            for user in (cls.manager, cls.crew, cls.customer)
+        }
+
+    def headers_for(self, user, **headers):
+        if user is not None:
+            headers["Authorization"] = f"Token {self.tokens[user]}"
+        return headers
+
+    async def assert_same_response(self, url, user=None, **headers):
+        """The async view answers exactly as the sync one at the same URL."""
+        headers = self.headers_for(user, **headers)
+        with override_settings(ROOT_URLCONF="LittleLemon.urls"):
+            expected = await self.async_client_get(url, headers)
+        await catalogue_cache.backend.aclear()
+        response = await self.async_client.get(url, headers=headers)
+        self.assertEqual(response.status_code, expected.status_code)
+        self.assertEqual(response.content, expected.content)
+        for header in self.HEADERS:
+            self.assertEqual(response.get(header), expected.get(header), header)
+        return response
+
+    def queries(self, response):
+        # counted by RequestMetricsMiddleware, in whichever thread ran them
+        return int(re.search(r'queries;desc="(\d+)"', response["Server-Timing"])[1])
+
+    async def async_client_get(self, url, headers):
+        # the same client and URL, resolved to the sync view
+        return await self.async_client.get(url, headers=headers)
+
+    def test_read_paths_resolve_to_coroutines(self):
+        for url in ("/api/menu-items", "/api/menu-items/1", "/api/category/1"):
+            self.assertTrue(iscoroutinefunction(resolve(url).func), url)
+        self.assertTrue(iscoroutinefunction(resolve("/api/orders").func))
+        self.assertFalse(iscoroutinefunction(resolve("/api/orders/1").func))
+
+    async def test_menu(self):
+        await self.assert_same_response("/api/menu-items")
+        await self.assert_same_response("/api/menu-items?perpage=2&page=2")
+        await self.assert_same_response("/api/menu-items?page=9")
+        await self.assert_same_response("/api/menu-items?page=10000&perpage=100")
+        await self.assert_same_response("/api/menu-items?page=99999999999999999999")
+        await self.assert_same_response("/api/menu-items?search=dish&ordering=-price")
+        await self.assert_same_response("/api/menu-items?search=dish%22")
+        await self.assert_same_response("/api/menu-items?perpage=0")
+        await self.assert_same_response(f"/api/menu-items/{self.menuitems[0].id}")
+        await self.assert_same_response(
+            f"/api/menu-items/{self.menuitems[0].id}?fields=id,category&expand="
+        )
+        await self.assert_same_response("/api/menu-items?fields=title,price")
+        await self.assert_same_response("/api/menu-items?fields=nope")
+        await self.assert_same_response("/api/menu-items/999")
+        await self.assert_same_response(f"/api/category/{self.category.id}")
+        await self.assert_same_response("/api/category/999")
+        await self.assert_same_response("/api/menu-items/999", **{"If-None-Match": "*"})
+
+    async def test_orders_per_role(self):
+        await sync_to_async(self.make_orders)(3, delivery_crew=self.crew)
+        await sync_to_async(self.make_orders)(2, user=self.manager)
+        for user in (self.manager, self.crew, self.customer):
+            await self.assert_same_response("/api/orders?perpage=2", user)
+        await self.assert_same_response("/api/orders?status=1", self.manager)
+        await self.assert_same_response(
+            "/api/orders?perpage=2&fields=id,user&expand=", self.manager
+        )
+
+    async def test_authentication(self):
+        response = await self.assert_same_response("/api/orders")
+        self.assertEqual(response.status_code, 401)
+        bad_token = {"Authorization": "Token nope"}
+        response = await self.assert_same_response("/api/menu-items", **bad_token)
+        self.assertEqual(response.status_code, 401)
+
+    async def test_conditional_and_cached_reads(self):
+        first = await self.async_client.get("/api/menu-items")
+        cached = await self.async_client.get("/api/menu-items")
+        self.assertEqual(cached.content, first.content)
+        self.assertEqual(self.queries(cached), 1)
+        response = await self.async_client.get(
+            "/api/menu-items", headers={"If-None-Match": first["ETag"]}
+        )
+        self.assertEqual(response.status_code, 304)
+
+    async def test_order_list_query_budget(self):
+        await sync_to_async(self.make_orders)(5)
+        headers = self.headers_for(self.customer)
+        response = await self.async_client.get("/api/orders", headers=headers)
+        self.assertEqual(len(response.json()), 5)
+        # token and user, groups, orders with users, order items
+        self.assertEqual(self.queries(response), 4)
+        # the token and the groups are cached from then on
+        response = await self.async_client.get("/api/orders", headers=headers)
+        self.assertEqual(self.queries(response), 2)
+
+    async def test_other_formats_and_methods_use_the_sync_views(self):
+        await self.assert_same_response("/api/menu-items", Accept="application/xml")
+        response = await self.async_client.post(
+            "/api/menu-items",
+            {"title": "Soup", "price": "4.00", "category_id": self.category.id},
+            content_type="application/json",
+            headers=self.headers_for(self.manager),
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(
+            set(response["Allow"].split(", ")),
+            {"GET", "POST", "PUT", "PATCH", "DELETE", "OPTIONS"},
+        )
+
+
+class ThrottleTests(LittleLemonTestCase):
+    def setUp(self):
+        super().setUp()
+        # a fresh LocalBackend
+        ratelimit._backend.cache_clear()
+
+    def test_limit_and_headers(self):
+        client = self.client_for(self.customer)
+        for remaining in range(9, -1, -1):
+            response = client.get("/api/throttle-check-auth/")
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response["RateLimit-Limit"], "10")
+            self.assertEqual(response["RateLimit-Remaining"], str(remaining))
+            self.assertLessEqual(int(response["RateLimit-Reset"]), 60)
+        response = client.get("/api/throttle-check-auth/")
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response["RateLimit-Remaining"], "0")
+        self.assertGreater(int(response["Retry-After"]), 0)
+        self.assertEqual(response["Retry-After"], response["RateLimit-Reset"])
+
+    def test_managers_get_a_higher_limit(self):
+        client = self.client_for(self.manager)
+        response = client.get("/api/throttle-check-auth/")
+        self.assertEqual(response["RateLimit-Limit"], "60")
+        statuses = [
+            client.get("/api/throttle-check-auth/").status_code for _ in range(59)
+        ]
+        self.assertEqual(statuses, [200] * 59)
+        self.assertEqual(client.get("/api/throttle-check-auth/").status_code, 429)
+
+    def test_scopes_are_counted_separately(self):
+        client = APIClient()
+        self.assertEqual(client.get("/api/throttle-check/").status_code, 200)
+        self.assertEqual(client.get("/api/throttle-check/").status_code, 200)
+        self.assertEqual(client.get("/api/throttle-check/").status_code, 429)
+        # anonymous limits do not apply to users, nor user limits to this view
+        client.force_authenticate(self.customer)
+        response = client.get("/api/throttle-check/")
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn("RateLimit-Limit", response)
+
+    def test_rates_must_allow_a_request(self):
+        self.assertEqual(ratelimit.parse_rate("5/minute"), (5, 60))
+        for rate in ("0/minute", "-1/hour"):
+            with self.assertRaisesMessage(ImproperlyConfigured, rate):
+                ratelimit.parse_rate(rate)
+
+    def test_sliding_window(self):
+        window = ratelimit.SlidingWindow(4, 60, ratelimit.LocalBackend())
+        start = 1000 * 60
+        for _ in range(4):
+            self.assertTrue(window.hit("k", now=start + 30).allowed)
+        refused = window.hit("k", now=start + 30)
+        self.assertFalse(refused.allowed)
+        # 4 * (1 - 15 / 60) + 1 <= 4: 15s into the next window
+        self.assertEqual(refused.retry_after, 45)
+        self.assertFalse(window.hit("k", now=start + 60 + 14).allowed)
+        self.assertTrue(window.hit("k", now=start + 60 + 15).allowed)
+        decision = window.hit("k", now=start + 60 + 45)
+        self.assertTrue(decision.allowed)
+        self.assertEqual(decision.remaining, 1)
+
+    def test_concurrent_hits(self):
+        backends = {
+            "local": ratelimit.LocalBackend(),
+            "cache": ratelimit.CacheBackend(),
+        }
+        for name, backend in backends.items():
+            with self.subTest(name):
+                window = ratelimit.SlidingWindow(100, 60, backend)
+                with ThreadPoolExecutor(max_workers=8) as pool:
+                    decisions = list(
+                        pool.map(
+                            lambda _: window.hit(name, now=60 * 1000).allowed,
+                            range(400),
+                        )
+                    )
+                self.assertEqual(decisions.count(True), 100)
+                self.assertEqual(backend.get(f"{name}:1000"), 100)
+
+
+def hit_from_process(arguments):
+    limit, hits, now = arguments
+    window = ratelimit.SlidingWindow(limit, 60, ratelimit.DatabaseBackend())
+    try:
+        return sum(window.hit("shared", now=now).allowed for _ in range(hits))
+    finally:
+        connections.close_all()
+
+
+class DatabaseRateLimitTests(TransactionTestCase):
+    """The database backend shared by several worker processes, against the
+    on-disk test database."""
+
+    def test_processes_share_the_limit(self):
+        # forked children must open their own connections
+        connections.close_all()
+        with multiprocessing.get_context("fork").Pool(4) as pool:
+            admitted = pool.map(hit_from_process, [(50, 40, 60 * 1000)] * 4)
+        self.assertEqual(sum(admitted), 50)
+        self.assertEqual(RateLimitCounter.objects.get(key="shared:1000").count, 50)
+
+    def test_expired_counters_restart(self):
+        backend = ratelimit.DatabaseBackend()
+        self.assertEqual(backend.incr("k", 60), 1)
+        self.assertEqual(backend.incr("k", 60), 2)
+        RateLimitCounter.objects.filter(key="k").update(expires=0)
+        self.assertEqual(backend.get("k"), 0)
+        self.assertEqual(backend.incr("k", 60), 1)
+
+
+class ConcurrentWriteTests(TransactionTestCase):
+    """Cart and checkout writes from many threads at once, against the
+    on-disk test database. None may fail with "database is locked"."""
+
+    CUSTOMERS = 8
+    ROUNDS = 5
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        logger = logging.getLogger("LittleLemonAPI.metrics")
+        cls.addClassCleanup(logger.setLevel, logger.level)
+        logger.setLevel(logging.ERROR)
+
+    def setUp(self):
+        category = Category.objects.create(slug="mains", title="Mains")
+        self.menuitems = [
+            MenuItem.objects.create(
+                title=f"Dish {i}", price=Decimal("5.00") + i, category=category
+            )
+            for i in range(2)
+        ]
+        self.customers = [
+            User.objects.create_user(f"customer-{i}") for i in range(self.CUSTOMERS)
+        ]
+        self.tokens = {
+            user: Token.objects.create(user=user).key for user in self.customers
+        }
+
+    def client_for(self, user):
+        return Client(
+            raise_request_exception=False,
+            headers={"Authorization": f"Token {self.tokens[user]}"},
+        )
+
+    def run_concurrently(self, function, arguments):
+        def call(argument):
+            try:
+                return function(argument)
+            finally:
+                connections.close_all()
+
+        with ThreadPoolExecutor(max_workers=len(arguments)) as pool:
+            return list(pool.map(call, arguments))
+
+    def test_cart_and_checkout(self):
+        def shop(user):
+            client = self.client_for(user)
+            statuses = []
+            for _ in range(self.ROUNDS):
+                for menuitem in self.menuitems:
+                    response = client.post(
+                        "/api/cart/menu-items",
+                        {"item": menuitem.id, "quantity": 2},
+                        content_type="application/json",
+                    )
+                    statuses.append(response.status_code)
+                statuses.append(client.post("/api/orders").status_code)
+            return statuses
+
+        for statuses in self.run_concurrently(shop, self.customers):
+            self.assertEqual(statuses, [201, 201, 201] * self.ROUNDS)
+        orders = Order.objects.all()
+        self.assertEqual(len(orders), self.CUSTOMERS * self.ROUNDS)
+        self.assertEqual(OrderItem.objects.count(), self.CUSTOMERS * self.ROUNDS * 2)
+        self.assertFalse(Cart.objects.exists())
+        self.assertEqual({order.total for order in orders}, {Decimal("22.00")})
+
+    def test_concurrent_checkouts_of_one_cart(self):
+        customer = self.customers[0]
+        Cart.objects.create(
+            user=customer,
+            menuitem=self.menuitems[0],
+            quantity=1,
+            unit_price=Decimal("5.00"),
+            price=Decimal("5.00"),
+        )
+        statuses = self.run_concurrently(
+            lambda _: self.client_for(customer).post("/api/orders").status_code,
+            range(self.CUSTOMERS),
+        )
+        self.assertEqual(sorted(statuses), [201] + [400] * (self.CUSTOMERS - 1))
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_concurrent_adds_of_one_item(self):
+        customer = self.customers[0]
+
+        def add(key):
+            headers = {"Idempotency-Key": key} if key else {}
+            return (
+                self.client_for(customer)
+                .post(
+                    "/api/cart/menu-items",
+                    {"item": self.menuitems[0].id, "quantity": 1},
+                    content_type="application/json",
+                    headers=headers,
+                )
+                .status_code
+            )
+
+        # retries of one request apply once, separate requests all apply
+        statuses = self.run_concurrently(add, ["retry"] * 4 + [None] * 4)
+        self.assertEqual(statuses, [201] * 8)
+        cart = Cart.objects.get(user=customer)
+        self.assertEqual(cart.quantity, 5)
+        self.assertEqual(CartSummary.objects.get(user=customer).item_count, 5)
+
+    def test_pragmas(self):
+        with connection.cursor() as cursor:
+            cursor.execute("PRAGMA journal_mode")
+            self.assertEqual(cursor.fetchone()[0], "wal")
+            cursor.execute("PRAGMA synchronous")
+            # NORMAL
+            self.assertEqual(cursor.fetchone()[0], 1)
+            cursor.execute("PRAGMA busy_timeout")
+            self.assertEqual(cursor.fetchone()[0], 5000)
+
+
+@override_settings(DATABASE_REPLICAS=["replica"])
+class ReplicaRoutingTests(TransactionTestCase):
+    """Routing against two SQLite files: the test database as the primary
+    and a copy of it, made with sync_replicas, as a lagging replica."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        workdir = tempfile.TemporaryDirectory()
+        cls.addClassCleanup(workdir.cleanup)
+        # a connection outside settings.DATABASES, which test cases allow
+        primary = connections["default"]
+        replica = type(primary)(
+            {
+                **primary.settings_dict,
+                "NAME": str(Path(workdir.name) / "replica.sqlite3"),
+            },
+            alias="replica",
+        )
+        connections["replica"] = replica
+        cls.addClassCleanup(connections.__delitem__, "replica")
+        cls.addClassCleanup(replica.close)
+        logger = logging.getLogger("LittleLemonAPI.metrics")
+        cls.addClassCleanup(logger.setLevel, logger.level)
+        logger.setLevel(logging.ERROR)
+
+    def setUp(self):
+        caches[catalogue_cache.alias].clear()
+        caches["default"].clear()
+        category = Category.objects.create(slug="mains", title="Mains")
+        self.menuitem = MenuItem.objects.create(
+            title="Soup", price=Decimal("4.00"), category=category
+        )
+        self.customer = User.objects.create_user("customer")
+        self.token = Token.objects.create(user=self.customer).key
+        call_command("sync_replicas", stdout=StringIO())
+        # written to the primary only: the replica lags behind
+        MenuItem.objects.filter(pk=self.menuitem.pk).update(
+            title="Stew", updated_at=timezone.now()
+        )
+
+    def client_for(self, token):
+        return Client(headers={"Authorization": f"Token {token}"})
+
+    def title(self, client):
+        return client.get(f"/api/menu-items/{self.menuitem.pk}").json()["title"]
+
+    def test_catalogue_reads_use_the_replica(self):
+        self.assertEqual(self.title(Client()), "Soup")
+        # outside of requests, and for the write, the primary
+        self.assertEqual(MenuItem.objects.get(pk=self.menuitem.pk).title, "Stew")
+
+    def test_clients_read_their_own_writes(self):
+        client = self.client_for(self.token)
+        self.assertEqual(self.title(client), "Soup")
+        response = client.post(
+            "/api/cart/menu-items",
+            {"item": self.menuitem.pk, "quantity": 1},
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, 201)
+        # pinned to the primary for a while, other clients are not
+        self.assertEqual(self.title(client), "Stew")
+        other = User.objects.create_user("other")
+        other_token = Token.objects.create(user=other).key
+        self.assertEqual(self.title(self.client_for(other_token)), "Soup")
+        with override_settings(REPLICA_PIN_SECONDS=0):
+            client.delete("/api/cart/menu-items")
+        self.assertEqual(self.title(client), "Soup")
+
+    def test_writes_read_from_the_primary(self):
+        # the order only exists on the primary
+        order = Order.objects.create(user=self.customer, total=0, date=date.today())
+        manager = User.objects.create_user("manager")
+        manager.groups.add(Group.objects.create(name="Manager"))
+        client = self.client_for(Token.objects.create(user=manager).key)
+        self.assertEqual(client.get(f"/api/orders/{order.pk}").status_code, 404)
+        response = client.patch(
+            f"/api/orders/{order.pk}", {"status": 1}, content_type="application/json"
+        )
+        self.assertEqual(response.status_code, 200)
+        order.refresh_from_db()
+        self.assertTrue(order.status)
+
+    def test_users_and_tokens_are_read_from_the_primary(self):
+        # created after the copy, yet the new user can authenticate
+        user = User.objects.create_user("newcomer")
+        client = self.client_for(Token.objects.create(user=user).key)
+        self.assertEqual(client.get("/api/orders").status_code, 200)
+
+    def test_replicas_are_not_migrated(self):
+        router = ReplicaRouter()
+        self.assertFalse(router.allow_migrate("replica", "LittleLemonAPI"))
+        self.assertTrue(router.allow_migrate("default", "LittleLemonAPI"))
@@ -1,4 +1,75 @@
-from rest_framework.throttling import UserRateThrottle
+from rest_framework.settings import api_settings
+from rest_framework.throttling import BaseThrottle
+
+from .ratelimit import SlidingWindow, parse_rate
+from .roles import get_roles
+
+
+class SlidingWindowThrottle(BaseThrottle):
+    """Throttle with a sliding window counter from ratelimit.py.
+
+    The rate for scope comes from DEFAULT_THROTTLE_RATES. A "<scope>:<role>"
+    entry (e.g. "user:Manager") gives members of that group their own rate;
+    users in several groups get the most generous one. Every response carries
+    RateLimit-Limit, RateLimit-Remaining and RateLimit-Reset headers for the
+    most restrictive throttle on the view, and throttled responses add
+    Retry-After.
+    """
+
+    scope = None
+
+    def get_rate(self, request):
+        rates = api_settings.DEFAULT_THROTTLE_RATES
+        role_rates = [
+            parse_rate(rates[f"{self.scope}:{role}"])
+            for role in get_roles(request.user)
+            if f"{self.scope}:{role}" in rates
+        ]
+        if role_rates:
+            return max(role_rates, key=lambda rate: rate[0] / rate[1])
+        rate = rates.get(self.scope)
+        return parse_rate(rate) if rate is not None else None
+
+    def get_cache_key(self, request, view):
+        if request.user.is_authenticated:
+            ident = request.user.pk
+        else:
+            ident = self.get_ident(request)
+        return f"throttle:{self.scope}:{ident}"
+
+    def allow_request(self, request, view):
+        key = self.get_cache_key(request, view)
+        if key is None:
+            return True
+        rate = self.get_rate(request)
+        if rate is None:
+            return True
+        self.decision = SlidingWindow(*rate).hit(key)
+        headers = view.headers
+        remaining = headers.get("RateLimit-Remaining")
+        if remaining is None or self.decision.remaining < int(remaining):
+            headers["RateLimit-Limit"] = str(self.decision.limit)
+            headers["RateLimit-Remaining"] = str(self.decision.remaining)
+            headers["RateLimit-Reset"] = str(self.decision.reset)
+        return self.decision.allowed
+
+    def wait(self):
+        return self.decision.retry_after
+
+
+class AnonRateThrottle(SlidingWindowThrottle):
+    """Limit anonymous clients by IP; authenticated users are not counted."""
+
+    scope = "anon"
+
+    def get_cache_key(self, request, view):
+        if request.user.is_authenticated:
+            return None
+        return super().get_cache_key(request, view)
+
+
+class UserRateThrottle(SlidingWindowThrottle):
+    scope = "user"
 
 
 class TenCallsPerMinute(UserRateThrottle):
@@ -5,6 +5,8 @@ from rest_framework.authtoken.views import obtain_auth_token
 urlpatterns = [
     path("menu-items", views.menu_items),
     path("menu-items/<int:id>", views.single_item),
+    path("menu-items/export", views.menu_items_export),
+    path("menu-items/bulk", views.menu_items_bulk),
     path("category/<int:pk>", views.category_detail, name="category-detail"),
     path("secret/", views.secret),
     path("api-token-auth/", obtain_auth_token),
@@ -16,6 +18,10 @@ urlpatterns = [
     path("groups/delivery-crew/users", views.deliverycrew),
     path("groups/delivery-crew/users/<int:id>", views.deliverycrew_user),
     path("cart/menu-items", views.cartitems),
+    path("cart/menu-items/batch", views.cartitems_batch),
     path("orders", views.order),
+    path("orders/export", views.orders_export),
     path("orders/<int:id>", views.order_item),
+    path("metrics", views.metrics),
+    path("analytics", views.analytics),
 ]
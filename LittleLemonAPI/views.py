@@ -1,51 +1,107 @@
+from django.conf import settings
 from django.core.paginator import EmptyPage, Paginator
 from django.contrib.auth.models import User, Group
+from django.db import transaction
 from django.shortcuts import get_object_or_404
 from rest_framework import status
-from rest_framework.decorators import api_view, permission_classes, throttle_classes
-from rest_framework.permissions import BasePermission, IsAuthenticated, IsAdminUser
+from rest_framework.decorators import (
+    api_view,
+    parser_classes,
+    permission_classes,
+    renderer_classes,
+    throttle_classes,
+)
+from rest_framework.exceptions import ValidationError
+from rest_framework.parsers import JSONParser
+from rest_framework.permissions import IsAuthenticated, IsAdminUser
 from rest_framework.response import Response
-from rest_framework.throttling import AnonRateThrottle, UserRateThrottle
 from datetime import date
 
-from .models import Cart, Category, MenuItem, Order, OrderItem
+from .models import Cart, CartSummary, Category, MenuItem, Order, OrderItem
 from .serializers import (
+    MAX_QUANTITY,
+    AnalyticsFilterSerializer,
+    AnalyticsSerializer,
+    CartItemSerializer,
     CartSerializer,
+    CartSummarySerializer,
     CategorySerializer,
+    MenuImportRowSerializer,
+    MenuItemFilterSerializer,
     MenuItemSerializer,
+    OrderFilterSerializer,
     OrderSerializer,
     UserSerializer,
 )
-from .throttles import TenCallsPerMinute
+from . import (
+    carts,
+    exports,
+    fastserializers,
+    fieldsets,
+    idempotency,
+    menuimport,
+    rollups,
+    tasks,
+)
+from .cache import catalogue_cache
+from .etags import category_etag, menu_etag, menu_item_etag, not_modified
+from .metrics import registry
+from .pagination import OrderCursorPagination
+from .parsers import CSVParser
+from .permissions import IsManager
+from .renderers import CSVRenderer, NDJSONRenderer
+from .roles import DELIVERY_CREW, MANAGER, is_delivery_crew, is_manager
+from .search import search_menu_items
+from .throttles import AnonRateThrottle, TenCallsPerMinute
 
 
 @api_view(["GET", "POST", "PUT", "PATCH", "DELETE"])
 def menu_items(request):
     if request.method == "GET":
-        items = MenuItem.objects.select_related("category").all()
-        category_name = request.query_params.get("category")
-        to_price = request.query_params.get("to_price")
-        search = request.query_params.get("search")
-        ordering = request.query_params.get("ordering")
-        perpage = request.query_params.get("perpage", default=2)
-        page = request.query_params.get("page", default=1)
-        if category_name:
-            items = items.filter(category__title=category_name)
-        if to_price:
-            items = items.filter(price__lte=to_price)
-        if search:
-            items = items.filter(title__contains=search)
-        if ordering:
-            ordering_fields = ordering.split(",")
-            items = items.order_by(*ordering_fields)
-        paginator = Paginator(items, per_page=perpage)
+        filters = MenuItemFilterSerializer(
+            data={k: v for k, v in request.query_params.items() if v != ""}
+        )
+        filters.is_valid(raise_exception=True)
+        params = filters.validated_data
+        fieldset = fieldsets.MENU_ITEM.parse(request.query_params)
+        etag = menu_etag(request)
+        unchanged = not_modified(request, etag)
+        if unchanged is not None:
+            return unchanged
+        cache_key = catalogue_cache.key(request, etag)
+        cached = catalogue_cache.get(cache_key)
+        if cached is not None:
+            cached["ETag"] = etag
+            return cached
+        items = fieldsets.menu_items(MenuItem.objects.all(), fieldset)
+        if "category" in params:
+            items = items.filter(category__title=params["category"])
+        if params["featured"] is not None:
+            items = items.filter(featured=params["featured"])
+        if "to_price" in params:
+            items = items.filter(price__lte=params["to_price"])
+        if "search" in params:
+            items = search_menu_items(items, params["search"])
+        if "ordering" in params:
+            items = items.order_by(*filters.ORDERINGS[params["ordering"]])
+        elif "search" not in params:
+            items = items.order_by("id")
+        # the fast serializers build the default representation only
+        fast = fastserializers.enabled() and fieldset is fieldsets.MENU_ITEM.default
+        if fast:
+            items = fastserializers.menu_item_rows(items)
+        paginator = Paginator(items, per_page=params["perpage"])
         try:
-            items = paginator.page(number=page)
+            items = paginator.page(number=params["page"])
         except EmptyPage:
             items = []
-        serialized_item = MenuItemSerializer(items, many=True)
-        return Response(serialized_item.data)
-    if not request.user.groups.filter(name="Manager").exists():
+        if fast:
+            data = fastserializers.serialize_menu_items(items)
+        else:
+            data = MenuItemSerializer(items, many=True, fieldset=fieldset).data
+        response = Response(data, headers={"ETag": etag})
+        return catalogue_cache.store(cache_key, response)
+    if not is_manager(request.user):
         return Response("You must be a Manager to do this.", status.HTTP_403_FORBIDDEN)
     if request.method == "POST":
         serialized_item = MenuItemSerializer(data=request.data)
@@ -56,11 +112,27 @@ def menu_items(request):
 
 @api_view(["GET", "PUT", "PATCH", "DELETE"])
 def single_item(request, id):
-    item = get_object_or_404(MenuItem, pk=id)
     if request.method == "GET":
-        serialized_item = MenuItemSerializer(item)
-        return Response(serialized_item.data)
-    if not request.user.groups.filter(name="Manager").exists():
+        fieldset = fieldsets.MENU_ITEM.parse(request.query_params)
+        etag = menu_item_etag(request, id)
+        # None for a missing item, which get_object_or_404 answers below
+        if etag is not None:
+            unchanged = not_modified(request, etag)
+            if unchanged is not None:
+                return unchanged
+        cache_key = catalogue_cache.key(request, etag)
+        cached = catalogue_cache.get(cache_key)
+        if cached is not None:
+            cached["ETag"] = etag
+            return cached
+        item = get_object_or_404(
+            fieldsets.menu_items(MenuItem.objects.all(), fieldset), pk=id
+        )
+        serialized_item = MenuItemSerializer(item, fieldset=fieldset)
+        response = Response(serialized_item.data, headers={"ETag": etag})
+        return catalogue_cache.store(cache_key, response)
+    item = get_object_or_404(MenuItem, pk=id)
+    if not is_manager(request.user):
         return Response("You must be a Manager to do this.", status.HTTP_403_FORBIDDEN)
     if request.method == "PUT" or request.method == "PATCH":
         serialized_item = MenuItemSerializer(item, data=request.data, partial=True)
@@ -74,9 +146,15 @@ def single_item(request, id):
 
 @api_view()
 def category_detail(request, pk):
+    etag = category_etag(request, pk)
+    # None for a missing category, which get_object_or_404 answers below
+    if etag is not None:
+        unchanged = not_modified(request, etag)
+        if unchanged is not None:
+            return unchanged
     category = get_object_or_404(Category, pk=pk)
     serialized_category = CategorySerializer(category)
-    return Response(serialized_category.data)
+    return Response(serialized_category.data, headers={"ETag": etag})
 
 
 @api_view()
@@ -88,7 +166,7 @@ def secret(request):
 @api_view()
 @permission_classes([IsAuthenticated])
 def manager_view(request):
-    if request.user.groups.filter(name="Manager").exists():
+    if is_manager(request.user):
         return Response({"message": "Only Manager Should See This"})
     return Response({"message": "You are not authorized"}, 403)
 
@@ -106,15 +184,10 @@ def throttle_check_auth(request):
     return Response({"message": "message for the logged in users only"})
 
 
-class IsManager(BasePermission):
-    def has_permission(self, request, view):
-        return request.user.groups.filter(name="Manager").exists()
-
-
 @api_view(["GET", "POST"])
 @permission_classes([IsManager])
 def managers(request):
-    manager_users = User.objects.filter(groups__name="Manager")
+    manager_users = User.objects.filter(groups__name=MANAGER)
     if request.method == "GET":
         return Response(
             UserSerializer(manager_users.all(), many=True).data,
@@ -123,7 +196,7 @@ def managers(request):
     username = request.data["username"]
     if username:
         user = get_object_or_404(User, username=username)
-        manager_group = Group.objects.get(name="Manager")
+        manager_group = Group.objects.get(name=MANAGER)
         if request.method == "POST":
             user.groups.add(manager_group)
             return Response({"message": "ok"}, status=status.HTTP_201_CREATED)
@@ -133,7 +206,7 @@ def managers(request):
 @permission_classes([IsManager])
 def managers_user(request, id):
     user = get_object_or_404(User, id=id)
-    manager_group = Group.objects.get(name="Manager")
+    manager_group = Group.objects.get(name=MANAGER)
     user.groups.remove(manager_group)
     return Response({"message": "ok"}, status=status.HTTP_200_OK)
 
@@ -141,7 +214,7 @@ def managers_user(request, id):
 @api_view(["GET", "POST"])
 @permission_classes([IsManager])
 def deliverycrew(request):
-    delieverycrew_users = User.objects.filter(groups__name="Delivery crew")
+    delieverycrew_users = User.objects.filter(groups__name=DELIVERY_CREW)
     if request.method == "GET":
         return Response(
             UserSerializer(delieverycrew_users.all(), many=True).data,
@@ -150,7 +223,7 @@ def deliverycrew(request):
     username = request.data["username"]
     if username:
         user = get_object_or_404(User, username=username)
-        deliverycrew_group = Group.objects.get(name="Delivery crew")
+        deliverycrew_group = Group.objects.get(name=DELIVERY_CREW)
         if request.method == "POST":
             user.groups.add(deliverycrew_group)
             return Response({"message": "ok"}, status=status.HTTP_201_CREATED)
@@ -160,7 +233,7 @@ def deliverycrew(request):
 @permission_classes([IsManager])
 def deliverycrew_user(request, id):
     user = get_object_or_404(User, id=id)
-    deliverycrew_group = Group.objects.get(name="Delivery crew")
+    deliverycrew_group = Group.objects.get(name=DELIVERY_CREW)
     user.groups.remove(deliverycrew_group)
     return Response({"message": "ok"}, status=status.HTTP_200_OK)
 
@@ -169,68 +242,150 @@ def deliverycrew_user(request, id):
 @permission_classes([IsAuthenticated])
 def cartitems(request):
     if request.method == "GET":
-        items = Cart.objects.filter(user=request.user)
+        # the summary rides along on the rows, and an empty cart has none
+        items = list(
+            Cart.objects.filter(user=request.user).select_related(
+                "menuitem", "user__cart_summary"
+            )
+        )
+        summary = getattr(items[0].user, "cart_summary", None) if items else None
         return Response(
-            CartSerializer(items.all(), many=True).data, status=status.HTTP_200_OK
+            {
+                "items": CartSerializer(items, many=True).data,
+                "summary": CartSummarySerializer(carts.summarize(summary)).data,
+            },
+            status=status.HTTP_200_OK,
         )
     if request.method == "POST":
-        itemid = request.data["item"]
-        quantity = int(request.data["quantity"])
-        menuitem = MenuItem.objects.get(id=itemid)
-        cart = Cart(
-            user=request.user,
-            menuitem=menuitem,
-            quantity=quantity,
-            unit_price=menuitem.price,
-            price=menuitem.price * quantity,
-        )
-        cart.save()
-        return Response(CartSerializer(cart).data, status=status.HTTP_201_CREATED)
+
+        def add():
+            entry = CartItemSerializer(data=request.data)
+            entry.is_valid(raise_exception=True)
+            [cart] = add_to_cart(request.user, [entry.validated_data])
+            return Response(CartSerializer(cart).data, status=status.HTTP_201_CREATED)
+
+        return idempotency.run(request, add)
     if request.method == "DELETE":
-        items = Cart.objects.filter(user=request.user)
-        items.delete()
+        with transaction.atomic():
+            Cart.objects.filter(user=request.user).delete()
+            carts.emptied(request.user)
         return Response("Emptied cart", status=status.HTTP_200_OK)
 
 
+@api_view(["POST"])
+@permission_classes([IsAuthenticated])
+def cartitems_batch(request):
+    def add():
+        entries = CartItemSerializer(
+            data=request.data,
+            many=True,
+            allow_empty=False,
+            max_length=CartItemSerializer.MAX_BATCH,
+        )
+        entries.is_valid(raise_exception=True)
+        items = add_to_cart(request.user, entries.validated_data)
+        summary = CartSummary.objects.get(user=request.user)
+        return Response(
+            {
+                "items": CartSerializer(items, many=True).data,
+                "summary": CartSummarySerializer(carts.summarize(summary)).data,
+            },
+            status=status.HTTP_201_CREATED,
+        )
+
+    return idempotency.run(request, add)
+
+
+def add_to_cart(user, entries):
+    """Add the validated CartItemSerializer entries to user's cart, looking
+    every menu item up in one query."""
+    quantities = {}
+    for entry in entries:
+        quantities[entry["item"]] = quantities.get(entry["item"], 0) + entry["quantity"]
+    menuitems = MenuItem.objects.in_bulk(quantities)
+    missing = [id for id in quantities if id not in menuitems]
+    if missing:
+        raise ValidationError(
+            {"item": [f"Menu item {id} does not exist." for id in missing]}
+        )
+    try:
+        return carts.add_items(
+            user, {menuitems[id]: quantity for id, quantity in quantities.items()}
+        )
+    except carts.QuantityTooLarge as exc:
+        raise ValidationError(
+            {"quantity": [f"At most {MAX_QUANTITY} of {exc.args[0]} fit in a cart."]}
+        )
+
+
 @api_view(["GET", "POST"])
 @permission_classes([IsAuthenticated])
 def order(request):
     if request.method == "GET":
-        if request.user.groups.filter(name="Manager").exists():
+        orders = Order.objects.all()
+        if is_manager(request.user):
             # do manager stuff
-            items = Order.objects.all()
-            return Response(
-                OrderSerializer(items, many=True).data, status=status.HTTP_200_OK
-            )
-        elif request.user.groups.filter(name="Delivery crew").exists():
+            items = orders.all()
+        elif is_delivery_crew(request.user):
             # do delivery crew stuff
-            items = Order.objects.filter(delivery_crew=request.user)
-            return Response(
-                OrderSerializer(items, many=True).data, status=status.HTTP_200_OK
-            )
+            items = orders.filter(delivery_crew=request.user)
         else:
             # do customer stuff
-            items = Order.objects.filter(user=request.user)
-            return Response(
-                OrderSerializer(items, many=True).data, status=status.HTTP_200_OK
+            items = orders.filter(user=request.user)
+        filters = OrderFilterSerializer(data=request.query_params)
+        filters.is_valid(raise_exception=True)
+        if filters.validated_data["status"] is not None:
+            items = items.filter(status=filters.validated_data["status"])
+        if "from_date" in filters.validated_data:
+            items = items.filter(date__gte=filters.validated_data["from_date"])
+        if "to_date" in filters.validated_data:
+            items = items.filter(date__lte=filters.validated_data["to_date"])
+        if "delivery_crew" in filters.validated_data:
+            items = items.filter(
+                delivery_crew__username=filters.validated_data["delivery_crew"]
+            )
+        if "user" in filters.validated_data:
+            items = items.filter(user__username=filters.validated_data["user"])
+        fieldset = fieldsets.ORDER.parse(request.query_params)
+        paginator = OrderCursorPagination()
+        if fastserializers.enabled() and fieldset is fieldsets.ORDER.default:
+            rows = fastserializers.order_rows(items)
+            page = paginator.paginate_queryset(rows, request)
+            return paginator.get_paginated_response(
+                fastserializers.serialize_orders(page)
             )
+        page = paginator.paginate_queryset(fieldsets.orders(items, fieldset), request)
+        return paginator.get_paginated_response(
+            OrderSerializer(page, many=True, fieldset=fieldset).data
+        )
     if request.method == "POST":
-        order = Order(user=request.user, total=0, date=date.today())
-        order.save()
-        total = 0
-        for item in Cart.objects.filter(user=request.user):
-            orderitem = OrderItem(
-                order=order,
-                menuitem=item.menuitem,
-                quantity=item.quantity,
-                unit_price=item.unit_price,
-                price=item.price,
+        with transaction.atomic():
+            # Locking the cart rows serializes concurrent checkouts by the same
+            # user: the loser waits, then finds the cart already emptied.
+            cart = Cart.objects.select_for_update().filter(user=request.user)
+            items = list(cart.only("menuitem", "quantity", "unit_price", "price"))
+            if not items:
+                return Response("Your cart is empty.", status.HTTP_400_BAD_REQUEST)
+            order = Order.objects.create(
+                user=request.user,
+                total=sum(item.price for item in items),
+                date=date.today(),
+            )
+            orderitems = OrderItem.objects.bulk_create(
+                OrderItem(
+                    order=order,
+                    menuitem_id=item.menuitem_id,
+                    quantity=item.quantity,
+                    unit_price=item.unit_price,
+                    price=item.price,
+                )
+                for item in items
             )
-            orderitem.save()
-            total += item.price
-            item.delete()
-        order.total = total
-        order.save()
+            Cart.objects.filter(pk__in=[item.pk for item in items]).delete()
+            carts.emptied(request.user)
+            rollups.order_added(order, orderitems)
+            if settings.AUTO_ASSIGN_DELIVERY_CREW:
+                tasks.enqueue("assign_delivery_crew", order_id=order.id)
         return Response(OrderSerializer(order).data, status=status.HTTP_201_CREATED)
 
 
@@ -238,13 +393,18 @@ def order(request):
 @permission_classes([IsAuthenticated])
 def order_item(request, id):
     if request.method == "GET":
-        order = get_object_or_404(Order, id=id)
-        if request.user != order.user:
+        fieldset = fieldsets.ORDER.parse(request.query_params)
+        order = get_object_or_404(
+            fieldsets.orders(Order.objects.all(), fieldset), id=id
+        )
+        if order.user_id != request.user.pk:
             return Response("This is not your order.", status=status.HTTP_403_FORBIDDEN)
-        return Response(OrderSerializer(order).data, status=status.HTTP_200_OK)
+        return Response(
+            OrderSerializer(order, fieldset=fieldset).data, status=status.HTTP_200_OK
+        )
     if request.method == "PUT":
         order = get_object_or_404(Order, id=id)
-        if not request.user.groups.filter(name="Manager").exists():
+        if not is_manager(request.user):
             return Response(
                 "You must be a manager to edit the order.",
                 status.HTTP_403_FORBIDDEN,
@@ -253,34 +413,111 @@ def order_item(request, id):
         serialized_order.is_valid(raise_exception=True)
         serialized_order.save()
     if request.method == "PATCH":
-        order = get_object_or_404(Order, id=id)
-        orderstatus = request.data.get("status", None)
-        delivery_crew = request.data.get("delivery_crew", None)
-        if request.user.groups.filter(name="Manager").exists():
-            if orderstatus is not None:
-                order.status = orderstatus
-            if delivery_crew is not None:
-                deliverer = get_object_or_404(User, username=delivery_crew)
-                if not deliverer.groups.filter(name="Delivery crew").exists():
-                    return Response(
-                        f"User with username {delivery_crew} is not in the delivery crew",
-                        status=status.HTTP_400_BAD_REQUEST,
-                    )
-                order.delivery_crew = deliverer
-            order.save()
-            return Response(OrderSerializer(order).data, status=status.HTTP_200_OK)
-        if request.user.groups.filter(name="Delivery crew").exists():
-            if orderstatus is not None:
-                order.status = orderstatus
-            order.save()
-            return Response(OrderSerializer(order).data, status=status.HTTP_200_OK)
+        with transaction.atomic():
+            # locked so concurrent edits roll up one after the other
+            order = get_object_or_404(Order.objects.select_for_update(), id=id)
+            before = rollups.snapshot(order)
+            orderstatus = request.data.get("status", None)
+            delivery_crew = request.data.get("delivery_crew", None)
+            if is_manager(request.user):
+                if orderstatus is not None:
+                    order.status = orderstatus
+                if delivery_crew is not None:
+                    deliverer = get_object_or_404(User, username=delivery_crew)
+                    if not is_delivery_crew(deliverer):
+                        return Response(
+                            f"User with username {delivery_crew} is not in the delivery crew",
+                            status=status.HTTP_400_BAD_REQUEST,
+                        )
+                    order.delivery_crew = deliverer
+                order.save()
+                rollups.order_changed(before, order)
+                return Response(OrderSerializer(order).data, status=status.HTTP_200_OK)
+            if is_delivery_crew(request.user):
+                if orderstatus is not None:
+                    order.status = orderstatus
+                order.save()
+                rollups.order_changed(before, order)
+                return Response(OrderSerializer(order).data, status=status.HTTP_200_OK)
 
     if request.method == "DELETE":
-        order = get_object_or_404(Order, id=id)
-        if request.user.groups.filter(name="Manager").exists():
-            order.delete()
+        if is_manager(request.user):
+            with transaction.atomic():
+                order = get_object_or_404(Order.objects.select_for_update(), id=id)
+                orderitems = list(order.orderitems.all())
+                order.delete()
+                rollups.order_removed(order, orderitems)
             return Response("Order deleted", status=status.HTTP_200_OK)
+        get_object_or_404(Order, id=id)
         return Response(
             "You must be a manager to delete an order.",
             status=status.HTTP_403_FORBIDDEN,
         )
+
+
+@api_view()
+@permission_classes([IsManager])
+@renderer_classes([NDJSONRenderer, CSVRenderer])
+def orders_export(request):
+    renderer = request.accepted_renderer
+    return exports.stream(
+        request,
+        exports.orders(renderer.format),
+        f"{renderer.media_type}; charset={renderer.charset}",
+        f"orders.{renderer.format}",
+    )
+
+
+@api_view()
+@permission_classes([IsManager])
+@renderer_classes([NDJSONRenderer, CSVRenderer])
+def menu_items_export(request):
+    renderer = request.accepted_renderer
+    return exports.stream(
+        request,
+        exports.menu(renderer.format),
+        f"{renderer.media_type}; charset={renderer.charset}",
+        f"menu-items.{renderer.format}",
+    )
+
+
+@api_view(["POST"])
+@permission_classes([IsManager])
+@parser_classes([JSONParser, CSVParser])
+def menu_items_bulk(request):
+    rows = request.data
+    if not isinstance(rows, list) or not all(isinstance(row, dict) for row in rows):
+        return Response(
+            "Send a list of menu items or a CSV file.", status.HTTP_400_BAD_REQUEST
+        )
+    if not 0 < len(rows) <= MenuImportRowSerializer.MAX_ROWS:
+        return Response(
+            f"Send 1 to {MenuImportRowSerializer.MAX_ROWS} menu items at a time.",
+            status.HTTP_400_BAD_REQUEST,
+        )
+    applied, results = menuimport.import_items(rows)
+    if not applied:
+        return Response({"rows": results}, status.HTTP_400_BAD_REQUEST)
+    return Response(
+        {
+            "created": sum(result["status"] == "created" for result in results),
+            "updated": sum(result["status"] == "updated" for result in results),
+            "rows": results,
+        },
+        status=status.HTTP_200_OK,
+    )
+
+
+@api_view()
+@permission_classes([IsManager])
+def analytics(request):
+    filters = AnalyticsFilterSerializer(data=request.query_params)
+    filters.is_valid(raise_exception=True)
+    report = rollups.report(**filters.validated_data)
+    return Response(AnalyticsSerializer(report).data, status=status.HTTP_200_OK)
+
+
+@api_view()
+@permission_classes([IsManager])
+def metrics(request):
+    return Response({"routes": registry.snapshot()}, status=status.HTTP_200_OK)